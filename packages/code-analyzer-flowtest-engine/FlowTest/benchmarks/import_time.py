@@ -0,0 +1,77 @@
+"""Import time benchmark
+
+Measures the cumulative import time of FlowTest modules, as reported by
+``python -X importtime``, in fresh interpreters (so nothing is cached in
+``sys.modules``) and prints the median of several runs::
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --module flowtest.api --repeat 20 --max_ms 50
+
+Run it from the FlowTest directory (or with FlowTest on the PYTHONPATH).
+With ``--max_ms``, the exit status is 1 if a median exceeds the budget, so
+the benchmark can guard against regressions such as a new eager import in
+:mod:`flowtest.__main__`.
+
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+#: modules measured by default: the CLI entry point and the library entry points
+DEFAULT_MODULES: tuple[str, ...] = ('flowtest.__main__', 'flowtest.api', 'flowtest.executor')
+
+#: root of the FlowTest sources (parent of this directory)
+FLOWTEST_ROOT: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str) -> float:
+    """Cumulative import time of a module in a fresh interpreter
+
+    Args:
+        module: dotted module name
+
+    Returns:
+        milliseconds
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(x for x in (FLOWTEST_ROOT, env.get('PYTHONPATH')) if x)
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               env=env, capture_output=True, text=True, check=True)
+    # lines are "import time: self [us] | cumulative | imported package", the module itself is last
+    for line in reversed(completed.stderr.splitlines()):
+        splits = line.split('|')
+        if len(splits) == 3 and splits[2].strip() == module:
+            return int(splits[1]) / 1000
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the import time of FlowTest modules")
+    parser.add_argument("--module", action='append', default=None,
+                        help=f"module to import. May be repeated. Defaults to {', '.join(DEFAULT_MODULES)}")
+    parser.add_argument("--repeat", type=int, default=10, help="number of fresh interpreters per module")
+    parser.add_argument("--max_ms", type=float, default=None,
+                        help="fail if the median import time of a module exceeds this many milliseconds")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.module or DEFAULT_MODULES:
+        # the first run warms the bytecode cache
+        measure(module)
+        timings = [measure(module) for _ in range(args.repeat)]
+        median = statistics.median(timings)
+        print(f"{module}: median {median:.1f} ms, min {min(timings):.1f} ms, max {max(timings):.1f} ms "
+              f"({args.repeat} runs)")
+        if args.max_ms is not None and median > args.max_ms:
+            print(f"{module}: median import time exceeds {args.max_ms} ms")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,6 +16,20 @@ import flowtest.util as util
 logger: logging.Logger = logging.getLogger(__name__)
 
 EMERGENCY_BREAK = 1000
+
+#: cache of parsed expressions: expression text --> influencing variables
+_parsed_expressions: {str: tuple[str, ...]} = {}
+
+
+def clear_cache() -> None:
+    """Forgets the expressions already parsed
+
+    Returns:
+        None
+    """
+    _parsed_expressions.clear()
+
+
 double_re = re.compile(r'"[^"]*"')
 single_re = re.compile(r'\'[^\']*\'')
 #: regular expression to extract variables from formulas and templates
@@ -162,12 +176,19 @@ def parse_expression(expression: str) -> list[str]:
         list of variables that data influence the expression
     """
     # TODO: might as well extract variables directly here and save the grep
+    seen = _parsed_expressions.get(expression)
+    if seen is not None:
+        return list(seen)
+
     try:
-        return process_expression(expression)
+        res = process_expression(expression)
     except:
         logger.critical("error parsing expression" + traceback.format_exc())
         logger.info("falling back to simple extractor")
-        return extract_expression(expression)
+        res = extract_expression(expression)
+
+    _parsed_expressions[expression] = tuple(res)
+    return res
 
 
 def process_expression(expression: str) -> list[str]:
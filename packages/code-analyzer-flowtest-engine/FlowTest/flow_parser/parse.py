@@ -4,14 +4,20 @@
 
 from __future__ import annotations
 
+import hashlib
+import io
+import os
 import sys
+from collections import ChainMap
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 
 from flow_parser import expression_parser
 
 sys.modules['_elementtree'] = None
 import xml.etree.ElementTree as ET
 
-from typing import Optional
+from typing import Optional, BinaryIO, Iterator, Protocol
 import logging
 import public.parse_utils as parse_utils
 import flowtest.util as util
@@ -20,7 +26,7 @@ import public.custom_parser as CP
 
 from public.parse_utils import get_by_tag, get_tag, get_name, get_named_elems, STRING_LITERAL_TOKEN
 from public.enums import RunMode, FlowType
-from public.data_obj import VariableType
+from public.data_obj import VariableType, ElementFacts, DataInfluenceStatement
 from public.enums import DataType, ReferenceType
 
 #: hardcoded sfdc metadata namespace
@@ -32,6 +38,21 @@ NS_LEN: int = len(ns)
 #: logger instance
 logger: logging.Logger = logging.getLogger(__name__)
 
+#: shared global scope: name of a $Global variable --> VariableType (cache)
+_global_types: {str: VariableType} = {}
+
+#: flow path --> xml contents of flows that are not read from disk (see :func:`in_memory_flows`)
+_in_memory: {str: bytes} = {}
+
+#: persistent cache of flow tables (see :func:`set_ir_cache`), None if disabled
+_ir_cache: IRCache | None = None
+
+#: top level Flow Elements that can appear in the control flow graph (start is handled separately)
+TRAVERSABLE_TAGS: frozenset[str] = frozenset(['actionCalls', 'assignments', 'decisions', 'loops',
+                                              'recordLookups', 'recordUpdates',
+                                              'collectionProcessors', 'recordDeletes', 'recordCreates',
+                                              'screens', 'subflows', 'waits', 'recordRollbacks'])
+
 
 def get_root(path: str) -> ET.Element:
     """Get flow root
@@ -46,6 +67,124 @@ def get_root(path: str) -> ET.Element:
     return CP.get_root(path)
 
 
+@contextmanager
+def in_memory_flows(contents: {str: str | bytes}) -> Iterator[None]:
+    """Makes flow contents available under the given paths without writing them to disk
+
+    While the context is active, :func:`open_flow` (and so :meth:`Parser.from_file`,
+    used to load subflows) returns these contents instead of reading the paths.
+
+    Args:
+        contents: flow path --> xml contents
+
+    Returns:
+        context manager
+    """
+    previous = dict(_in_memory)
+    _in_memory.update({path: x.encode() if isinstance(x, str) else x for (path, x) in contents.items()})
+    try:
+        yield
+    finally:
+        _in_memory.clear()
+        _in_memory.update(previous)
+
+
+def open_flow(path: str) -> BinaryIO:
+    """Opens a flow for binary reading, preferring in-memory contents
+
+    Args:
+        path: flow path
+
+    Returns:
+        binary file object (to be closed by the caller)
+    """
+    if path in _in_memory:
+        return io.BytesIO(_in_memory[path])
+    return open(path, 'rb')
+
+
+def flow_exists(path: str) -> bool:
+    return path in _in_memory or os.path.exists(path)
+
+
+def get_flow_version(path: str) -> tuple:
+    """Cheap key that changes whenever the contents of the flow change
+
+    Args:
+        path: flow path
+
+    Returns:
+        hashable version key
+    """
+    if path in _in_memory:
+        return 'memory', hashlib.sha256(_in_memory[path]).hexdigest()
+    stat = os.stat(path)
+    return 'disk', stat.st_mtime_ns, stat.st_size
+
+
+@dataclass(frozen=True, slots=True)
+class FlowTables:
+    """Everything the parser derives from the xml of a single flow
+
+    These tables do not depend on the calling flow, so they can be
+    stored (with the element tree, including line numbers and byte
+    offsets) and reused whenever the same flow file is parsed again.
+    """
+    # XML root of the flow
+    root: ET.Element
+
+    # map from namespaced tag --> top level elements with that tag, in document order
+    tag_index: {str: [ET.Element]}
+
+    # all elements that have a child of <name>
+    all_named_elems: frozenset[ET.Element]
+
+    # names of named elements
+    all_names: (str,)
+
+    # map from (flow_path, name) --> Variable of the variables declared in the flow
+    variables: {(str, str): VariableType}
+
+    # variables marked 'available for input', as a pair (flow_path, name)
+    input_variables: frozenset[(str, str)]
+
+    # variables marked 'available for output', as a pair (flow_path, name)
+    output_variables: frozenset[(str, str)]
+
+    # map from Flow Element name --> facts needed when the element is crawled
+    element_facts: {str: ElementFacts}
+
+    # is this a screen or auto-launched flow
+    flow_type: FlowType
+
+    # run mode as declared in flow xml
+    declared_run_mode: RunMode
+
+    # data other modules derive from these tables (e.g. the control flow graph), by name
+    derived: dict = field(default_factory=dict)
+
+
+class IRCache(Protocol):
+    def load(self, flow_path: str, content_hash: str) -> FlowTables | None:
+        ...
+
+    def store(self, parser: Parser) -> None:
+        ...
+
+
+def set_ir_cache(cache: IRCache | None) -> None:
+    """Sets the persistent cache consulted by :meth:`Parser.from_file`
+
+    Args:
+        cache: cache instance, or None to always parse the xml
+
+    Returns:
+        None
+    """
+    global _ir_cache
+    _ir_cache = cache
+
+
 class Parser(FlowParser):
     """API for parsing global lexical attributes of flow xml files.
 
@@ -70,6 +209,9 @@ class Parser(FlowParser):
         #: current filepath of flow
         self.flow_path: str | None = None
 
+        #: sha256 hex digest of the flow xml the root was parsed from
+        self.content_hash: str | None = None
+
         #: run mode as declared in flow xml
         self.declared_run_mode: RunMode | None = None
 
@@ -91,14 +233,32 @@ class Parser(FlowParser):
         #: variables marked 'available for output', as a tuple (flow_path, name)
         self.output_variables: frozenset[(str, str)] | None = None
 
+        #: map from Flow Element name --> facts needed when the element is crawled
+        self.element_facts: {str: ElementFacts} = {}
+
+        #: map from namespaced tag --> top level elements with that tag, in document order
+        self.__tag_index: {str: [ET.Element]} = {}
+
+        #: map from flow_path --> input variables declared in that flow
+        self.__inputs_by_path: {str: frozenset[(str, str)]} = {}
+
+        #: map from flow_path --> output variables declared in that flow
+        self.__outputs_by_path: {str: frozenset[(str, str)]} = {}
+
+        #: tables derived from the xml of this flow (shared with the IR cache)
+        self.flow_tables: FlowTables | None = None
+
         #: for marking string literals
         self.literal_var = VariableType(tag='stringValue', datatype=DataType.Literal)
 
-        #: map from (path, (resolved) name) --> Variable (cache)
-        self.__parsed_vars: {(str, str): VariableType} = {}
+        #: map from (path, (resolved) name) --> Variable (cache).
+        #: Layered as [new resolutions, this flow's variables, parent layers..]
+        #: so that child parsers share (and never copy) the tables of their callers.
+        self.__parsed_vars: ChainMap[(str, str), VariableType] = ChainMap()
 
-        #: cache of name resolutions: (flow_path, raw_name) --> (name, member, Variable)
-        self.__resolutions: {(str, str): (str, str, VariableType)} = {}
+        #: cache of name resolutions: (flow_path, raw_name) --> (name, member, Variable).
+        #: Layered as [new resolutions, parent layers..]
+        self.__resolutions: ChainMap[(str, str), (str, str, VariableType)] = ChainMap()
 
     def get_effective_run_mode(self) -> RunMode:
         return self.effective_run_mode
@@ -112,6 +272,17 @@ class Parser(FlowParser):
     def get_root(self) -> ET.Element:
         return self.root
 
+    def get_element_facts(self, name: str) -> ElementFacts | None:
+        """Facts about a top level Flow Element, extracted when the parser was built
+
+        Args:
+            name: name of the Flow Element ('*' for the start element)
+
+        Returns:
+            ElementFacts or None if no top level Flow Element has this name
+        """
+        return self.element_facts.get(name)
+
     def get_literal_var(self) -> VariableType:
         return self.literal_var
 
@@ -132,9 +303,9 @@ class Parser(FlowParser):
 
         # Process Builder
         # no <start> but <startElementReference>
-        res = get_by_tag(self.root, 'startElementReference')
+        res = self.__get_by_tag('startElementReference')
         if len(res) == 0:
-            res = get_by_tag(self.root, 'start')
+            res = self.__get_by_tag('start')
             if len(res) == 0:
                 # this is an old format record trigger flow
                 self.flow_type = FlowType.RecordTrigger
@@ -153,13 +324,13 @@ class Parser(FlowParser):
         else:
             # We couldn't determine flow type by looking at
             # <start> elem, so now look at processType elem
-            pt = get_by_tag(self.root, 'processType')
+            pt = self.__get_by_tag('processType')
             if len(pt) > 0:
                 pt = pt[0].text
 
                 # Screen
                 # <processType>Flow and start does not have trigger or schedule
-                if pt == 'Flow' or len(get_by_tag(self.root, 'screens')) > 0:
+                if pt == 'Flow' or len(self.__get_by_tag('screens')) > 0:
                     flow_type = FlowType.Screen
 
                 elif pt.lower() == 'workflow':
@@ -212,7 +383,7 @@ class Parser(FlowParser):
             return name, None, res
 
         # second cache, contains properties already seen as well as names of flow elements
-        seen = dict.get(self.__resolutions, (path, name))
+        seen = self.__resolutions.get((path, name))
         if seen is not None:
             return seen
 
@@ -279,28 +450,57 @@ class Parser(FlowParser):
 
     @classmethod
     def from_file(cls, filepath: str, old_parser: Parser = None) -> Parser:
-        root = CP.get_root(filepath)
-        parser = Parser(root)
+        with open_flow(filepath) as fp:
+            xml_bytes = fp.read()
+        return cls.from_file_contents(xml_bytes, filepath=filepath, old_parser=old_parser)
+
+    @classmethod
+    def from_file_contents(cls, xml_bytes: bytes, filepath: str, old_parser: Parser = None) -> Parser:
+        """Builds the parser of a flow file from contents already read
+
+        Unlike :meth:`from_string`, the tables are loaded from (and stored in)
+        the IR cache, so the contents must be those of the file.
+
+        Args:
+            xml_bytes: contents of the flow file
+            filepath: path of the flow file
+            old_parser: parser of the calling flow, if any
+
+        Returns:
+            Parser
+        """
+        content_hash = hashlib.sha256(xml_bytes).hexdigest()
+
+        tables = None if _ir_cache is None else _ir_cache.load(filepath, content_hash)
+        if tables is None:
+            parser = Parser(CP.get_root_from_string(xml_bytes))
+        else:
+            # the xml need not be parsed again
+            parser = Parser(tables.root)
         parser.flow_path = filepath
-        parser.update(old_parser=old_parser)
+        parser.content_hash = content_hash
+        parser.update(old_parser=old_parser, tables=tables)
+
+        if tables is None and _ir_cache is not None:
+            _ir_cache.store(parser)
         return parser
 
     @classmethod
     def from_string(cls, xml_string: str | bytes, filepath_to_use: str,
                     old_parser: Parser = None) -> Parser:
         if isinstance(xml_string, str):
-            root = CP.get_root_from_string(xml_string.encode())
-        elif isinstance(xml_string, bytes):
-            root = CP.get_root_from_string(xml_string)
-        else:
+            xml_string = xml_string.encode()
+        elif not isinstance(xml_string, bytes):
             raise ValueError(f"cannot build a parser from type {type(xml_string)}."
                              f" Please use str or bytes.")
+        root = CP.get_root_from_string(xml_string)
         parser = Parser(root)
         parser.flow_path = filepath_to_use
+        parser.content_hash = hashlib.sha256(xml_string).hexdigest()
         parser.update(old_parser=old_parser)
         return parser
 
-    def update(self, old_parser: Parser = None, is_return=False) -> Parser:
+    def update(self, old_parser: Parser = None, is_return=False, tables: FlowTables | None = None) -> Parser:
         """Parse flow root and populate default values
 
         Args:
@@ -309,22 +509,32 @@ class Parser(FlowParser):
 
             is_return: are we returning from a function call?
 
+            tables: tables of this flow loaded from the IR cache, or None to build them from the root
+
         Returns:
             None
 
         """
-
-        all_named, all_names, vars_, inputs, outputs = _get_global_flow_data(self.flow_path, self.root)
-        self.all_named_elems = all_named
-        self.all_names = all_names
-        self.__parsed_vars = vars_
-        self.input_variables = inputs
-        self.output_variables = outputs
-        self.get_flow_type()  # will populate flow type
-        self.declared_run_mode = self.get_run_mode()
+        if tables is None:
+            tables = self._build_flow_tables()
+
+        self.flow_tables = tables
+        self.__tag_index = tables.tag_index
+        self.all_named_elems = tables.all_named_elems
+        self.all_names = tables.all_names
+        self.input_variables = tables.input_variables
+        self.output_variables = tables.output_variables
+        self.__inputs_by_path = _index_by_path(tables.input_variables)
+        self.__outputs_by_path = _index_by_path(tables.output_variables)
+        self.element_facts = tables.element_facts
+        self.flow_type = tables.flow_type
+        self.declared_run_mode = tables.declared_run_mode
+        vars_ = tables.variables
 
         if old_parser is None:
             self.effective_run_mode = self.declared_run_mode
+            self.__parsed_vars = ChainMap({}, vars_)
+            self.__resolutions = ChainMap()
 
         else:
             if is_return is False:
@@ -334,20 +544,44 @@ class Parser(FlowParser):
                     current_sharing=self.declared_run_mode
                 )
 
-            # we always update parsed variables, so we have full resolutions available
-            self.__parsed_vars.update(old_parser.__parsed_vars)
+            # we always chain to the parent's tables, so we have full resolutions available.
+            # Keys are qualified by flow path, so layers only differ in what they contain,
+            # and new entries are only ever written to this parser's own top layer.
+            self.__parsed_vars = old_parser.__parsed_vars.new_child(vars_).new_child()
+            self.__resolutions = old_parser.__resolutions.new_child()
 
         return self
 
+    def _build_flow_tables(self) -> FlowTables:
+        """Extracts the tables of this flow from its root
+
+        Returns:
+            FlowTables
+        """
+        # flow type and run mode are looked up through the tag index
+        self.__tag_index = _build_tag_index(self.root)
+        self.flow_type = None
+        all_named, all_names, vars_, inputs, outputs = _get_global_flow_data(self.flow_path, self.root)
+        return FlowTables(root=self.root,
+                          tag_index=self.__tag_index,
+                          all_named_elems=all_named,
+                          all_names=all_names,
+                          variables=vars_,
+                          input_variables=inputs,
+                          output_variables=outputs,
+                          element_facts=_get_element_facts(self.flow_path, self.root),
+                          flow_type=self.get_flow_type(),
+                          declared_run_mode=self.get_run_mode())
+
     def get_output_variables(self, path: str | None = None) -> {(str, str)}:
         if path is None:
             path = self.flow_path
-        return {(x, y) for (x, y) in self.output_variables if x == path}
+        return set(dict.get(self.__outputs_by_path, path, ()))
 
     def get_input_variables(self, path: str | None = None) -> {(str, str)}:
         if path is None:
             path = self.flow_path
-        return {(x, y) for (x, y) in self.input_variables if x == path}
+        return set(dict.get(self.__inputs_by_path, path, ()))
 
     def get_input_field_elems(self) -> set[ET.Element] | None:
         return parse_utils.get_input_fields(self.root)
@@ -395,7 +629,7 @@ class Parser(FlowParser):
 
     def get_flow_name(self) -> str:
         """we assume there is always a flow label."""
-        return get_by_tag(self.root, 'label')[0].text
+        return self.__get_by_tag('label')[0].text
 
     def get_run_mode(self) -> RunMode:
         """Get effective context of flow
@@ -416,25 +650,22 @@ class Parser(FlowParser):
 
         # for screen and other autolaunched, check if there is a declaration
         # otherwise go with default
-        elems = get_by_tag(self.root, 'runInMode')
+        elems = self.__get_by_tag('runInMode')
         if len(elems) == 0:
             return RunMode.DefaultMode
         else:
             return RunMode[elems[0].text]
 
     def get_api_version(self) -> str:
-        return get_by_tag(self.root, 'apiVersion')[0].text
+        return self.__get_by_tag('apiVersion')[0].text
 
     def get_all_traversable_flow_elements(self) -> [ET.Element]:
         """ ignore start"""
         return [child for child in self.root if
-                get_tag(child) in ['actionCalls', 'assignments', 'decisions', 'loops',
-                                   'recordLookups', 'recordUpdates',
-                                   'collectionProcessors', 'recordDeletes', 'recordCreates', 'screens', 'subflows',
-                                   'waits', 'recordRollbacks']]
+                get_tag(child) in TRAVERSABLE_TAGS]
 
     def get_all_variable_elems(self) -> [ET.Element] or None:
-        elems = get_by_tag(self.root, 'variables')
+        elems = self.__get_by_tag('variables')
         if len(elems) == 0:
             return None
         else:
@@ -444,26 +675,26 @@ class Parser(FlowParser):
         """Grabs all template elements.
            Returns empty list if none found
         """
-        templates = get_by_tag(self.root, 'textTemplates')
+        templates = self.__get_by_tag('textTemplates')
         return templates
 
     def get_formulas(self) -> [ET.Element]:
         """Grabs all formula elements.
                 Returns empty list if none found
         """
-        formulas = get_by_tag(self.root, 'formulas')
+        formulas = self.__get_by_tag('formulas')
         return formulas
 
     def get_choices(self) -> [ET.Element]:
-        choices = get_by_tag(self.root, 'choices')
+        choices = self.__get_by_tag('choices')
         return choices
 
     def get_dynamic_choice_sets(self) -> [ET.Element]:
-        dcc = get_by_tag(self.root, 'dynamicChoiceSets')
+        dcc = self.__get_by_tag('dynamicChoiceSets')
         return dcc
 
     def get_constants(self) -> [ET.Element]:
-        constants = get_by_tag(self.root, 'constants')
+        constants = self.__get_by_tag('constants')
         return constants
 
     def get_start_elem(self) -> ET.Element:
@@ -473,8 +704,8 @@ class Parser(FlowParser):
             <start> element or element pointed to in <startElementReference>
 
         """
-        res1 = get_by_tag(self.root, 'start')
-        res2 = get_by_tag(self.root, 'startElementReference')
+        res1 = self.__get_by_tag('start')
+        res2 = self.__get_by_tag('startElementReference')
         if len(res1) == 1:
             return res1[0]
 
@@ -484,7 +715,7 @@ class Parser(FlowParser):
 
         # Put in provision for older flows that are missing start elements but have only
         # a single crud element
-        candidates = get_by_tag(self.root, 'recordUpdates') + get_by_tag(self.root, 'recordCreates')
+        candidates = self.__get_by_tag('recordUpdates') + self.__get_by_tag('recordCreates')
         if len(candidates) == 1:
             return candidates[0]
 
@@ -518,6 +749,17 @@ class Parser(FlowParser):
 
         return accum
 
+    def __get_by_tag(self, tagname: str) -> list[ET.Element]:
+        """Top level elements with the given tag (ignoring ns), served from the tag index
+
+        Args:
+            tagname: tag without namespace
+
+        Returns:
+            new list of XML Elements in document order, else [] if no matches
+        """
+        return list(dict.get(self.__tag_index, f'{ns}{tagname}', ()))
+
     def __get_type(self, name: str, path: str | None = None, strict: bool = False) -> VariableType | None:
         """Gets the VariableType for the named Flow Element
 
@@ -539,14 +781,17 @@ class Parser(FlowParser):
         if path is None:
             path = self.flow_path
 
-        if (path, name) in self.__parsed_vars:
-            return self.__parsed_vars[(path, name)]
+        res = self.__parsed_vars.get((path, name))
+        if res is not None:
+            return res
 
         if name.startswith('$'):
-            global_type = _resolve_globals(name)
+            global_type = dict.get(_global_types, name)
+            if global_type is None:
+                global_type = _resolve_globals(name)
             if global_type is not None:
-                # add to cache
-                self.__parsed_vars[(path, name)] = global_type
+                # add to the shared global scope
+                _global_types[name] = global_type
                 return global_type
 
         else:
@@ -717,6 +962,173 @@ def build_vartype_from_elem(elem: ET.Element) -> VariableType | None:
     return None
 
 
+def build_element_facts(elem: ET.Element, flow_path: str) -> ElementFacts:
+    """Extracts the facts needed by wiring and queries from a top level Flow Element
+
+    Args:
+        elem: top level Flow Element (or start element)
+        flow_path: filepath of the flow containing the element
+
+    Returns:
+        ElementFacts instance
+    """
+    tag = get_tag(elem)
+    elem_name = get_name(elem)
+
+    assignments = []
+    if tag == 'assignments':
+        for (operator, entry) in parse_utils.get_assignment_statement_dicts(elem) or []:
+            entry["flow_path"] = flow_path
+            assignments.append((operator, DataInfluenceStatement(**entry)))
+
+    input_fields = []
+    if tag == 'screens':
+        # in document order, as the helper returns a set
+        input_fields = [get_name(el) for el in sorted(parse_utils.get_input_fields(elem) or [],
+                                                      key=lambda x: x.sourceline)]
+
+    filter_influencers = []
+    input_influencers = []
+    input_reference = None
+    if tag in ['recordUpdates', 'recordLookups', 'recordCreates', 'recordDeletes']:
+        filter_influencers = parse_utils.get_sinks_from_field_values(parse_utils.get_filters(elem))
+        input_influencers = parse_utils.get_sinks_from_field_values(parse_utils.get_input_assignments(elem))
+        bulk_ref = get_by_tag(elem, 'inputReference')
+        if len(bulk_ref) == 1:
+            input_reference = bulk_ref[0].text
+
+    return ElementFacts(
+        element_name=elem_name,
+        tag=tag,
+        assignment_statements=tuple(assignments),
+        is_auto_store=parse_utils.is_auto_store(elem),
+        output_reference=parse_utils.get_output_reference(elem),
+        input_field_names=tuple(input_fields),
+        filter_influencers=tuple(filter_influencers),
+        input_influencers=tuple(input_influencers),
+        input_reference=input_reference,
+        collection_statement=_get_collection_statement(elem, tag, elem_name, flow_path),
+        connectors=tuple((parse_utils.get_conn_target_map(elem) or {}).items())
+    )
+
+
+def lookup_element_facts(parser: FlowParser, elem: ET.Element, elem_name: str) -> ElementFacts:
+    """Retrieves the facts of a Flow Element from the parser's fact table
+
+    Falls back to extracting the facts if the element is not a top level Flow Element of the parser.
+
+    Args:
+        parser: parser of the flow containing the element
+        elem: Flow Element
+        elem_name: element name
+
+    Returns:
+        ElementFacts instance
+    """
+    facts = parser.get_element_facts(elem_name)
+    if facts is None or facts.tag != get_tag(elem):
+        facts = build_element_facts(elem, parser.get_filename())
+    return facts
+
+
+def _get_collection_statement(elem: ET.Element, tag: str, elem_name: str,
+                              flow_path: str) -> DataInfluenceStatement | None:
+    """Statement wiring the collection reference into loops and filter collection processors
+
+    Args:
+        elem: Flow Element
+        tag: tag of the Flow Element
+        elem_name: name of the Flow Element
+        flow_path: filepath of the flow containing the element
+
+    Returns:
+        DataInfluenceStatement or None if the element does not iterate over a collection
+    """
+    if tag == 'loops':
+        comment = 'assign to loop variable'
+    elif tag == 'collectionProcessors':
+        subtype = get_by_tag(elem, tagname='elementSubtype')
+        if len(subtype) != 1 or subtype[0].text != 'FilterCollectionProcessor':
+            return None
+        comment = 'collection filter'
+    else:
+        return None
+
+    # every loop and filter must have a single collection ref
+    collection_refs = get_by_tag(elem, tagname='collectionReference')
+    if len(collection_refs) == 0:
+        logger.error(f"Could not find a collection reference in element {elem_name}")
+        return None
+    collection_el = collection_refs[0]
+
+    return DataInfluenceStatement(
+        influenced_var=elem_name,
+        influencer_var=collection_el.text,
+        element_name=elem_name,
+        source_text=ET.tostring(collection_el, encoding='unicode',
+                                default_namespace='http://soap.sforce.com/2006/04/metadata'),
+        line_no=collection_el.sourceline,
+        comment=comment,
+        flow_path=flow_path
+    )
+
+
+def _get_element_facts(flow_path: str, root: ET.Element) -> {str: ElementFacts}:
+    """Builds the fact table for all top level named Flow Elements and start elements
+
+    Args:
+        flow_path: filepath of flow
+        root: flow root
+
+    Returns:
+        map from Flow Element name --> ElementFacts
+    """
+    accum = {}
+    for child in root:
+        if get_tag(child) == 'processMetadataValues':
+            continue
+        name = get_name(child)
+        if name is None or name in accum:
+            continue
+        try:
+            accum[name] = build_element_facts(child, flow_path)
+        except Exception:
+            logger.error(f"ERROR extracting facts from element {name}")
+
+    return accum
+
+
+def _build_tag_index(root: ET.Element) -> {str: [ET.Element]}:
+    """Groups the children of the flow root by tag in a single pass
+
+    Args:
+        root: flow root
+
+    Returns:
+        map from namespaced tag --> children with that tag, in document order
+    """
+    accum = {}
+    for child in root:
+        if isinstance(child.tag, str):
+            accum.setdefault(child.tag, []).append(child)
+    return accum
+
+
+def _index_by_path(var_tuples: frozenset[(str, str)]) -> {str: frozenset[(str, str)]}:
+    """Groups (flow_path, name) tuples by flow_path
+
+    Args:
+        var_tuples: (flow_path, name) tuples
+
+    Returns:
+        map from flow_path --> tuples declared in that flow
+    """
+    accum = {}
+    for var_tuple in var_tuples:
+        accum.setdefault(var_tuple[0], set()).add(var_tuple)
+    return {path: frozenset(vals) for path, vals in accum.items()}
+
+
 def _get_global_flow_data(flow_path, root: ET.Element) -> ([ET.Element], {str: VariableType}):
     all_named = get_named_elems(root)
 
@@ -1,17 +1,21 @@
+from __future__ import annotations
+
 import json
 import os
 import re
 import sys
+import time
 import logging
 import argparse
 import traceback
+from typing import TYPE_CHECKING
 
-import flowtest.executor as executor
-import flowtest.util as util
 import flowtest.version as version
-import queries.default_query as default_query
-from flowtest.util import make_id
-from public.data_obj import PresetEncoder
+
+# the scanning modules are imported by the functions that use them, so that
+# the subcommands, --help and --version do not pay for them
+if TYPE_CHECKING:
+    from flowtest.query_manager import QuerySpec
 
 """
     Status reporting will be written to stdout and prepended with 
@@ -137,12 +141,16 @@ def get_flow_paths(args: argparse.Namespace) -> (list[str], {str: str}):
         if arg_dir is None:
             arg_dir = CURR_DIR
 
+        from flowtest import util
+
         flow_map = util.get_flows_in_dir(arg_dir)
         flows = list(flow_map.values())
         flow_paths = [os.path.abspath(x) for x in flows]
 
     # Once we have flow paths, we determine labels and namespaces
     if flow_map is None:
+        from flowtest import util
+
         flow_map = {}
         for a_flow in flow_paths:
             label = util.get_label(os.path.dirname(a_flow), os.path.basename(a_flow))
@@ -164,6 +172,9 @@ def get_flow_paths(args: argparse.Namespace) -> (list[str], {str: str}):
 def parse_args(my_args: list[str], default: str = None) -> argparse.Namespace:
     """Defines parameters for argument parsing
 
+    Nothing is imported here, so that --help and --version stay fast: defaults
+    that live in the scanning modules are filled in by the callers.
+
     Args:
         default: unique id for this scan. If None provided, one is generated.
         my_args: argument list (complete, so my_args[0] is the program
@@ -172,9 +183,6 @@ def parse_args(my_args: list[str], default: str = None) -> argparse.Namespace:
     Returns:
         argparse Namespace (parsed arguments)
     """
-    if default is None:
-        default = make_id()
-
     parser = argparse.ArgumentParser(
         prog=my_args[0].split(os.sep)[-1],
         description="Static Analysis of Salesforce Flows",
@@ -205,10 +213,31 @@ def parse_args(my_args: list[str], default: str = None) -> argparse.Namespace:
     paths.add_argument("--infile", help="path of file containing csv separated lists of flows to scan."
                                         "No other flows will be processed", type=check_file_exists)
 
+    parser.add_argument("--prefetch", type=int, default=None,
+                        help=("number of flows (with their subflows) to read in the background ahead of "
+                              "the flow being scanned. 0 disables prefetching. If missing, a small "
+                              "default depth is used."))
+    parser.add_argument("--ir_cache", default=None, type=check_dir_exists_or_create,
+                        help=("directory in which to cache parsed flows between runs. "
+                              "Flows whose contents have not changed are not parsed again."))
+    parser.add_argument("--changed", help=("path of file listing changed flow files (csv, newline separated or "
+                                           "git diff --name-status output). Only flows that are changed or "
+                                           "call a changed flow (directly or indirectly) will be scanned. "
+                                           "Relative paths are resolved against the top level of the git "
+                                           "repository containing the scanned directory, if any, or else "
+                                           "against the scanned directory."),
+                        type=check_file_exists)
+    parser.add_argument("--max_variable_paths", type=int, default=0,
+                        help=("most dataflow paths from the same origin to keep for each variable, preferring "
+                              "the shortest. Defaults to 0 (no limit)."))
+    parser.add_argument("--max_finding_paths", type=int, default=0,
+                        help=("most dataflow paths from the same origin to report for each finding, preferring "
+                              "the shortest. Defaults to 0 (no limit)."))
+
     """
         Options for debug/log handling
     """
-    parser.add_argument("--log_file", default=f".flowtest_log_{default}.log",
+    parser.add_argument("--log_file", default=None,
                         help="path to store logs. If missing, one will be generated",
                         type=check_not_exist)
 
@@ -227,11 +256,23 @@ def parse_args(my_args: list[str], default: str = None) -> argparse.Namespace:
     parser.add_argument("-j", "--json", default=None,
                         help="path to store json report file.",
                         type=check_not_exist)
+    parser.add_argument("--compact_json", action='store_true',
+                        help=("write the json report without indentation, storing each statement and xml snippet "
+                              "once in top-level tables that findings reference by index."))
+    parser.add_argument("--sqlite", required=False, type=check_not_exist,
+                        help=("path to store a SQLite database of findings, paths, statements, flows and queries. "
+                              "It is written as each flow completes."))
     parser.add_argument("-x", "--xml", required=False,
                         help="path to store xml report file.",
                         type=check_not_exist)
     parser.add_argument("-t", "--html", required=False,
                         help="Path to store html report", type=check_not_exist)
+    parser.add_argument("--stats", required=False,
+                        help="path to store json analysis statistics, one record per root flow.",
+                        type=check_not_exist)
+    parser.add_argument("--trace", required=False,
+                        help="path to store a Chrome trace-event json timeline of the scan.",
+                        type=check_not_exist)
 
     """
         Options for labeling reports
@@ -249,8 +290,128 @@ def parse_args(my_args: list[str], default: str = None) -> argparse.Namespace:
     parser.add_argument("--query_path", required=False, help="path of custom query python file")
     parser.add_argument("--query_class", required=False, help="name of class to instantiate in query_path")
     parser.add_argument("--preset", required=False, help="name of preset to use (consumed by query code)")
+    parser.add_argument("--with_default", nargs='?', const="", default=None,
+                        metavar="PRESET",
+                        help="also run the default queries (with the given preset, or else their default "
+                             "preset) in the same crawl as the custom queries")
+    parser.add_argument("--extra_query", nargs='+', action='append', default=None,
+                        metavar=("QUERY_PATH", "QUERY_CLASS [PRESET]"),
+                        help="also run this custom query class in the same crawl. May be repeated.")
+
+    args = parser.parse_args(my_args[1:])
+
+    if args.id is None or args.log_file is None:
+        if default is None:
+            from flowtest.util import make_id
+            default = make_id()
+        if args.id is None:
+            args.id = default
+        if args.log_file is None:
+            try:
+                args.log_file = check_not_exist(f".flowtest_log_{default}.log")
+            except argparse.ArgumentTypeError as e:
+                parser.error(f"argument --log_file: {e}")
+
+    return args
+
+
+def get_extra_queries(args: argparse.Namespace) -> [QuerySpec]:
+    """Query instances to run in addition to the default or custom query
+
+    Args:
+        args: parsed arguments
+
+    Returns:
+        list of QuerySpec (possibly empty)
+
+    Raises:
+        ArgumentTypeError if the options are inconsistent
+    """
+    from flowtest.query_manager import QuerySpec
+
+    extra_queries = []
+    if args.with_default is not None:
+        if args.query_path is None:
+            raise argparse.ArgumentTypeError("--with_default requires a custom query_path")
+        # the default queries pick their default preset if none is given
+        extra_queries.append(QuerySpec(preset=args.with_default or None))
+
+    for extra in args.extra_query or []:
+        if len(extra) not in (2, 3):
+            raise argparse.ArgumentTypeError("--extra_query takes a query path, a query class and an optional preset")
+        check_file_exists(extra[0])
+        extra_queries.append(QuerySpec(module_path=extra[0], class_name=extra[1],
+                                       preset=extra[2] if len(extra) == 3 else None))
+
+    return extra_queries
+
+
+def plan_main(argv: list[str]) -> None:
+    """Entry point of ``flowtest plan``, which writes shard manifests for multi-node scans
+
+    Args:
+        argv: argument list (complete, so argv[1] is 'plan')
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(
+        prog="flowtest plan",
+        description="Split flows into balanced shards that can be scanned independently with --infile",
+    )
+    paths = parser.add_mutually_exclusive_group()
+    paths.add_argument("-f", "--flow", help="path of flow files to plan, csv separated.", required=False)
+    paths.add_argument("-d", "--dir", help="directory containing flow-meta.xml files. Defaults to working directory.",
+                       type=check_dir_exists)
+    paths.add_argument("--infile", help="path of file containing csv separated lists of flows to plan.",
+                       type=check_file_exists)
+    parser.add_argument("-n", "--shards", required=True, type=int, help="number of shards to build")
+    parser.add_argument("-o", "--out_dir", required=True, type=check_dir_exists_or_create,
+                        help="directory in which to write the shard manifests")
+    args = parser.parse_args(argv[2:])
+
+    if args.shards < 1:
+        raise argparse.ArgumentTypeError("At least one shard is needed")
+
+    flow_paths, all_flows = get_flow_paths(args)
+    in_scope = set(flow_paths)
+    all_flows = {label: os.path.abspath(path) for (label, path) in all_flows.items()
+                 if os.path.abspath(path) in in_scope}
 
-    return parser.parse_args(my_args[1:])
+    from flowtest import sharding
+
+    shards = sharding.plan_shards(all_flows, args.shards)
+    for manifest in sharding.write_manifests(shards, args.out_dir):
+        print(f"shard manifest written to {manifest}")
+
+
+def merge_main(argv: list[str]) -> None:
+    """Entry point of ``flowtest merge``, which combines json reports of several shards
+
+    Args:
+        argv: argument list (complete, so argv[1] is 'merge')
+
+    Returns:
+        None
+    """
+    parser = argparse.ArgumentParser(
+        prog="flowtest merge",
+        description="Combine the json reports of several shards into one json report",
+    )
+    parser.add_argument("reports", nargs='+', type=check_file_exists, help="json reports to merge")
+    parser.add_argument("-j", "--json", required=True, type=check_not_exist, help="path to store merged json report")
+    args = parser.parse_args(argv[2:])
+
+    from flowtest import sharding
+
+    reports = []
+    for report_path in args.reports:
+        with open(report_path, 'r', encoding='utf-8') as fp:
+            reports.append(json.load(fp))
+
+    with open(args.json, 'w', encoding='utf-8') as fp:
+        json.dump(sharding.merge_reports(reports), fp, indent=4)
+    print(f"json result file written to {args.json}")
 
 
 # For testing, we allow specifying an argv to main
@@ -264,16 +425,22 @@ def main(argv: list[str] = None) -> str | None:
     Returns:
         None
     """
-    default = make_id()
-
     if argv is None:
         argv = sys.argv
 
-    args = parse_args(argv, default=default)
+    if len(argv) > 1 and argv[1] == 'plan':
+        return plan_main(argv)
+    if len(argv) > 1 and argv[1] == 'merge':
+        return merge_main(argv)
+
+    args = parse_args(argv)
 
     # check if the user wants only a description of the default queries
     if args.preset_info is True:
         # if user has specified a preset, use that or None
+        from public.data_obj import PresetEncoder
+        from queries import default_query
+
         preset_name = args.preset
         preset = default_query.build_preset(preset_name)
         queries = preset.queries
@@ -285,6 +452,9 @@ def main(argv: list[str] = None) -> str | None:
 
         return
 
+    import flow_parser.parse as parse
+    from flowtest import executor, flow_result, flows, hooks, prefetch
+
     # logging
     if args.no_log is True:
         logging.getLogger().setLevel(logging.CRITICAL + 1)
@@ -303,9 +473,38 @@ def main(argv: list[str] = None) -> str | None:
     elif args.query_path is None and args.query_class is not None:
         raise argparse.ArgumentTypeError("A query_path must be provided if a query_class is set")
 
+    extra_queries = get_extra_queries(args)
+
+    if args.max_variable_paths < 0 or args.max_finding_paths < 0:
+        raise argparse.ArgumentTypeError("path budgets cannot be negative")
+    flows.MAX_VARIABLE_PATHS = args.max_variable_paths or None
+    flow_result.MAX_FINDING_PATHS = args.max_finding_paths or None
+
+    disk_cache = None
+    if args.ir_cache is not None:
+        from flowtest import ir_cache
+
+        disk_cache = ir_cache.enable(args.ir_cache)
+
+    trace_hook = None
+    if args.trace is not None:
+        trace_hook = hooks.ChromeTraceHook()
+        hooks.register(trace_hook)
+
     print(f"{STATUS_LABEL} {STATUS_DISCOVERY}")
 
     flow_paths, all_flows = get_flow_paths(args)
+    if args.changed is not None:
+        from flowtest import impact
+
+        # git prints paths relative to the top level of the repository
+        root = impact.get_git_root(args.dir or CURR_DIR) or args.dir or CURR_DIR
+        changed = impact.read_changed_files(args.changed, root=root)
+        for path in impact.get_out_of_scope(changed, all_flows):
+            print(f"warning: changed file {path} is not among the flows in scope")
+        affected = impact.get_affected_flows(changed, all_flows)
+        flow_paths = [x for x in flow_paths if x in affected]
+        print(f"{len(flow_paths)} flows are affected by the changed files")
     if args.label is None:
         if len(flow_paths) == 1:
             label = f"scan of {flow_paths[0]}"
@@ -319,61 +518,129 @@ def main(argv: list[str] = None) -> str | None:
     query_manager = None
 
     # make sure a report has been chosen
-    if args.html is None and args.xml is None and args.json is None:
+    if args.html is None and args.xml is None and args.json is None and args.sqlite is None:
         raise argparse.ArgumentTypeError("No report format chosen")
 
-    for (index, flow_path) in enumerate(flow_paths):
-        total_paths = len(flow_paths)
-        status_message = get_status_msg(index, total_paths)
-        print(f"{status_message} scanning {flow_path}...")
-        try:
-            # top level loop in case something goes wrong
-            # specifically we have noticed it's now possible
-            # to save malformed flows :(
-            query_manager = executor.parse_flow(flow_path,
-                                                requestor=args.requestor,
-                                                report_label=label,
-                                                result_id=args.id,
-                                                service_version=args.service_version,
-                                                help_url=args.url,
-                                                query_manager=query_manager,
-                                                query_module_path=args.query_path,
-                                                query_class_name=args.query_class,
-                                                query_preset=args.preset,
-                                                crawl_dir=args.crawl_dir,
-                                                all_flows=all_flows)
-        except:
-            print(f"error processing flow {flow_path}")
-            print(traceback.format_exc())
-            print("...continuing to next flow..")
+    if len(flow_paths) == 0:
+        # no flow is affected by the changed files, so the reports are written without findings
+        query_manager = executor.build_query_manager(requestor=args.requestor,
+                                                     report_label=label,
+                                                     result_id=args.id,
+                                                     service_version=args.service_version,
+                                                     help_url=args.url,
+                                                     query_module_path=args.query_path,
+                                                     query_class_name=args.query_class,
+                                                     query_preset=args.preset,
+                                                     extra_queries=extra_queries)
+        query_manager.results.scan_end = query_manager.results.scan_start
+
+    exporter = None
+    if args.sqlite is not None:
+        from flowtest import sqlite_export
+
+        exporter = sqlite_export.SqliteExporter(args.sqlite)
+
+    prefetch_depth = prefetch.DEFAULT_DEPTH if args.prefetch is None else args.prefetch
+    with prefetch.Prefetcher(flow_paths, all_flows, depth=prefetch_depth) as prefetcher:
+        for (index, (flow_path, contents)) in enumerate(prefetcher):
+            total_paths = len(flow_paths)
+            status_message = get_status_msg(index, total_paths)
+            print(f"{status_message} scanning {flow_path}...")
+            error = False
+            try:
+                # top level loop in case something goes wrong
+                # specifically we have noticed it's now possible
+                # to save malformed flows :(
+                with parse.in_memory_flows(contents):
+                    query_manager = executor.parse_flow(flow_path,
+                                                        requestor=args.requestor,
+                                                        report_label=label,
+                                                        result_id=args.id,
+                                                        service_version=args.service_version,
+                                                        help_url=args.url,
+                                                        query_manager=query_manager,
+                                                        query_module_path=args.query_path,
+                                                        query_class_name=args.query_class,
+                                                        query_preset=args.preset,
+                                                        crawl_dir=args.crawl_dir,
+                                                        all_flows=all_flows,
+                                                        extra_queries=extra_queries)
+            except:
+                error = True
+                print(f"error processing flow {flow_path}")
+                print(traceback.format_exc())
+                print("...continuing to next flow..")
+
+            if exporter is not None:
+                exporter.write_flow(flow_path, query_manager and query_manager.results, error=error)
+
+    if exporter is not None:
+        exporter.close(query_manager and query_manager.results)
+        print(f"sqlite result file written to {args.sqlite}")
 
     if query_manager is None:
         print("No flow could be scanned. Exiting.")
         sys.exit(-1)
 
     print("scanning complete.")
+    if disk_cache is not None:
+        query_manager.results.query_stats.update(ir_cache_hits=disk_cache.hits, ir_cache_misses=disk_cache.misses)
+    if query_manager.results.skipped_flows > 0:
+        print(f"skipped {query_manager.results.skipped_flows} flows that cannot produce findings.")
+    if len(query_manager.results.query_stats) > 0:
+        print("query statistics: " + ", ".join(f"{name}={value}" for (name, value)
+                                               in sorted(query_manager.results.query_stats.items())))
     print(f"{STATUS_LABEL} {STATUS_REPORT_GEN}")
     if args.xml is not None:
+        start = time.perf_counter()
         xml_rep = query_manager.results.get_cx_xml_str()
         with open(args.xml, 'w') as fp:
             fp.write(xml_rep)
 
         print(f"xml result file written to {args.xml}")
+        emit_report_write(args.xml, 'xml', start)
 
     if args.html is not None:
+        start = time.perf_counter()
         query_manager.results.write_html(args.html)
 
         print(f"html result file written to {args.html}")
+        emit_report_write(args.html, 'html', start)
 
     if args.json is not None:
+        start = time.perf_counter()
         with open(args.json, 'w') as fp:
-            query_manager.results.dump_json(fp)
+            query_manager.results.dump_json(fp, compact=args.compact_json)
 
         print(f"json result file written to {args.json}")
+        emit_report_write(args.json, 'json', start)
+
+    if args.stats is not None:
+        from flowtest import stats
+
+        start = time.perf_counter()
+        with open(args.stats, 'w') as fp:
+            stats.dump_stats(query_manager.results.flow_stats, fp)
+
+        print(f"statistics file written to {args.stats}")
+        emit_report_write(args.stats, 'stats', start)
+
+    if trace_hook is not None:
+        hooks.unregister(trace_hook)
+        trace_hook.write(args.trace)
+
+        print(f"trace file written to {args.trace}")
 
     print(f"{STATUS_LABEL} {STATUS_COMPLETE}")
 
 
+def emit_report_write(report_path: str, report_format: str, start: float) -> None:
+    from flowtest import hooks
+
+    if hooks.ENABLED is True:
+        hooks.emit(hooks.HookKind.report_write, report_path, start, name=report_format)
+
+
 def setup_logger(level, log_file: str):
     """Setup logger for scan run
 
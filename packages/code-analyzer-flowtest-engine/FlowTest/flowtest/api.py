@@ -0,0 +1,154 @@
+"""Library entry point for running scans in-process
+
+Unlike :func:`flowtest.__main__.main`, :func:`scan` does not parse
+arguments, write reports or exit the interpreter. It yields one
+:class:`FlowScanResult` per root flow as soon as that flow is scanned, so
+callers can stream findings, and it accepts flow contents held in memory::
+
+    for result in scan({'flows/Foo.flow-meta.xml': xml_string}, preset='all'):
+        handle(result.findings)
+
+The module level caches of the crawl (flow summaries, formula maps, parsed
+expressions, taint origins) are cleared when the scan ends, so a long-lived
+process does not accumulate the flows of every scan it runs.
+
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+import traceback
+from collections.abc import Generator, Iterable
+from dataclasses import dataclass
+
+import flowtest.branch_state as branch_state
+import flowtest.executor as executor
+import flowtest.flows as flows
+import flowtest.prefilter as prefilter
+import flowtest.reachability as reachability
+from flow_parser import expression_parser, parse
+from flowtest import util
+from flowtest.flow_result import ResultsProcessor
+from flowtest.query_manager import QueryManager, QuerySpec
+from public.data_obj import Preset, QueryResult
+
+#: module logger
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class ScanOptions:
+    # path of custom query module, or None for the default queries
+    query_module_path: str | None = None
+
+    # name of class to instantiate in the query module
+    query_class_name: str | None = None
+
+    # additional query instances to run in the same crawl
+    extra_queries: tuple[QuerySpec, ...] = ()
+
+    # map (namespaced label, local label) --> flow path of additional flows that may be
+    # called as subflows but are not scanned as root flows
+    subflow_paths: {(str, str): str} | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class FlowScanResult:
+    # path of the root flow (as passed to scan)
+    flow_path: str
+
+    # de-duplicated findings of this root flow and the subflows it calls
+    findings: tuple[QueryResult, ...]
+
+    # True if the flow was not crawled because it cannot produce findings
+    skipped: bool
+
+    # wall clock seconds spent on the flow
+    duration: float
+
+    # traceback if the scan of this flow failed, in which case findings are empty
+    error: str | None = None
+
+    # counters reported by the query processors for this flow
+    statistics: {str: int} | None = None
+
+
+def scan(paths: Iterable[str] | {str: str | bytes},
+         preset: str | None = None,
+         options: ScanOptions | None = None) -> Generator[FlowScanResult, None, None]:
+    """Scans root flows one at a time, yielding the results of each
+
+    Args:
+        paths: flow file paths to scan, or a map flow path --> xml contents to scan
+               flows that are not on disk. Subflows are resolved among these flows
+               (and ``options.subflow_paths``) by their labels, as in a directory scan.
+        preset: name of preset to request from the queries
+        options: query selection and subflow scope
+
+    Returns:
+        generator of FlowScanResult, one per root flow, in order
+
+    Raises:
+        RuntimeError if the requested preset is not supported (before any flow is scanned)
+    """
+    options = options or ScanOptions()
+    if isinstance(paths, dict):
+        contents = paths
+        flow_paths = list(paths.keys())
+    else:
+        contents = {}
+        flow_paths = list(paths)
+
+    all_flows = dict(options.subflow_paths or {})
+    for flow_path in flow_paths:
+        all_flows.setdefault(util.get_label(os.path.dirname(flow_path), os.path.basename(flow_path)), flow_path)
+
+    query_manager = QueryManager.build(results=ResultsProcessor(),
+                                       requested_preset=preset,
+                                       module_path=options.query_module_path,
+                                       class_name=options.query_class_name,
+                                       extra_queries=list(options.extra_queries))
+    report_preset = query_manager.results.preset
+
+    try:
+        yield from _scan_flows(flow_paths, contents, all_flows, query_manager, report_preset, preset)
+    finally:
+        _clear_caches()
+
+
+def _scan_flows(flow_paths: [str], contents: {str: str | bytes}, all_flows: {(str, str): str},
+                query_manager: QueryManager, report_preset: Preset | None,
+                preset: str | None) -> Generator[FlowScanResult, None, None]:
+    for flow_path in flow_paths:
+        # each flow gets its own results so that findings are reported per root flow
+        results = ResultsProcessor(preset=report_preset)
+        query_manager.results = results
+        start = time.perf_counter()
+        error = None
+        try:
+            with parse.in_memory_flows(contents):
+                executor.parse_flow(flow_path,
+                                    query_manager=query_manager,
+                                    query_preset=preset,
+                                    all_flows=all_flows)
+        except Exception:
+            error = traceback.format_exc()
+            logger.error(f"error processing flow {flow_path}: {error}")
+            # discard any state the failed crawl left in the queries
+            query_manager.reload()
+
+        yield FlowScanResult(flow_path=flow_path,
+                             findings=tuple(results.stored_results) if error is None else (),
+                             skipped=results.skipped_flows > 0,
+                             duration=time.perf_counter() - start,
+                             error=error,
+                             statistics=dict(results.query_stats) or None)
+
+
+def _clear_caches() -> None:
+    reachability.clear_cache()
+    prefilter.clear_cache()
+    branch_state.clear_cache()
+    expression_parser.clear_cache()
+    flows.clear_origins()
@@ -18,7 +18,7 @@ from flow_parser import parse
 import public.custom_parser as CP
 from public.custom_parser import ET
 from flowtest.control_flow import Crawler
-from flowtest.flows import FlowVector
+from flowtest.flows import FlowVector, get_origin_mask, get_origin_bit
 from flowtest.util import propagate
 from public.contracts import State
 from public.data_obj import DataInfluencePath, DataInfluenceStatement, CrawlStep
@@ -32,6 +32,9 @@ INITIALIZATION_COMMENT = "Initialization"
 
 MAX_FORMULA_DUPLICATES = 3
 
+#: resolved formula maps shared across frames: (flow_path, content hash) --> formula map
+_formula_map_cache: {(str, str): {(str, str): frozenset[DataInfluencePath]}} = {}
+
 #: module logger
 logger = logging.getLogger(__name__)
 
@@ -85,6 +88,21 @@ class BranchState(State):
         #: filename of flow when working in variables across a flow
         self.flow_path: str | None = None
 
+        #: (flow_path, name) of variables that can reach a sink, or None if all variables are wired
+        self.relevant_vars: frozenset[(str, str)] | None = None
+
+        #: largest number of variables in the influence map of a completed crawl step (for statistics)
+        self.peak_map_size: int = 0
+
+        #: crawl steps skipped because their segment visit was equivalent to an earlier visit
+        self.pruned_steps: int = 0
+
+        #: segment label --> [(influence map at entry, last step)] of completed visits that can be reused
+        self.__visit_memo: {str: [({(str, str): FlowVector}, CrawlStep)]} = {}
+
+        #: (segment label, influence map at entry) of the visit in progress, or None if it cannot be reused
+        self.__current_visit: (str, {(str, str): FlowVector}) | None = None
+
     @classmethod
     def from_parser(cls, parser: parse.Parser) -> BranchState:
         """Returns a state instance with variable defaults populated
@@ -106,6 +124,14 @@ class BranchState(State):
 
         return state
 
+    def get_peak_map_size(self) -> int:
+        """Largest number of variables held in the influence map of any crawl step so far
+
+        Returns:
+            number of (flow_path, variable name) keys
+        """
+        return max(self.peak_map_size, len(self._get_influence_map() or {}))
+
     def get_parser(self) -> parse.Parser:
         """Retrieve current parser associated to this flow.
 
@@ -234,48 +260,118 @@ class BranchState(State):
 
         return accum
 
-    def load_crawl_step(self, crawler: Crawler, crawl_step: CrawlStep = None) -> CrawlStep | None:
+    def load_crawl_step(self, crawler: Crawler, crawl_step: CrawlStep = None,
+                        prune: bool = False) -> CrawlStep | None:
         """Updates the state after crawling to next Flow Element
 
+        With ``prune``, a visitor entering a segment with the same influence
+        map (all vectors identical) as an earlier completed visit of that
+        segment skips the segment: its steps would compute the same maps
+        and findings, so the map at the end of the earlier visit is reused
+        and the next step is loaded instead.
+
         Args:
             crawler: crawler
             crawl_step: step to load
+            prune: whether segment visits equivalent to an earlier visit may be skipped
+                   (ignored when ``crawl_step`` is provided)
 
         Returns:
              CrawlStep that was loaded
 
         """
-        if crawl_step is None:
-            cs = crawler.get_crawl_step()
-        else:
-            cs = crawl_step
+        while True:
+            if crawl_step is None:
+                cs = crawler.get_crawl_step()
+            else:
+                cs = crawl_step
 
-        if cs is None:
-            # nothing left to crawl
-            return None
+            if cs is None:
+                # nothing left to crawl
+                self.__current_visit = None
+                return None
 
-        # find the appropriate parent map to clone:
-        if self.current_crawl_step is None:
-            old_map = self.__default_map
-        elif cs.visitor == self.current_crawl_step.visitor:
-            old_map = self.__influence_map[self.current_crawl_step]
-        else:
-            old_cs = crawler.get_last_ancestor(cs)
-            if old_cs is None:
-                # no predecessor, so we use default
+            if self.current_crawl_step is not None:
+                # the map of the previous step is complete
+                self.peak_map_size = max(self.peak_map_size, len(self.__influence_map[self.current_crawl_step]))
+
+            # find the appropriate parent map to clone:
+            new_visit = True
+            if self.current_crawl_step is None:
                 old_map = self.__default_map
+            elif cs.visitor == self.current_crawl_step.visitor:
+                old_map = self.__influence_map[self.current_crawl_step]
+                new_visit = False
             else:
-                old_map = self.__influence_map[old_cs]
+                old_cs = crawler.get_last_ancestor(cs)
+                if old_cs is None:
+                    # no predecessor, so we use default
+                    old_map = self.__default_map
+                else:
+                    old_map = self.__influence_map[old_cs]
+
+            if new_visit is True and crawl_step is None:
+                if self._end_visit(crawler, cs, old_map, prune) is True:
+                    # skipped, so move on to the next visit
+                    continue
 
-        # make shallow copy
-        self.__influence_map[cs] = copy.copy(old_map)
+            # make shallow copy
+            self.__influence_map[cs] = copy.copy(old_map)
 
-        # load current element and step info
-        self.current_crawl_step = cs
-        self.current_elem = self.parser.get_by_name(cs.element_name)
-        self.current_elem_name = cs.element_name
+            # load current element and step info
+            self.current_crawl_step = cs
+            self.current_elem = self.parser.get_by_name(cs.element_name)
+            self.current_elem_name = cs.element_name
 
-        return cs
+            return cs
+
+    def discard_visit(self) -> None:
+        """Prevents the segment visit in progress from being reused by later visits
+
+        Call when the visit has side effects other than on the influence
+        map, e.g. when it launches a subflow.
+
+        Returns:
+            None
+        """
+        self.__current_visit = None
+
+    def _end_visit(self, crawler: Crawler, cs: CrawlStep,
+                   old_map: {(str, str): FlowVector}, prune: bool) -> bool:
+        """Memoizes the completed segment visit and checks whether the new one can be skipped
+
+        Args:
+            crawler: crawler serving the steps
+            cs: first step of the new visit
+            old_map: influence map the new visit starts from
+            prune: whether the new visit may be skipped or memoized
+
+        Returns:
+            True if the new visit was skipped
+        """
+        if self.__current_visit is not None:
+            label, entry_map = self.__current_visit
+            self.__visit_memo.setdefault(label, []).append((entry_map, self.current_crawl_step))
+            self.__current_visit = None
+
+        if prune is False:
+            return False
+
+        label = cs.visitor.current_label
+        for (entry_map, last_step) in self.__visit_memo.get(label, ()):
+            # vectors are never modified in place, so identical vectors mean identical flows
+            if len(entry_map) == len(old_map) and all(old_map.get(k) is v for k, v in entry_map.items()):
+                skipped = [cs] + crawler.skip_visit(cs.visitor)
+                # share the (complete) map of the equivalent visit
+                self.__influence_map[skipped[-1]] = self.__influence_map[last_step]
+                self.current_crawl_step = skipped[-1]
+                self.current_elem_name = skipped[-1].element_name
+                self.current_elem = self.parser.get_by_name(self.current_elem_name)
+                self.pruned_steps += len(skipped)
+                return True
+
+        self.__current_visit = (label, dict(old_map))
+        return False
 
     def get_flows_from_sources(self, influenced_var: str,
                                source_vars: {(str, str)}, all_steps=False) -> set[DataInfluencePath] | None:
@@ -327,8 +423,14 @@ class BranchState(State):
         else:
             steps_to_check = [self.__influence_map.keys()]
 
+        source_mask = get_origin_mask(source_vars)
+
         to_return = set()
         for step in steps_to_check:
+            if self._get_origin_mask(parent, formula_flows, step=step) & source_mask == 0:
+                # no flow into this variable starts at a source
+                continue
+
             tgt_vec = self._get_or_make_from_type(parent, member, type_info,
                                                   store=False, step=step)
             if formula_flows is not None:
@@ -354,6 +456,46 @@ class BranchState(State):
         else:
             return to_return
 
+    def get_fingerprint(self, var_name: str) -> tuple[FlowVector | None, ...] | None:
+        """Vectors read by :meth:`get_flows_from_sources` for this variable at the current step
+
+        Vectors are never modified in place, so if all members of two
+        fingerprints are identical, the flows into the variable are the same.
+
+        Args:
+            var_name: (raw, unresolved) variable name
+
+        Returns:
+            the vectors (None for absent vectors), or None if the variable does not resolve
+        """
+        res = self.parser.resolve_by_name(var_name)
+        if res is None:
+            return None
+        parent = res[0]
+        formula_flows = self.formula_map.get((self.flow_path, parent))
+        if formula_flows is None:
+            tails = [parent]
+        else:
+            tails = [parent] + sorted({x.influencer_name for x in formula_flows})
+
+        return tuple(self._get_vector(flow_path=self.flow_path, name=x) for x in tails)
+
+    def is_relevant(self, var_name: str) -> bool:
+        """Whether statements influencing this variable need to be wired
+
+        Args:
+            var_name: (raw, unresolved) variable name in the current flow
+
+        Returns:
+            False if the variable is known to not reach any sink
+        """
+        if self.relevant_vars is None:
+            return True
+        res = self.parser.resolve_by_name(var_name)
+        if res is None:
+            return True
+        return (self.flow_path, res[0]) in self.relevant_vars
+
     def get_or_make_vector(self, name: str, flow_path: str = None,
                            store=False, step: CrawlStep = None) -> FlowVector | None:
         """Retrieve vector and if none exists, create it.
@@ -511,6 +653,33 @@ class BranchState(State):
     #
     #
 
+    def _get_origin_mask(self, parent: str, formula_flows: {DataInfluencePath} | None,
+                         step: CrawlStep = None) -> int:
+        """Bitset of the origins of all flows that can reach the variable
+
+        Args:
+            parent: resolved variable name (no member)
+            formula_flows: resolved formula flows, if the variable is a formula
+            step: crawl step to use
+
+        Returns:
+            origin mask (see :meth:`FlowVector.get_origin_mask`)
+        """
+        if formula_flows is None:
+            tails = (parent,)
+        else:
+            tails = {x.influencer_name for x in formula_flows}
+
+        mask = 0
+        for tail in tails:
+            vec = self._get_vector(flow_path=self.flow_path, name=tail, step=step)
+            if vec is None:
+                # uninitialized variables only have their own initialization flow
+                mask |= get_origin_bit((self.flow_path, tail))
+            else:
+                mask |= vec.get_origin_mask()
+        return mask
+
     def _get_or_make_from_type(self, parent: str, type_info: parse.VariableType, path: str = None,
                                store=False, step: CrawlStep = None):
         """Retrieve or make vector based on Variable Type
@@ -816,6 +985,15 @@ class BranchState(State):
         return to_return
 
 
+def clear_cache() -> None:
+    """Forgets the resolved formula maps shared across frames
+
+    Returns:
+        None
+    """
+    _formula_map_cache.clear()
+
+
 def _build_path_from_history(parser: parse.Parser, history: tuple[DataInfluenceStatement, ...],
                              strict=False, **type_replacements) -> DataInfluencePath:
     """Creates a Dataflow Influence Path from the tuple of influence statements
@@ -870,13 +1048,22 @@ def _build_formula_map(parser: parse.Parser, flow_path: str) -> dict[(str, str):
 
     Returns:
         a fully resolved map:: {(flow_path, elem_name) --> [DataflowInfluencePaths]}
+        The map is shared by all frames of the same flow and must not be modified.
     """
+    cache_key = (parser.flow_path, parser.content_hash)
+    if parser.content_hash is not None and cache_key in _formula_map_cache:
+        return _formula_map_cache[cache_key]
+
     raw_formula_map = _get_raw_formula_map(parser, flow_path)
     flow_path = parser.flow_path
     to_return = {}
+    resolved = {}
 
     for x in raw_formula_map:
-        to_return[(flow_path, x)] = _resolve_influencers(x, raw_formula_map, parser)
+        to_return[(flow_path, x)] = _resolve_influencers(x, raw_formula_map, parser, resolved=resolved)
+
+    if parser.content_hash is not None:
+        _formula_map_cache[cache_key] = to_return
     return to_return
 
 
@@ -960,9 +1147,11 @@ def _extend_formula_map_by_flows(start_flows: set[DataInfluencePath],
     return accum
 
 
-def _resolve_influencers(elem_ref_name: ET.Element,
+def _resolve_influencers(elem_ref_name: str,
                          raw_formula_map: {str: [DataInfluenceStatement]},
-                         parser: parse.Parser) -> {DataInfluencePath}:
+                         parser: parse.Parser,
+                         resolved: {str: frozenset[DataInfluencePath]} | None = None,
+                         in_progress: set[str] | None = None) -> frozenset[DataInfluencePath]:
     """Resolves indirect references
 
     This function exists to handle recursion in formulas/templates::
@@ -977,8 +1166,9 @@ def _resolve_influencers(elem_ref_name: ET.Element,
                       formula1 <-- template3,
                       }
 
-    Keep unpacking this with a double ended queue, creating
-    longer influence paths, until all influence paths start with
+    The formulas form a DAG which is traversed depth first. Each formula
+    is resolved once, and its resolution is combined with every statement
+    that references it, until all influence paths start with
     direct elements (elements not in the formula map).
     and then this set of influence paths is stored in the formula_map::
 
@@ -992,6 +1182,8 @@ def _resolve_influencers(elem_ref_name: ET.Element,
         elem_ref_name: the formula or template elem name to resolve
         raw_formula_map: the raw map
         parser: parser to create influence paths
+        resolved: memo of formulas already resolved in this flow
+        in_progress: formulas currently being resolved (for cycle detection)
 
     Returns:
         value of the formula map for elem_ref_name
@@ -999,71 +1191,71 @@ def _resolve_influencers(elem_ref_name: ET.Element,
     # we should only be resolving indirect references
     assert elem_ref_name in raw_formula_map
 
+    if resolved is None:
+        resolved = {}
+    if in_progress is None:
+        in_progress = set()
+
+    if elem_ref_name in resolved:
+        return resolved[elem_ref_name]
+
+    in_progress.add(elem_ref_name)
     accum = set()
-    # Raw map has DFR, so turn these into flows
-    to_resolve = [_build_path_from_history(history=(x,), parser=parser, strict=False)
-                  for x in raw_formula_map[elem_ref_name]]
 
-    seen_resolvers = set()
+    # Raw map has DFR, so turn these into flows
+    for stmt in raw_formula_map[elem_ref_name]:
+        curr_flow = _build_path_from_history(history=(stmt,), parser=parser, strict=False)
+        influencer = curr_flow.influencer_name
 
-    while len(to_resolve) > 0:
-        curr_flow = to_resolve.pop()
-        if (curr_flow.influencer_name in raw_formula_map and
-                curr_flow.influencer_name not in seen_resolvers):
+        if influencer not in raw_formula_map:
+            accum.add(curr_flow)
 
-            seen_resolvers.add(curr_flow.influencer_name)
+        elif influencer in in_progress:
+            # Flows with circular formulas cannot be saved, but we don't
+            # want to hang on malformed xml, so drop the back edge.
+            logger.warning(f"Circular formula reference {elem_ref_name} <-- {influencer} "
+                           f"in {parser.flow_path}")
 
-            to_resolve = to_resolve + [DataInfluencePath.combine(
-                _build_path_from_history(history=(x,), parser=parser), curr_flow
-            ) for x in raw_formula_map[curr_flow.influencer_name]
-            ]
         else:
-            accum.add(curr_flow)
+            for upstream in _resolve_influencers(influencer, raw_formula_map, parser,
+                                                 resolved=resolved, in_progress=in_progress):
+                accum.add(DataInfluencePath.combine(upstream, curr_flow))
 
-    # Now prune
-    # TODO: this is inefficient, but is only done once on flow initialization
-    # We assume all formula maps resolve -- e.g. there are no loops where
-    # {!formula1} = {!formula2} + {!var1}
-    # {!formula2} = {!formula1} + {!var3}
-    # therefore the fully resolved map will not reference any formulas as influencers
-    # But the map as constructed above includes intermediate steps. E.g. if
-    # formula1 <- formula2 <- var
-    # then the accum will have
-    # formula1 <- formula2 and
-    # formula1 <- formula2 <- var
-    # ...so we remove the intermediate flows here:
-    duplicates = set()
-    for x in accum:
-        if x.influencer_name in raw_formula_map:
-            duplicates.add(x)
-            # no need to look for other occurrences in raw_formula_map
-            continue
-
-    deduped = accum - duplicates
-
-    # next, we limit how many times the same influencer can appear
-    # NOTE: this will result in some loss of accuracy, because it's
-    # possible than the same variable will influence an expression in
-    # different ways, only one of which are security relevant, and this
-    # analysis may hide that info by pruning meaningful dataflow paths.
-    #
-    # However, we want to limit dataflow explosion so there is a trade off.
-    #
-    # TODO: consider doing this only for large formula maps
+    in_progress.discard(elem_ref_name)
+
+    to_return = _limit_duplicate_influencers(accum)
+    resolved[elem_ref_name] = to_return
+    return to_return
 
+
+def _limit_duplicate_influencers(flows: {DataInfluencePath}) -> frozenset[DataInfluencePath]:
+    """Limits how many times the same influencer can appear, preferring shorter paths
+
+    NOTE: this will result in some loss of accuracy, because it's
+    possible than the same variable will influence an expression in
+    different ways, only one of which are security relevant, and this
+    analysis may hide that info by pruning meaningful dataflow paths.
+
+    However, we want to limit dataflow explosion so there is a trade off.
+
+    TODO: consider doing this only for large formula maps
+
+    Args:
+        flows: resolved formula flows
+
+    Returns:
+        at most MAX_FORMULA_DUPLICATES flows per influencer
+    """
     seen_influencers = {}
-    excess_influencers = set()
+    accum = []
 
-    for x in deduped:
-        if x.influencer_name not in seen_influencers:
-            seen_influencers[x.influencer_name] = 1
-        else:
-            if seen_influencers[x.influencer_name] == MAX_FORMULA_DUPLICATES:
-                excess_influencers.add(x)
-            else:
-                seen_influencers[x.influencer_name] += 1
+    for x in sorted(flows, key=lambda flow: len(flow.history)):
+        count = seen_influencers.get(x.influencer_name, 0)
+        if count < MAX_FORMULA_DUPLICATES:
+            seen_influencers[x.influencer_name] = count + 1
+            accum.append(x)
 
-    return deduped - excess_influencers
+    return frozenset(accum)
 
 
 def _populate_defaults(state: BranchState, parser: parse.Parser) -> None:
@@ -6,6 +6,7 @@ from __future__ import annotations
 import dataclasses
 import json
 from abc import ABC
+from collections import deque
 from collections.abc import Generator
 from dataclasses import dataclass, field
 from typing import TextIO
@@ -17,6 +18,12 @@ from public.enums import ConnType
 from public.parse_utils import (ET, get_name, get_conn_target_map,
                                 is_subflow, is_loop, get_tag)
 
+#: number of segments the crawler pulls ahead of the current step
+CRAWL_LOOKAHEAD: int = 32
+
+#: name of the control flow graph in :attr:`flow_parser.parse.FlowTables.derived`
+CFG_KEY: str = 'cfg'
+
 
 @dataclass(frozen=True)
 class JSONSerializable(ABC):
@@ -243,6 +250,40 @@ class ControlFlowGraph(JSONSerializable):
 
     @classmethod
     def from_parser(cls, parser: parse.Parser):
+        """Builds the control flow graph of the parser's flow
+
+        The graph only depends on the flow's own tables, so a pristine copy is
+        kept with them (and persisted by the IR cache). Crawls mark segments
+        as visited, so each call returns a fresh copy.
+
+        Args:
+            parser: parser of the flow
+
+        Returns:
+            ControlFlowGraph that has not been crawled
+        """
+        tables = parser.flow_tables
+        if tables is not None and CFG_KEY in tables.derived:
+            return tables.derived[CFG_KEY].copy()
+
+        cfg = cls.build(parser)
+        if tables is not None:
+            tables.derived[CFG_KEY] = cfg
+        return cfg.copy()
+
+    def copy(self) -> ControlFlowGraph:
+        """Copy of the graph with no visited segments
+
+        Returns:
+            ControlFlowGraph
+        """
+        return ControlFlowGraph(start_label=self.start_label,
+                                inbound=self.inbound,
+                                segment_map={label: dataclasses.replace(seg, seen_visitors=[])
+                                             for (label, seg) in self.segment_map.items()})
+
+    @classmethod
+    def build(cls, parser: parse.Parser):
         start_elem = parser.get_start_elem()
         start_label = get_name(start_elem)
         visited_labels = []
@@ -315,6 +356,10 @@ class CrawlSchedule(ABC):
 def get_crawl_schedule(cfg: ControlFlowGraph) -> ((CrawlStep,), (CrawlStep,)):
     """Builds crawl schedule
 
+    .. NOTE:: This materializes the entire crawl and is intended for
+              dumping crawl specifications. Analysis should use the
+              :class:`Crawler`, which pulls steps lazily.
+
     Args:
         cfg: Control Flow Graph
 
@@ -325,30 +370,41 @@ def get_crawl_schedule(cfg: ControlFlowGraph) -> ((CrawlStep,), (CrawlStep,)):
     generator = crawl_iter(cfg)
     crawl_steps = []
     terminal_steps = []
-    step = 0
 
     for (visitor, segment) in generator:
-        if segment.is_terminal is True:
-            terminal_steps.append(
-                CrawlStep(
-                    step=step + len(segment.traversed) - 1,
-                    visitor=visitor,
-                    element_name=segment.traversed[-1]
-                )
-            )
-        for el_name in segment.traversed:
-            crawl_steps.append(
-                CrawlStep(
-                    step=step,
-                    visitor=visitor,
-                    element_name=el_name
-                )
-            )
-            step += 1
+        steps, terminal_step = _get_segment_steps(visitor, segment, len(crawl_steps))
+        if terminal_step is not None:
+            terminal_steps.append(terminal_step)
+        crawl_steps.extend(steps)
 
     return tuple(crawl_steps), tuple(terminal_steps)
 
 
+def _get_segment_steps(visitor: BranchVisitor, segment: Segment,
+                       start_step: int) -> ([CrawlStep], CrawlStep | None):
+    """Generate the crawl steps for a visit to a segment
+
+    Args:
+        visitor: visitor entering the segment
+        segment: segment being visited
+        start_step: step number of the first element in the segment
+
+    Returns:
+        (list of crawl steps, terminal crawl step or None if the segment is not terminal)
+    """
+    steps = [CrawlStep(step=start_step + index, visitor=visitor, element_name=el_name)
+             for index, el_name in enumerate(segment.traversed)]
+
+    if segment.is_terminal is True:
+        terminal_step = CrawlStep(step=start_step + len(segment.traversed) - 1,
+                                  visitor=visitor,
+                                  element_name=segment.traversed[-1])
+    else:
+        terminal_step = None
+
+    return steps, terminal_step
+
+
 def crawl_iter(cfg: ControlFlowGraph) -> Generator[(BranchVisitor, [Segment]), None, None]:
     """crawls CFG
 
@@ -591,59 +647,108 @@ class CrawlEncoder(json.JSONEncoder):
 class Crawler:
     """Class representing the crawl of a graph
 
+    Crawl steps are pulled lazily from :func:`crawl_iter`, so that we
+    never hold more than a bounded lookahead of steps in memory and
+    no work is wasted on steps that are never processed. Terminal steps
+    are identified as their segments are pulled from the generator.
+
     """
 
-    def __init__(self, total_steps: int, crawl_schedule: (CrawlStep,),
-                 terminal_steps: (CrawlStep,),
-                 history_maps: {((str, str),): CrawlStep}):
+    def __init__(self, cfg: ControlFlowGraph, lookahead: int = CRAWL_LOOKAHEAD):
         """Constructor
 
         .. WARNING:: For module use only
 
         Args:
-            total_steps: how many steps in crawl
-            crawl_schedule: tuple of :class:`public.data_obj.CrawlStep` in order of execution
-            terminal_steps: tuple of :class:`public.data_obj.CrawlStep`
-                            that can end program (note, *not* in any specific order)
-            history_maps: map from history to last seen crawl_step with this history
+            cfg: control flow graph to crawl
+            lookahead: number of segments to pull from the crawl generator
+                       ahead of the current step (for progress reporting)
 
         """
         #: int current step of crawl
         self.current_step = 0
 
-        #: int total number of steps
-        self.total_steps = total_steps
-
         #: crawl_step -> last seen ancestor
-        self.history_maps = history_maps or {}
+        self.history_maps: {((str, str),): CrawlStep} = {}
+
+        #: how many segments to keep buffered ahead of the current step
+        self.lookahead: int = max(lookahead, 1)
+
+        #: number of segments in the control flow graph (for statistics)
+        self.segment_count: int = len(cfg.segment_map)
+
+        #: generator yielding (visitor, segment) pairs
+        self.__crawl_iter: Generator[(BranchVisitor, Segment), None, None] = crawl_iter(cfg)
+
+        #: buffered crawl steps that have been generated but not yet served
+        self.__pending: deque[CrawlStep] = deque()
 
-        #: tuple(:ref:`public.data_obj.CrawlStep`) all crawl steps in order of execution
-        self.crawl_schedule = crawl_schedule
+        #: number of segments currently buffered in __pending
+        self.__pending_segments: deque[int] = deque()
 
-        #: tuple(:ref:`public.data_obj.CrawlStep`) steps that can terminate the program
-        self.terminal_steps = terminal_steps
+        #: steps that can terminate the program (in order of discovery)
+        self.__terminal_steps: [CrawlStep] = []
+
+        #: number of steps generated so far (served + buffered)
+        self.__generated_steps: int = 0
+
+        #: True once the crawl generator is exhausted
+        self.__exhausted: bool = False
 
     @classmethod
-    def from_parser(cls, parser: parse.Parser):
-        """Builds a crawl schedule (recommended builder)
+    def from_parser(cls, parser: parse.Parser, lookahead: int = CRAWL_LOOKAHEAD):
+        """Builds a crawler over the flow's control flow graph (recommended builder)
 
         Args:
             parser: :obj:`flow_parser.parse.Parser` instance
+            lookahead: number of segments to buffer ahead of the current step
 
         Returns:
             :obj:`Crawler` instance
 
         """
         cfg = ControlFlowGraph.from_parser(parser)
-        crawl_schedule, terminal_steps = get_crawl_schedule(cfg)
-        total_steps = len(crawl_schedule)
+        return Crawler(cfg=cfg, lookahead=lookahead)
+
+    @property
+    def total_steps(self) -> int:
+        """Approximate number of steps in the crawl
 
-        return Crawler(
-            total_steps=total_steps,
-            crawl_schedule=crawl_schedule,
-            terminal_steps=terminal_steps,
-            history_maps=None
-        )
+        This is exact once the crawl generator is exhausted, otherwise it
+        counts the steps served so far plus the buffered lookahead.
+
+        Returns:
+            number of steps generated so far
+        """
+        return self.__generated_steps
+
+    @property
+    def is_exhausted(self) -> bool:
+        return self.__exhausted
+
+    @property
+    def branch_count(self) -> int:
+        """Number of distinct branches (visitor histories) served so far"""
+        return len(self.history_maps)
+
+    @property
+    def terminal_count(self) -> int:
+        """Number of terminal steps generated so far (without forcing the rest of the crawl)"""
+        return len(self.__terminal_steps)
+
+    @property
+    def terminal_steps(self) -> (CrawlStep,):
+        """Steps that can terminate the program (note, *not* in any specific order)
+
+        .. NOTE:: If accessed before the crawl is complete, the remaining
+                  schedule is generated so that all terminal steps are known.
+
+        Returns:
+            tuple of :class:`public.data_obj.CrawlStep`
+        """
+        while self._pull_segment():
+            pass
+        return tuple(self.__terminal_steps)
 
     def get_crawl_step(self) -> CrawlStep | None:
         """Retrieve the next crawl step
@@ -652,13 +757,34 @@ class Crawler:
             :obj:`public.data_obj.BranchVisitor` and flow element name to process
 
         """
-        if self.current_step >= self.total_steps:
+        self._fill()
+        if len(self.__pending) == 0:
             return None
-        else:
-            to_return = self.crawl_schedule[self.current_step]
-            self.history_maps[to_return.visitor.history] = to_return
-            self.current_step += 1
-            return to_return
+
+        to_return = self.__pending.popleft()
+        self.__pending_segments[0] -= 1
+        if self.__pending_segments[0] == 0:
+            self.__pending_segments.popleft()
+
+        self.history_maps[to_return.visitor.history] = to_return
+        self.current_step += 1
+        return to_return
+
+    def skip_visit(self, visitor: BranchVisitor) -> [CrawlStep]:
+        """Serves the remaining steps of a segment visit without returning them one by one
+
+        Args:
+            visitor: visitor of the step most recently served
+
+        Returns:
+            the skipped steps, in order
+        """
+        skipped = []
+        while True:
+            self._fill()
+            if len(self.__pending) == 0 or self.__pending[0].visitor is not visitor:
+                return skipped
+            skipped.append(self.get_crawl_step())
 
     def set_step(self, step: int) -> None:
         self.current_step = step
@@ -689,6 +815,41 @@ class Crawler:
         else:
             return res
 
+    def _fill(self) -> None:
+        """Pull segments from the crawl generator until the lookahead is full
+
+        Returns:
+            None
+        """
+        while len(self.__pending_segments) < self.lookahead:
+            if not self._pull_segment():
+                return
+
+    def _pull_segment(self) -> bool:
+        """Pull the next segment from the crawl generator into the buffer
+
+        Returns:
+            False if the generator is exhausted, True otherwise
+        """
+        if self.__exhausted:
+            return False
+
+        try:
+            visitor, segment = next(self.__crawl_iter)
+        except StopIteration:
+            self.__exhausted = True
+            return False
+
+        steps, terminal_step = _get_segment_steps(visitor, segment, self.__generated_steps)
+        if terminal_step is not None:
+            self.__terminal_steps.append(terminal_step)
+
+        if len(steps) > 0:
+            self.__pending.extend(steps)
+            self.__pending_segments.append(len(steps))
+            self.__generated_steps += len(steps)
+        return True
+
 
 def get_connector_map(elem: ET.Element,
                       parser: Parser) -> {ET.Element: (str, ConnType, bool)}:
@@ -704,7 +865,12 @@ def get_connector_map(elem: ET.Element,
         connector map
 
     """
-    raw = get_conn_target_map(elem)
+    facts = parser.get_element_facts(get_name(elem))
+    if facts is not None and facts.tag == get_tag(elem):
+        # connectors are extracted once per flow by the parser
+        raw = dict(facts.connectors)
+    else:
+        raw = get_conn_target_map(elem)
 
     # make sure the target elem exists
     return {x: v for x, v in raw.items() if v[0] in parser.all_names}
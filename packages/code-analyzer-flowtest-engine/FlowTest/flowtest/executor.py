@@ -11,15 +11,18 @@ from __future__ import annotations
 import json
 import logging
 import os
+import time
 import traceback
 from typing import TYPE_CHECKING
 
+import flowtest.branch_state as branch_state
 import flowtest.control_flow as crawl_spec
 import flow_parser.parse as parse
+from flow_parser import expression_parser
 import public.parse_utils
 from flowtest.control_flow import Crawler, ControlFlowGraph
 from flowtest.branch_state import BranchState
-from flowtest.query_manager import QueryManager, QueryAction
+from flowtest.query_manager import QueryManager, QueryAction, QuerySpec
 from public import parse_utils
 from flowtest.util import resolve_name
 
@@ -30,8 +33,12 @@ from datetime import datetime
 
 import flowtest.flows as flows
 
-from flowtest import wire
+from flowtest import hooks, prefilter, reachability, wire
+from flowtest.hooks import HookKind
 from flowtest.flow_result import ResultsProcessor as Results
+from flowtest.stats import FlowStats, get_peak_rss
+from public.data_obj import get_path_count
+from queries.default_query import get_sink_types
 
 #: for debugging the flow being analyzed
 FOLLOW_SUBFLOWS: bool = True
@@ -42,6 +49,18 @@ TRUST_CARNAC: bool = True
 #: store outputs when re-running subflows and compare with predicted
 TRY_CARNAC: bool = True
 
+#: skip the crawl of root flows in which no source can reach a sink (default queries only)
+SKIP_UNREACHABLE: bool = True
+
+#: skip parsing root flows whose subflow closure lacks a source or a sink (default queries only)
+SKIP_LEXICAL: bool = True
+
+#: only wire statements into variables that can reach a sink (default queries only)
+SLICE_WIRING: bool = True
+
+#: skip segment visits that start from the same influence map as an earlier visit (default queries only)
+PRUNE_EQUIVALENT_VISITS: bool = True
+
 #: logger for current module
 logger: logging.Logger = logging.getLogger(__name__)
 
@@ -53,13 +72,17 @@ class Stack(object):
     return it is popped."""
 
     def __init__(self, root_flow_path: str, all_flow_paths: {str: str},
-                 query_manager: QueryManager):
+                 query_manager: QueryManager,
+                 relevant_vars: frozenset[(str, str)] | None = None,
+                 prune_visits: bool = False):
         """Constructor (can be used)
 
         Args:
             root_flow_path: current filename of flow being processed
             all_flow_paths: map[flow_name] -> flow_path of all files in scope
             query_manager: invokes queries and stores results
+            relevant_vars: (flow_path, name) of variables to wire, or None to wire all
+            prune_visits: whether to skip segment visits equivalent to an earlier visit
 
         Results:
             result instance object
@@ -84,11 +107,34 @@ class Stack(object):
         self.current_frame: Frame = Frame.build(current_flow_path=root_flow_path,
                                                 all_flow_paths=all_flow_paths,
                                                 resolved_subflows=self.resolved_subflows,
-                                                query_manager=query_manager)
+                                                query_manager=query_manager,
+                                                relevant_vars=relevant_vars,
+                                                prune_visits=prune_visits)
 
         #: pointer to query manager so that it can be returned on exit
         self.query_manager: QueryManager = query_manager
 
+        #: crawl steps processed in all collected frames
+        self.crawl_steps: int = 0
+
+        #: distinct branches crawled in all collected frames
+        self.branch_count: int = 0
+
+        #: terminal steps of all collected frames
+        self.terminal_steps: int = 0
+
+        #: number of frames pushed for subflows
+        self.subflow_invocations: int = 0
+
+        #: subflow calls answered from the carnac cache in all collected frames
+        self.fast_forwards: int = 0
+
+        #: largest influence map of any collected frame
+        self.peak_map_size: int = 0
+
+        #: crawl steps skipped as equivalent to earlier segment visits in all collected frames
+        self.pruned_steps: int = 0
+
     def pop(self) -> Frame | None:
         """Get next frame from stack
 
@@ -127,9 +173,17 @@ class Stack(object):
                 # we have a function call and need to store the current frame on the stack
                 self.push(self.current_frame)
                 self.current_frame = next_frame
+                self.subflow_invocations += 1
+                if hooks.ENABLED is True:
+                    hooks.emit(HookKind.frame_push, next_frame.flow_path,
+                               caller=self.__frame_stack[0].flow_path, depth=len(self.__frame_stack))
             else:
                 # save the (collected) frame
                 self.__collected_frames.append(self.current_frame)
+                self.add_frame_counters(self.current_frame)
+                if hooks.ENABLED is True:
+                    hooks.emit(HookKind.frame_pop, self.current_frame.flow_path, self.current_frame.start_time,
+                               depth=len(self.__frame_stack), steps=self.current_frame.crawler.current_step)
 
                 # next frame is None, so grab the next frame from the stack
                 next_frame = self.pop()
@@ -161,6 +215,22 @@ class Stack(object):
                     # now switch execution to new frame
                     self.current_frame = next_frame
 
+    def add_frame_counters(self, frame: Frame) -> None:
+        """Adds the statistics counters of a completed frame to the stack totals
+
+        Args:
+            frame: frame whose crawl is complete
+
+        Returns:
+            None
+        """
+        self.crawl_steps += frame.crawler.current_step
+        self.branch_count += frame.crawler.branch_count
+        self.terminal_steps += frame.crawler.terminal_count
+        self.fast_forwards += frame.fast_forwards
+        self.pruned_steps += frame.state.pruned_steps
+        self.peak_map_size = max(self.peak_map_size, frame.state.get_peak_map_size())
+
 
 def add_inputs_to_call_cache(cache: {str: [[{(str, str): flows.FlowVector}]]},
                              sub_path: str,
@@ -321,12 +391,26 @@ class Frame(object):
         #: store inputs of subflow in child frame (testing only)
         self.inputs = None
 
+        #: (flow_path, name) of variables to wire, or None to wire all
+        self.relevant_vars: frozenset[(str, str)] | None = None
+
+        #: number of subflow calls answered from the carnac cache
+        self.fast_forwards: int = 0
+
+        #: whether segment visits equivalent to an earlier visit are skipped
+        self.prune_visits: bool = False
+
+        #: value of time.perf_counter when the frame was built (for hooks)
+        self.start_time: float | None = None
+
     @classmethod
     def build(cls, current_flow_path: str | None = None,
               all_flow_paths: {str: str} = None,
               resolved_subflows: {} = None,
               parent_subflow: ET.Element = None,
-              query_manager: QueryManager = None) -> Frame:
+              query_manager: QueryManager = None,
+              relevant_vars: frozenset[(str, str)] | None = None,
+              prune_visits: bool = False) -> Frame:
         """Call this whenever program analysis starts or a subflow is reached
 
         Args:
@@ -337,6 +421,8 @@ class Frame(object):
             parent_subflow: current subflow element that spawned this
                 frame
             query_manager: manages query instances
+            relevant_vars: (flow_path, name) of variables to wire, or None to wire all
+            prune_visits: whether to skip segment visits equivalent to an earlier visit
 
         Returns:
             new Frame
@@ -367,8 +453,13 @@ class Frame(object):
 
         # create state and initialize
         frame.state = BranchState.from_parser(frame.parser)
+        frame.relevant_vars = relevant_vars
+        frame.state.relevant_vars = relevant_vars
+        frame.prune_visits = prune_visits
 
         frame.state.current_elem = frame.parser.get_start_elem()
+        if hooks.ENABLED is True:
+            frame.start_time = time.perf_counter()
         return frame
 
     def update_parent_frame(self, parent_frame: Frame, output_vector_map) -> None:
@@ -507,6 +598,8 @@ class Frame(object):
             updated child frame ready to begin processing
 
         """
+        start = time.perf_counter() if hooks.ENABLED is True else None
+
         # build a parser for new subflow, which inherits variable info
         new_parser = parse.Parser.from_file(filepath=sub_path, old_parser=self.parser)
 
@@ -516,7 +609,9 @@ class Frame(object):
         new_frame = Frame.build(current_flow_path=sub_path,
                                 all_flow_paths=self.all_flow_paths,
                                 parent_subflow=subflow,
-                                query_manager=self.query_manager
+                                query_manager=self.query_manager,
+                                relevant_vars=self.relevant_vars,
+                                prune_visits=self.prune_visits
                                 )
 
         new_frame.state.add_vectors_from_other_flow(src_flow_path=self.flow_path,
@@ -525,6 +620,12 @@ class Frame(object):
                                                     transition_elem=subflow)
 
         self.child_spawned = True
+
+        # the visit must be crawled again, as later visits may fast-forward through the subflow
+        self.state.discard_visit()
+        if start is not None:
+            hooks.emit(HookKind.subflow_spawn, self.flow_path, start,
+                       name=sub_path, element=parse_utils.get_name(subflow))
         return new_frame
 
     def handle_subflows(self, current_elem: ET.Element) -> Frame | None:
@@ -568,14 +669,23 @@ class Frame(object):
         # once, we run queries at flow start:
         self.query_manager.query(action=QueryAction.flow_enter, state=self.state)
 
+        traced = hooks.ENABLED
         while True:
+            start = time.perf_counter() if traced is True else None
 
-            crawl_step = self.state.load_crawl_step(self.crawler)
+            # a visit entered while returning from a subflow skips the subflow check
+            # of its first element, so it is not equivalent to other visits
+            crawl_step = self.state.load_crawl_step(self.crawler,
+                                                    prune=self.prune_visits and not self.child_spawned)
 
             if crawl_step is None:
                 # we are done processing this flow
                 return None
 
+            if traced is True:
+                hooks.emit(HookKind.crawl_step, self.flow_path, start,
+                           name=crawl_step.element_name, step=crawl_step.step)
+
             child_frame = self.handle_subflows(self.state.current_elem)
 
             if child_frame is not None:
@@ -586,7 +696,12 @@ class Frame(object):
             report(self.state, self.crawler.current_step, self.crawler.total_steps)
 
             # Look for variable assignments and update flows
-            wire.wire(self.state, self.state.current_elem)
+            if traced is True:
+                start = time.perf_counter()
+                wire.wire(self.state, self.state.current_elem)
+                hooks.emit(HookKind.wire, self.flow_path, start, name=crawl_step.element_name)
+            else:
+                wire.wire(self.state, self.state.current_elem)
 
             # must be done *after* wiring.
             self.query_manager.query(action=QueryAction.process_elem, state=self.state)
@@ -634,6 +749,9 @@ class Frame(object):
                                                        transition_elem=current_elem)
 
                 logger.info("fast forwarded through subflow as it was already invoked with the same input vars")
+                self.fast_forwards += 1
+                if hooks.ENABLED is True:
+                    hooks.emit(HookKind.fast_forward, self.flow_path, name=sub_path, element=parse_utils.get_name(current_elem))
 
                 return None
 
@@ -656,6 +774,43 @@ class Frame(object):
             return None
 
 
+def build_query_manager(requestor: str = None,
+                        report_label: str = None,
+                        result_id: str = None,
+                        service_version: str = None,
+                        help_url: str = None,
+                        query_module_path: str = None,
+                        query_class_name: str = None,
+                        query_preset: str = None,
+                        extra_queries: [QuerySpec] | None = None) -> QueryManager:
+    """Builds the result processor and query manager of a scan
+
+    Args:
+        requestor: email address of scan recipient (optional)
+        report_label: human-readable name for report (optional)
+        result_id: id of report (for use in a jobs management system) (optional)
+        service_version: version of jobs management system (optional)
+        help_url: url to display on report for more info about results (optional)
+        query_module_path: path of module where custom queries are stored
+        query_class_name: name of query class to instantiate
+        query_preset: name of preset to run
+        extra_queries: additional query instances to run in the same crawl
+
+    Returns:
+        QueryManager without a parser, whose results are empty
+    """
+    results = Results(requestor=requestor, report_label=report_label,
+                      result_id=result_id, service_version=service_version,
+                      help_url=help_url)
+    results.scan_start = str(datetime.now())[:-7]
+
+    return QueryManager.build(results=results,
+                              requested_preset=query_preset,
+                              module_path=query_module_path,
+                              class_name=query_class_name,
+                              extra_queries=extra_queries)
+
+
 def parse_flow(flow_path: str,
                requestor: str = None,
                report_label: str = None,
@@ -667,7 +822,8 @@ def parse_flow(flow_path: str,
                query_preset: str = None,
                query_manager: QueryManager | None = None,
                crawl_dir: str = None,
-               all_flows: {str: str} = None) -> QueryManager:
+               all_flows: {str: str} = None,
+               extra_queries: [QuerySpec] | None = None) -> QueryManager:
     """Main loop that performs control and dataflow analysis
 
     Args:
@@ -684,14 +840,45 @@ def parse_flow(flow_path: str,
                        and one will be created.
         crawl_dir: directory of where to store crawl specifications
         all_flows: map flow name -> path of flow (used for looking up flow paths of subflows)
+        extra_queries: additional query instances to run in the same crawl
 
     Returns:
         instance of ger_report.Result class that can be used to generate reports
         or passed to other flows.
     """
 
-    # build parser
+    if query_manager is None:
+        # the parser is assigned below
+        query_manager = build_query_manager(requestor=requestor,
+                                            report_label=report_label,
+                                            result_id=result_id,
+                                            service_version=service_version,
+                                            help_url=help_url,
+                                            query_module_path=query_module_path,
+                                            query_class_name=query_class_name,
+                                            query_preset=query_preset,
+                                            extra_queries=extra_queries)
+
+    clear_root_flow_caches()
+    flow_stats = FlowStats(flow_path=flow_path)
+    counters = (time.perf_counter(), get_path_count(), flows.get_dropped_path_count(),
+                query_manager.query_time, len(query_manager.results.stored_results))
+    if hooks.ENABLED is True:
+        hooks.emit(HookKind.flow_start, flow_path)
+
+    if crawl_dir is None and not is_parse_needed(flow_path, query_manager, all_flows):
+        logger.info(f"skipping {flow_path} as its subflow closure lacks a source or a sink")
+        query_manager.results.skipped_flows += 1
+        query_manager.results.scan_end = str(datetime.now())[:-7]
+        flow_stats.skipped = True
+        add_flow_stats(flow_stats, query_manager, *counters)
+        return query_manager
+
+    # build parser. This will also populate basic data
+    parse_start = time.perf_counter()
     parser = parse.Parser.from_file(filepath=flow_path)
+    flow_stats.parse_time = time.perf_counter() - parse_start
+    flow_stats.element_count = len(parser.get_all_traversable_flow_elements())
 
     if crawl_dir is not None:
         cfg = ControlFlowGraph.from_parser(parser)
@@ -705,30 +892,30 @@ def parse_flow(flow_path: str,
         with open(os.path.join(crawl_dir, f"{cleaned_path}_cfg.json"), 'w') as fp:
             crawl_spec.dump_cfg(cfg, fp)
 
-    if query_manager is None:
-        # 1. build result processor
-        results = Results(requestor=requestor, report_label=report_label,
-                          result_id=result_id, service_version=service_version,
-                          help_url=help_url)
-        results.scan_start = str(datetime.now())[:-7]
-
-        # 2. build parser. This will also populate basic data
-        parser = parse.Parser.from_file(filepath=flow_path)
-
-        # 3. build query manager
-        query_manager = QueryManager.build(results=results,
-                                           parser=parser,
-                                           requested_preset=query_preset,
-                                           module_path=query_module_path,
-                                           class_name=query_class_name)
-    else:
-        # we are continuing a run, so update parser to work on new file
-        query_manager.parser = parser
+    # update query manager to work on new file
+    query_manager.parser = parser
+
+    graph = get_influence_graph(parser, query_manager, all_flows)
+    relevant_vars = None
+    if graph is not None:
+        if SKIP_UNREACHABLE is True and not reachability.is_sink_reachable(graph):
+            logger.info(f"skipping crawl of {flow_path} as no source can reach a sink")
+            query_manager.results.skipped_flows += 1
+            query_manager.results.scan_end = str(datetime.now())[:-7]
+            flow_stats.skipped = True
+            add_flow_stats(flow_stats, query_manager, *counters)
+            return query_manager
+
+        if SLICE_WIRING is True:
+            relevant_vars = reachability.get_backward_slice(graph)
 
     # build stack
     stack = Stack(root_flow_path=flow_path,
                   all_flow_paths=all_flows,
-                  query_manager=query_manager)
+                  query_manager=query_manager,
+                  relevant_vars=relevant_vars,
+                  prune_visits=PRUNE_EQUIVALENT_VISITS is True and query_manager.is_default_only())
+    flow_stats.segment_count = stack.current_frame.crawler.segment_count
 
     # run program
     query_manager = stack.run()
@@ -736,10 +923,112 @@ def parse_flow(flow_path: str,
     # update scan end time
     query_manager.results.scan_end = str(datetime.now())[:-7]
 
+    flow_stats.crawl_steps = stack.crawl_steps
+    flow_stats.branch_count = stack.branch_count
+    flow_stats.terminal_steps = stack.terminal_steps
+    flow_stats.subflow_invocations = stack.subflow_invocations
+    flow_stats.fast_forwards = stack.fast_forwards
+    flow_stats.peak_influence_map_size = stack.peak_map_size
+    flow_stats.pruned_steps = stack.pruned_steps
+    add_flow_stats(flow_stats, query_manager, *counters)
+
     # return back to __main__, which may scan again with another file
     return query_manager
 
 
+def add_flow_stats(flow_stats: FlowStats, query_manager: QueryManager, start: float,
+                   path_count: int, dropped_count: int, query_time: float, result_count: int) -> None:
+    """Completes the statistics of a root flow, stores them in the results and notifies hooks
+
+    Args:
+        flow_stats: statistics collected while scanning the flow
+        query_manager: query manager of the run
+        start: value of :func:`time.perf_counter` when the flow scan started
+        path_count: value of :func:`get_path_count` when the flow scan started
+        dropped_count: value of :func:`flows.get_dropped_path_count` when the flow scan started
+        query_time: query time of the query manager when the flow scan started
+        result_count: number of stored results when the flow scan started
+
+    Returns:
+        None
+    """
+    flow_stats.total_time = time.perf_counter() - start
+    flow_stats.paths_created = get_path_count() - path_count
+    flow_stats.paths_dropped = flows.get_dropped_path_count() - dropped_count
+    flow_stats.query_time = query_manager.query_time - query_time
+    flow_stats.findings = len(query_manager.results.stored_results) - result_count
+    flow_stats.process_peak_rss = get_peak_rss()
+    query_manager.results.flow_stats.append(flow_stats)
+    if hooks.ENABLED is True:
+        hooks.emit(HookKind.flow_end, flow_stats.flow_path, start,
+                   skipped=flow_stats.skipped, steps=flow_stats.crawl_steps, findings=flow_stats.findings)
+
+
+def clear_root_flow_caches() -> None:
+    """Forgets the formula maps, parsed expressions and taint origins kept for the previous root flow
+
+    These are shared by the frames of one crawl. Clearing them when a
+    root flow starts keeps their size bounded by the largest root flow
+    (and its subflows) rather than the whole workspace, and keeps origin
+    masks within as few bits as the sources of the root flow need.
+
+    Returns:
+        None
+    """
+    branch_state.clear_cache()
+    expression_parser.clear_cache()
+    flows.clear_origins()
+
+
+def is_parse_needed(flow_path: str, query_manager: QueryManager, all_flows: {str: str}) -> bool:
+    """Whether the root flow must be parsed to find all results
+
+    Only the sources and sinks of the default queries are known
+    lexically, so flows are always parsed for custom queries.
+
+    Args:
+        flow_path: path of the root flow
+        query_manager: query manager of the run
+        all_flows: map flow name -> path of flow (used for looking up flow paths of subflows)
+
+    Returns:
+        False if the flow cannot produce any results
+    """
+    if SKIP_LEXICAL is False or not query_manager.is_default_only():
+        return True
+    try:
+        return prefilter.may_have_results(flow_path, get_sink_types(query_manager.results.preset), all_flows)
+    except Exception:
+        logger.error(f"Error in lexical prefilter, parsing anyway: {traceback.format_exc()}")
+        return True
+
+
+def get_influence_graph(parser: parse.Parser, query_manager: QueryManager,
+                        all_flows: {str: str}) -> reachability.InfluenceGraph | None:
+    """Static influence graph used to skip or slice the crawl of the root flow
+
+    Only the sources and sinks of the default queries are known
+    statically, so there is no graph for custom queries.
+
+    Args:
+        parser: parser of the root flow
+        query_manager: query manager of the run
+        all_flows: map flow name -> path of flow (used for looking up flow paths of subflows)
+
+    Returns:
+        InfluenceGraph or None if the full crawl must be performed
+    """
+    if SKIP_UNREACHABLE is False and SLICE_WIRING is False:
+        return None
+    if not query_manager.is_default_only():
+        return None
+    try:
+        return reachability.build_graph(parser, all_flows)
+    except Exception:
+        logger.error(f"Error in reachability pre-check, crawling anyway: {traceback.format_exc()}")
+        return None
+
+
 def report(state: BranchState, current_step: int, total_steps: int) -> None:
     # TODO: this will be made pretty later
     msg = (f"flow: {state.flow_name}"
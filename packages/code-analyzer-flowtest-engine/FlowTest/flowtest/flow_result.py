@@ -9,20 +9,29 @@ import json
 import logging
 import sys
 from datetime import datetime
-from typing import TextIO
+from typing import TextIO, TYPE_CHECKING
 
 sys.modules['_elementtree'] = None
 from public.custom_parser import ET
 import public.custom_parser as CP
 
 from flowtest import ESAPI
-from flowtest import flow_metrics
+from flowtest.flows import limit_paths
 from flowtest.version import __version__
-from public.data_obj import QueryResult, Preset, InfluenceStatementEncoder
+from public.data_obj import QueryResult, Preset, InfluenceStatementEncoder, DataInfluenceStatement, DataInfluencePath
+
+if TYPE_CHECKING:
+    from flowtest.stats import FlowStats
 
 DEFAULT_HELP_URL = "https://security.secure.force.com/security/tools/forcecom/scannerhelp"
 DEFAULT_JOB_TYPE = "FlowSecurityCLI"
 
+#: most paths with the same origin kept in each finding (None for no limit, the default)
+MAX_FINDING_PATHS: int | None = None
+
+#: value of ``schema_version`` in compact json reports (full reports have no ``schema_version``)
+COMPACT_SCHEMA_VERSION: int = 2
+
 logger = logging.getLogger(__name__)
 
 
@@ -52,10 +61,23 @@ class ResultsProcessor(object):
         self.counter: int = 0
         self.scan_start: str = str(datetime.now())  # should be overriden
         self.scan_end: str = self.scan_start  # should be overridden
+        self.skipped_flows: int = 0  # root flows not crawled because they cannot produce findings
+        self.query_stats: {str: int} = {}  # counters reported by the query processor, summed over flows
+        self.flow_stats: [FlowStats] = []  # analysis statistics, one record per root flow
 
         # deduplicated stored query results
         self.stored_results: [QueryResult] = []
 
+        # (query_id, influence statement) --> position of the result in stored_results
+        self.__result_index: {(str, DataInfluenceStatement): int} = {}
+
+        # positions in stored_results of the results added or changed since pop_changed_results
+        self.__changed: set[int] = set()
+
+        # position in stored_results --> names of the presets whose queries reported the result,
+        # in the order they first did (only for results added with a preset name)
+        self.__result_presets: {int: [str]} = {}
+
         # dictionary of results sorted by query_name
         self.results_dict: {str: {}} = None
 
@@ -81,6 +103,9 @@ class ResultsProcessor(object):
 
         presets = [x.query_id.strip() for x in self.preset.queries]
 
+        # the html machinery is only loaded when an html report is requested
+        from flowtest import flow_metrics
+
         # Notify metrics of which queries were run
         flow_metrics.add_to_presets(preset_name=self.preset.preset_name,
                                     presets=presets)
@@ -107,15 +132,23 @@ class ResultsProcessor(object):
                                              )
         return results
 
-    def dump_json(self, fp: TextIO) -> None:
+    def dump_json(self, fp: TextIO, compact: bool = False) -> None:
         """Write json string of results to file pointer
 
+        Args:
+            fp: file pointer to write to
+            compact: whether to write the compact schema (see :meth:`get_compact_job_result`)
+                     without indentation
+
         Returns:
             None
 
         """
-        job_result = self._make_job_result()
-        json.dump(job_result, indent=4, fp=fp, cls=InfluenceStatementEncoder)
+        if compact is True:
+            json.dump(self.get_compact_job_result(), fp=fp, separators=(',', ':'))
+        else:
+            job_result = self._make_job_result()
+            json.dump(job_result, indent=4, fp=fp, cls=InfluenceStatementEncoder)
 
     def get_json_str(self) -> str:
         """get json result string
@@ -128,6 +161,53 @@ class ResultsProcessor(object):
 
         return json.dumps(job_result, indent=4, cls=InfluenceStatementEncoder)
 
+    def get_compact_job_result(self) -> dict:
+        """Report in which each statement and xml snippet is stored once
+
+        The report has the same keys as the full report, plus::
+
+            schema_version: COMPACT_SCHEMA_VERSION
+            snippets: [source text]
+            statements: [{influenced_var, influencer_var, element_name, comment,
+                          flow_path, line_no, snippet: index into snippets}]
+
+        and in each finding, ``flow`` is a list of indices into ``statements``
+        and ``elem`` is an index into ``snippets``. Use :func:`expand_compact_report`
+        to recover the full report.
+
+        Returns:
+            dict that can be serialized as json
+        """
+        job_result = self._make_job_result()
+        snippet_ids = {}
+        statement_ids = {}
+        statements = []
+
+        def get_snippet_id(source_text: str) -> int:
+            return snippet_ids.setdefault(source_text, len(snippet_ids))
+
+        def get_statement_id(stmt: DataInfluenceStatement) -> int:
+            stmt_id = statement_ids.get(stmt)
+            if stmt_id is None:
+                stmt_id = statement_ids[stmt] = len(statements)
+                stmt_dict = stmt.to_dict()
+                stmt_dict["snippet"] = get_snippet_id(stmt_dict.pop("source_text"))
+                statements.append(stmt_dict)
+            return stmt_id
+
+        results = {}
+        for (query_id, entries) in job_result["results"].items():
+            results[query_id] = [dict(entry,
+                                      flow=[get_statement_id(x) for x in entry["flow"]],
+                                      elem=get_snippet_id(entry["elem"]))
+                                 for entry in entries]
+
+        job_result["schema_version"] = COMPACT_SCHEMA_VERSION
+        job_result["snippets"] = list(snippet_ids)
+        job_result["statements"] = statements
+        job_result["results"] = results
+        return job_result
+
     def get_cx_xml_str(self):
         """Converts results to popcrab compatible report format
 
@@ -186,7 +266,7 @@ class ResultsProcessor(object):
 
         return self.report_xml
 
-    def add_results(self, query_results: [QueryResult]) -> None:
+    def add_results(self, query_results: [QueryResult], preset_name: str | None = None) -> None:
         """Add results to processor
 
         Stores results internally for simple de-duplication.
@@ -195,8 +275,19 @@ class ResultsProcessor(object):
         or timestamps into influence statements, as they wont be
         de-duped.
 
+        The crawler necessarily visits the same Flow element
+        a few times (because of loops, goto statements, etc.), so
+        results of the same query with the same influence statement
+        are consolidated into one result holding the union of their
+        paths (within :data:`MAX_FINDING_PATHS`).
+
+        When several query processors share the report, each passes the
+        name of its preset, and every result lists the presets that
+        reported it (see :meth:`gen_result_dict`).
+
         Args:
             query_results: list of Query-Result objects
+            preset_name: preset of the query processor reporting the results (None to not tag them)
 
         Returns:
             None
@@ -204,10 +295,43 @@ class ResultsProcessor(object):
         query_results = _validate_qr(query_results)
         if query_results is None:
             return
-        else:
-            self.stored_results = _merge_results(
-                self.stored_results + query_results
-            )
+
+        for qr in query_results:
+            key = (qr.query_id, qr.influence_statement)
+            position = self.__result_index.get(key)
+            if position is None:
+                position = self.__result_index[key] = len(self.stored_results)
+                self.stored_results.append(_bound_result(qr, qr.paths))
+                self._tag_result(position, preset_name)
+            else:
+                self._tag_result(position, preset_name)
+                old = self.stored_results[position]
+                if old.paths is not None and qr.paths is not None and qr.paths <= old.paths:
+                    # nothing new
+                    continue
+                paths = old.paths if qr.paths is None else (qr.paths if old.paths is None else old.paths | qr.paths)
+                new = _bound_result(old, paths)
+                if new.paths == old.paths:
+                    # the new paths were evicted by the budget
+                    continue
+                self.stored_results[position] = new
+            self.__changed.add(position)
+
+    def _tag_result(self, position: int, preset_name: str | None) -> None:
+        if preset_name is not None:
+            tags = self.__result_presets.setdefault(position, [])
+            if preset_name not in tags:
+                tags.append(preset_name)
+
+    def pop_changed_results(self) -> [QueryResult]:
+        """Results added or changed (e.g. with more paths) since the last call
+
+        Returns:
+            list of the current value of each such result, in the order they were first stored
+        """
+        changed = sorted(self.__changed)
+        self.__changed = set()
+        return [self.stored_results[x] for x in changed]
 
     def gen_result_dict(self) -> {str: {str: str}}:
         """Sorts results into query buckets
@@ -225,7 +349,9 @@ class ResultsProcessor(object):
                              counter: (fake similarity id),
                              elem: source code of element
                              elem_name: name of Flow Element
-                             field: name of influenced variable}
+                             field: name of influenced variable,
+                             presets: names of the presets that reported it
+                                      (only if the results were added with preset names)}
 
         """
 
@@ -234,8 +360,9 @@ class ResultsProcessor(object):
         if query_results is None or len(query_results) == 0:
             return {}
 
-        for query_result in query_results:
+        for (position, query_result) in enumerate(query_results):
             query_desc = self._get_query_desc_from_id(query_result.query_id)
+            presets = self.__result_presets.get(position)
             end_stmt = query_result.influence_statement
 
             query_path = query_result.query_id
@@ -251,14 +378,17 @@ class ResultsProcessor(object):
                 statements = [x.history + (end_stmt,) for x in query_result.paths]
 
             for stmt in statements:
-                accum[query_path].append({"flow": stmt,
-                                          "query_name": query_desc.query_name,
-                                          "severity": str(query_desc.severity),
-                                          "description": query_desc.query_description,
-                                          "counter": self.counter,
-                                          "elem": end_stmt.source_text,
-                                          "elem_name": end_stmt.element_name,
-                                          "field": end_stmt.influenced_var})
+                entry = {"flow": stmt,
+                         "query_name": query_desc.query_name,
+                         "severity": str(query_desc.severity),
+                         "description": query_desc.query_description,
+                         "counter": self.counter,
+                         "elem": end_stmt.source_text,
+                         "elem_name": end_stmt.element_name,
+                         "field": end_stmt.influenced_var}
+                if presets is not None:
+                    entry["presets"] = list(presets)
+                accum[query_path].append(entry)
 
                 # TODO: this is a placeholder for real similarity analysis, if needed.
                 self.counter += 1
@@ -301,71 +431,53 @@ class ResultsProcessor(object):
         raise ValueError(f"No query with id {query_id} is in the preset provided")
 
 
-def _validate_and_prettify_xml(xml_str: str) -> str:
-    """Pretty print and validate generated xml string
+def expand_compact_report(report: dict) -> dict:
+    """Converts a compact json report into a full json report
 
     Args:
-        xml_str: string to validate
+        report: parsed json report, in either schema
 
     Returns:
-        validated/beautified xml_string
+        the report with statements and snippets inlined in each finding
+        (full reports are returned unchanged)
     """
-    my_root = CP.get_root_from_string(bytes(xml_str, encoding='utf-8'))
-    ET.indent(my_root)
-    return ET.tostring(my_root, encoding='utf')
+    if report.get("schema_version") != COMPACT_SCHEMA_VERSION:
+        return report
 
+    snippets = report["snippets"]
+    statements = []
+    for stmt in report["statements"]:
+        stmt = dict(stmt)
+        stmt["source_text"] = snippets[stmt.pop("snippet")]
+        statements.append(stmt)
 
-def _merge_results(results: list[QueryResult]) -> [QueryResult]:
-    """Return new list with consolidated paths
-
-        The crawler necessarily visits the same Flow element
-        a few times (because of loops, goto statements, etc.)
+    expanded = {k: v for k, v in report.items() if k not in ("schema_version", "snippets", "statements")}
+    expanded["results"] = {query_id: [dict(entry,
+                                           flow=[statements[x] for x in entry["flow"]],
+                                           elem=snippets[entry["elem"]])
+                                      for entry in entries]
+                           for (query_id, entries) in (report.get("results") or {}).items()}
+    return expanded
 
-        This can create duplicate results. We want to remove
-        these using set addition.
-
-        .. Note:: For this to work, we need to avoid putting comments
-                  in influence statements such as "done in step X" as this
-                  will make them be different statements and not consolidated.
 
+def _validate_and_prettify_xml(xml_str: str) -> str:
+    """Pretty print and validate generated xml string
 
     Args:
-        results: list of QueryResult objects
+        xml_str: string to validate
 
     Returns:
-        deduplicated list. Incoming list is not altered.
+        validated/beautified xml_string
     """
-    # This function is not in the mood for garbage
-    assert results is not None and len(results) > 0
-
-    # instead of merging in place, we return a new list
-    # and mark with skips those elements that have been merged.
-
-    new_list = []  # accumulator for results
-    r_indices = list(range(len(results)))  # indices of result
-
-    while len(r_indices) > 0:
-        qr = results[r_indices.pop(0)]
-
-        new_paths = set(list(qr.paths))
-
-        candidates = [x for x in r_indices]  # make a copy for iteration
-
-        for i in candidates:
-            working = results[i]
-            if _is_match(qr, working) is True:
-                assert working.paths is not None
-                new_paths.update(working.paths)
-                r_indices.remove(i)
+    my_root = CP.get_root_from_string(bytes(xml_str, encoding='utf-8'))
+    ET.indent(my_root)
+    return ET.tostring(my_root, encoding='utf')
 
-        new_list.append(QueryResult(
-            query_id=qr.query_id,
-            influence_statement=qr.influence_statement,
-            paths=frozenset(new_paths)
-            )
-        )
 
-    return new_list
+def _bound_result(qr: QueryResult, paths: frozenset[DataInfluencePath] | None) -> QueryResult:
+    return QueryResult(query_id=qr.query_id,
+                       influence_statement=qr.influence_statement,
+                       paths=None if paths is None else limit_paths(paths, MAX_FINDING_PATHS))
 
 
 def _validate_qr(qr_list: list[QueryResult]) -> list[QueryResult] | None:
@@ -406,20 +518,3 @@ def _validate_qr(qr_list: list[QueryResult]) -> list[QueryResult] | None:
             return None
         else:
             return to_return
-
-
-def _is_match(qr_a: QueryResult, qr_b: QueryResult) -> bool:
-    """ Are these results pointing to the same result?
-
-    Args:
-        qr_a: QueryResult
-        qr_b: QueryResult
-
-    Returns:
-        True if they have paths which can be consolidated
-    """
-
-    # both the actual query and the influence statement must match
-    # ..then the paths can be combined
-    return (qr_a.query_id == qr_b.query_id and
-            qr_a.influence_statement == qr_b.influence_statement)
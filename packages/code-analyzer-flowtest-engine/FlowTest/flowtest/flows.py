@@ -8,8 +8,8 @@ import logging
 import copy
 import json
 import typing
-from collections.abc import Callable
-from dataclasses import dataclass, replace
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field, replace
 
 import flowtest.util
 from flowtest.util import is_non_null, id_, match_all
@@ -18,6 +18,156 @@ from public.data_obj import DataInfluencePath
 #: module logger
 logger = logging.getLogger(__name__)
 
+#: bit assigned to each registered taint origin (flow_path, influencer_var)
+_origin_bits: {(str, str): int} = {}
+
+#: incremented whenever origins are registered or cleared, to invalidate cached origin masks
+_origin_generation: int = 0
+
+#: most paths with the same origin kept among the defaults of a FlowVector, and
+#: among the flows of each of its properties (None for no limit, the default)
+MAX_VARIABLE_PATHS: int | None = None
+
+#: number of paths discarded by :func:`limit_paths` so far
+_dropped_path_count: int = 0
+
+
+def get_origin_mask(origins: {(str, str)}) -> int:
+    """Bitset of the taint origins, registering any that are new
+
+    Args:
+        origins: (flow_path, influencer_var) tuples, e.g. the sources of a query
+
+    Returns:
+        int whose set bits correspond to the origins
+    """
+    global _origin_generation
+    mask = 0
+    for origin in origins:
+        bit = dict.get(_origin_bits, origin)
+        if bit is None:
+            bit = 1 << len(_origin_bits)
+            _origin_bits[origin] = bit
+            _origin_generation += 1
+        mask |= bit
+    return mask
+
+
+def clear_origins() -> None:
+    """Forgets the registered origins
+
+    Masks computed before the call must not be combined with masks computed after it.
+
+    Returns:
+        None
+    """
+    global _origin_generation
+    _origin_bits.clear()
+    _origin_generation += 1
+
+
+def get_origin_bit(origin: (str, str)) -> int:
+    """Bit of a registered origin
+
+    Args:
+        origin: (flow_path, influencer_var) tuple
+
+    Returns:
+        the origin's bit, or 0 if it has not been registered
+    """
+    return dict.get(_origin_bits, origin, 0)
+
+
+def _get_path_origin_bit(path: DataInfluencePath) -> int:
+    first = path.history[0]
+    return dict.get(_origin_bits, (first.flow_path, first.influencer_var), 0)
+
+
+def get_dropped_path_count() -> int:
+    """Number of paths discarded to stay within the path budgets so far
+
+    Returns:
+        running count (take differences to count the paths dropped by an operation)
+    """
+    return _dropped_path_count
+
+
+def limit_paths(paths: Iterable[DataInfluencePath], budget: int | None) -> frozenset[DataInfluencePath]:
+    """Keeps at most ``budget`` paths per origin, preferring shorter paths
+
+    The origin of a path is the flow path and influencer of its first
+    statement, so every (source, sink) pair keeps at least one path
+    and the fact that the sink is reached is never lost. Ties are
+    broken by the statements of the paths, so the same paths are kept
+    in every run.
+
+    Args:
+        paths: paths into the same variable or sink
+        budget: most paths to keep per origin (None for no limit)
+
+    Returns:
+        the paths that are kept
+    """
+    global _dropped_path_count
+    paths = frozenset(paths)
+    if budget is None or len(paths) <= budget:
+        return paths
+
+    by_origin = {}
+    for path in paths:
+        first = path.history[0]
+        by_origin.setdefault((first.flow_path, first.influencer_var), []).append(path)
+
+    accum = []
+    for group in by_origin.values():
+        if len(group) > budget:
+            group = sorted(group, key=_budget_key)[:budget]
+        accum.extend(group)
+
+    _dropped_path_count += len(paths) - len(accum)
+    if len(accum) == len(paths):
+        return paths
+    return frozenset(accum)
+
+
+def _budget_key(path: DataInfluencePath) -> tuple:
+    return (len(path.history),
+            tuple((x.flow_path or '', x.line_no or 0, x.element_name or '',
+                   x.influenced_var or '', x.influencer_var or '', x.comment or '') for x in path.history),
+            path.influenced_property or '', path.influencer_property or '')
+
+
+def _limit_vector_paths(property_maps: {DataInfluencePath: {str: {DataInfluencePath}} | None}
+                        ) -> {DataInfluencePath: {str: {DataInfluencePath}} | None}:
+    """Applies :data:`MAX_VARIABLE_PATHS` to the property map of a new vector
+
+    The map and its overrides may be shared with live vectors, so they are
+    copied rather than trimmed in place.
+
+    Args:
+        property_maps: property map of the new vector
+
+    Returns:
+        property_maps if it is within the budget, otherwise a trimmed copy
+    """
+    budget = MAX_VARIABLE_PATHS
+    trimmed = property_maps
+    if len(property_maps) > budget:
+        kept = limit_paths(property_maps.keys(), budget)
+        trimmed = {x: y for x, y in property_maps.items() if x in kept}
+
+    for default_, prop_map in property_maps.items():
+        if prop_map is None or default_ not in trimmed:
+            continue
+        if any(x is not None and len(x) > budget for x in prop_map.values()):
+            if trimmed is property_maps:
+                trimmed = dict(property_maps)
+            trimmed[default_] = {prop: (prop_flows if prop_flows is None or len(prop_flows) <= budget
+                                        else set(limit_paths(prop_flows, budget)))
+                                 for prop, prop_flows in prop_map.items()}
+
+    return trimmed
+
 
 @dataclass(frozen=True, eq=True, slots=True)
 class FlowVector:
@@ -37,9 +187,19 @@ class FlowVector:
     # influence this property
     property_maps: dict[DataInfluencePath: dict[str: set[DataInfluencePath]]]
 
+    # (origin generation, bitset of registered origins of all flows in this vector)
+    # computed on demand by get_origin_mask
+    origin_cache: (int, int) | None = field(default=None, compare=False, repr=False)
+
     # TODO: revisit this later if a property spec is needed
     # property_spec: set[str] | None
 
+    def __post_init__(self):
+        if MAX_VARIABLE_PATHS is not None:
+            trimmed = _limit_vector_paths(self.property_maps)
+            if trimmed is not self.property_maps:
+                object.__setattr__(self, 'property_maps', trimmed)
+
     @classmethod
     def from_flows(cls, default: {DataInfluencePath} = None) -> FlowVector:
         """Builds a vector from the provided flows.
@@ -189,6 +349,34 @@ class FlowVector:
 
         return to_return
 
+    def get_origin_mask(self) -> int:
+        """Bitset of the registered origins of every flow in this vector
+
+        The origin of a flow is the flow path and influencer of its first
+        statement. Every flow returned by :meth:`get_flows_by_prop` has
+        the origin of a flow in this vector, so if the mask does not intersect
+        the mask of the sources, no flow into this vector starts at a source.
+
+        Returns:
+            int whose set bits correspond to registered origins (see :func:`get_origin_mask`)
+        """
+        generation = _origin_generation
+        if self.origin_cache is not None and self.origin_cache[0] == generation:
+            return self.origin_cache[1]
+
+        mask = 0
+        for curr_default, prop_map in self.property_maps.items():
+            mask |= _get_path_origin_bit(curr_default)
+            if prop_map is not None:
+                for prop_flows in prop_map.values():
+                    if prop_flows is not None:
+                        for flow in prop_flows:
+                            mask |= _get_path_origin_bit(flow)
+
+        # the vector is frozen, but the cache is not part of its value
+        object.__setattr__(self, 'origin_cache', (generation, mask))
+        return mask
+
     def add_vector(self, vector: FlowVector) -> FlowVector:
         """Create new vector that adds flows of self and ``vector``.
 
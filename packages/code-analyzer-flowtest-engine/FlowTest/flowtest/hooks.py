@@ -0,0 +1,189 @@
+"""Instrumentation hooks on the executor lifecycle
+
+Callbacks registered with :func:`register` receive a :class:`HookEvent`
+for each lifecycle event of the scan, for example to write traces or
+metrics to local files or sockets without patching the executor::
+
+    hooks.register(lambda event: print(event.kind.name, event.duration))
+
+Call sites check :data:`ENABLED` before taking timings or building
+events, so hooks cost nothing when none are registered. Exceptions
+raised by callbacks are logged and do not interrupt the scan.
+
+:class:`ChromeTraceHook` writes the events in the Chrome trace-event
+format, which can be opened in ``chrome://tracing`` or Perfetto.
+
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+import traceback
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from enum import Enum
+
+#: module logger
+logger = logging.getLogger(__name__)
+
+#: True if any callback is registered. Call sites must check this before emitting.
+ENABLED: bool = False
+
+#: event kind --> registered callbacks
+_callbacks: {HookKind: [Callable[[HookEvent], None]]} = {}
+
+
+class HookKind(Enum):
+    # root flow scan begins (instant) and ends (duration of the scan)
+    flow_start = 1
+    flow_end = 2
+
+    # frame pushed onto the stack when a subflow is entered (instant)
+    # and collected when its crawl is complete (duration of the frame)
+    frame_push = 3
+    frame_pop = 4
+
+    # child frame built for a subflow call, or subflow outputs predicted from the carnac cache
+    subflow_spawn = 5
+    fast_forward = 6
+
+    # crawl step loaded into the branch state
+    crawl_step = 7
+
+    # statements of the current element wired into the influence map
+    wire = 8
+
+    # query processor invoked
+    query = 9
+
+    # report file written
+    report_write = 10
+
+
+@dataclass(frozen=True, slots=True)
+class HookEvent:
+    # what happened
+    kind: HookKind
+
+    # path of the flow being processed (or of the report written)
+    flow_path: str | None
+
+    # value of :func:`time.perf_counter` when the event started
+    start: float
+
+    # seconds elapsed since start (0 for instant events)
+    duration: float
+
+    # identifiers of the event, such as element name, step or query class
+    details: dict = field(default_factory=dict)
+
+
+def register(callback: Callable[[HookEvent], None], kinds: [HookKind] | None = None) -> None:
+    """Registers a callback for lifecycle events
+
+    Args:
+        callback: function receiving a :class:`HookEvent`
+        kinds: events to receive, or None for all
+
+    Returns:
+        None
+    """
+    global ENABLED
+    for kind in kinds or list(HookKind):
+        _callbacks.setdefault(kind, []).append(callback)
+    ENABLED = True
+
+
+def unregister(callback: Callable[[HookEvent], None]) -> None:
+    """Removes a callback from all events
+
+    Args:
+        callback: previously registered callback
+
+    Returns:
+        None
+    """
+    global ENABLED
+    for kind in list(_callbacks):
+        _callbacks[kind] = [x for x in _callbacks[kind] if x != callback]
+        if len(_callbacks[kind]) == 0:
+            del _callbacks[kind]
+    ENABLED = len(_callbacks) > 0
+
+
+def emit(kind: HookKind, flow_path: str | None, start: float | None = None, **details) -> None:
+    """Sends an event to the registered callbacks
+
+    Args:
+        kind: event kind
+        flow_path: path of the flow being processed
+        start: value of :func:`time.perf_counter` when the event started, or None for an instant event
+        **details: identifiers of the event
+
+    Returns:
+        None
+    """
+    callbacks = _callbacks.get(kind)
+    if callbacks is None:
+        return
+    now = time.perf_counter()
+    event = HookEvent(kind=kind, flow_path=flow_path,
+                      start=now if start is None else start,
+                      duration=0.0 if start is None else now - start,
+                      details=details)
+    for callback in callbacks:
+        try:
+            callback(event)
+        except Exception:
+            logger.error(f"Error in hook for {kind.name}: {traceback.format_exc()}")
+
+
+class ChromeTraceHook:
+    """Collects events and writes them as Chrome trace-event json
+
+    Register the instance with :func:`register` and call :meth:`write`
+    when the scan is done.
+    """
+
+    def __init__(self):
+        # only needed when tracing
+        import threading
+
+        #: perf_counter value that is the zero of the timeline
+        self.origin: float = time.perf_counter()
+
+        #: returns the id of the thread emitting an event
+        self.get_thread_id: Callable[[], int] = threading.get_ident
+
+        #: trace events collected so far
+        self.trace_events: [dict] = []
+
+    def __call__(self, event: HookEvent) -> None:
+        name = event.details.get('name') or f"{event.kind.name} {os.path.basename(event.flow_path or '')}"
+        record = {"name": str(name),
+                  "cat": event.kind.name,
+                  "ts": (event.start - self.origin) * 1e6,
+                  "pid": os.getpid(),
+                  "tid": self.get_thread_id(),
+                  "args": {"flow_path": event.flow_path, **{k: str(v) for k, v in event.details.items()}}}
+        if event.duration > 0:
+            record["ph"] = "X"
+            record["dur"] = event.duration * 1e6
+        else:
+            record["ph"] = "i"
+            record["s"] = "t"
+        self.trace_events.append(record)
+
+    def write(self, trace_path: str) -> None:
+        """Writes the collected events
+
+        Args:
+            trace_path: path of the json file to write
+
+        Returns:
+            None
+        """
+        with open(trace_path, 'w', encoding='utf-8') as fp:
+            json.dump({"traceEvents": self.trace_events, "displayTimeUnit": "ms"}, fp)
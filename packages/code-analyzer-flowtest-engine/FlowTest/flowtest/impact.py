@@ -0,0 +1,193 @@
+"""Change-impact analysis used to scan only the flows affected by a change
+
+A root flow must be rescanned if it, or any flow in its subflow closure,
+has changed. The reverse subflow dependency graph maps each flow to the
+flows that call it, resolving subflow labels with :func:`util.resolve_name`
+exactly as the crawl does, so walking it upwards from the changed files
+yields every affected flow.
+
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import subprocess
+
+from flow_parser.parse import open_flow, flow_exists
+from flowtest import prefilter, util
+from public.parse_utils import ET
+
+#: module logger
+logger = logging.getLogger(__name__)
+
+#: git status letters (``git diff --name-status``) that are followed by two paths
+RENAME_STATUSES: tuple[str, ...] = ('R', 'C')
+
+
+def read_changed_files(file_path: str, root: str | None = None) -> list[str]:
+    """Reads a list of changed files
+
+    Accepts comma or newline separated paths (as in ``--infile``), the
+    output of ``git diff --name-only`` or the output of
+    ``git diff --name-status``, in which case both the old and new path
+    of renamed and copied files are returned.
+
+    Args:
+        file_path: path of the file containing the list
+        root: directory against which relative paths are resolved (git prints
+              paths relative to the top level of the repository, see :func:`get_git_root`),
+              or None for the working directory
+
+    Returns:
+        absolute paths of changed flow files (which may no longer exist)
+    """
+    with open(file_path, 'r', encoding='utf-8') as fp:
+        data = fp.read()
+
+    changed = []
+    for line in data.splitlines():
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        splits = line.split('\t')
+        if len(splits) > 1 and re.fullmatch(r'[A-Z][0-9]*', splits[0]):
+            # name-status format: status, path [, new path]
+            if splits[0][0] in RENAME_STATUSES:
+                changed += splits[1:3]
+            else:
+                changed.append(splits[1])
+        else:
+            changed += [x.strip() for x in line.split(',')]
+
+    return [os.path.abspath(os.path.join(root or os.getcwd(), x)) for x in changed if _is_flow_file(x)]
+
+
+def get_git_root(directory: str) -> str | None:
+    """Top level of the git repository containing the directory
+
+    Args:
+        directory: directory in the repository
+
+    Returns:
+        absolute path of the top level, or None if git is not available or
+        the directory is not in a repository
+    """
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--show-toplevel'], cwd=directory,
+                                   capture_output=True, text=True, check=False)
+    except OSError:
+        return None
+    if completed.returncode != 0 or len(completed.stdout.strip()) == 0:
+        return None
+    return os.path.abspath(completed.stdout.strip())
+
+
+def get_out_of_scope(changed: list[str], all_flows: {(str, str): str}) -> list[str]:
+    """Changed files that are not among the flows in scope
+
+    These are deleted flows, flows outside the scanned directory, or paths
+    that were resolved against the wrong directory.
+
+    Args:
+        changed: absolute paths of changed flow files
+        all_flows: map (namespaced label, local label) --> flow path of all flows in scope
+
+    Returns:
+        the changed paths that are not in scope, in order
+    """
+    in_scope = {os.path.abspath(x) for x in all_flows.values()}
+    return [x for x in changed if x not in in_scope]
+
+
+def get_affected_flows(changed: list[str], all_flows: {(str, str): str}) -> set[str]:
+    """All flows whose subflow closure contains a changed file
+
+    Args:
+        changed: absolute paths of changed flow files
+        all_flows: map (namespaced label, local label) --> flow path of all flows in scope
+
+    Returns:
+        absolute paths of affected flows (including the changed files)
+    """
+    flow_map = {label: os.path.abspath(path) for (label, path) in all_flows.items()}
+    known = set(flow_map.values())
+    for path in changed:
+        if path not in known:
+            # deleted files must still resolve so their callers are affected
+            flow_map.setdefault(util.get_label(os.path.dirname(path), os.path.basename(path)), path)
+
+    callers = build_reverse_graph(flow_map)
+
+    affected = set(changed)
+    worklist = list(changed)
+    while len(worklist) > 0:
+        path = worklist.pop()
+        for caller in callers.get(path, ()):
+            if caller not in affected:
+                affected.add(caller)
+                worklist.append(caller)
+
+    return affected
+
+
+def build_reverse_graph(all_flows: {(str, str): str}) -> {str: {str}}:
+    """Maps each flow to the flows that call it as a subflow
+
+    Args:
+        all_flows: map (namespaced label, local label) --> flow path
+
+    Returns:
+        map flow path --> paths of calling flows
+    """
+    callers = {}
+    for (path, sub_paths) in build_call_graph(all_flows).items():
+        for sub_path in sub_paths:
+            callers.setdefault(sub_path, set()).add(path)
+
+    return callers
+
+
+def build_call_graph(all_flows: {(str, str): str}) -> {str: {str}}:
+    """Maps each flow to the subflows it calls
+
+    Args:
+        all_flows: map (namespaced label, local label) --> flow path
+
+    Returns:
+        map flow path --> paths of called flows (only flows that exist are keys)
+    """
+    callees = {}
+    for path in set(all_flows.values()):
+        if not flow_exists(path):
+            continue
+        try:
+            sub_names = get_subflow_names(path)
+        except ET.ParseError:
+            logger.error(f"Could not read subflows of {path}, treating it as a leaf")
+            sub_names = ()
+
+        callees[path] = set()
+        for sub_name in sub_names:
+            sub_path = util.resolve_name(all_flows, sub_name=sub_name)
+            if sub_path is not None:
+                callees[path].add(sub_path)
+
+    return callees
+
+
+def get_subflow_names(flow_path: str) -> tuple[str, ...]:
+    """Labels of the subflows called by the flow
+
+    Args:
+        flow_path: path of the flow file
+
+    Returns:
+        contents of the ``<flowName>`` of each top level ``<subflows>`` element
+    """
+    with open_flow(flow_path) as fp:
+        return prefilter.read_subflow_names(fp)
+
+
+def _is_flow_file(path: str) -> bool:
+    return path.endswith(util.FLOW_EXTENSION) or path.endswith(util.PACKAGE_FLOW_EXTENSION)
@@ -0,0 +1,205 @@
+"""Persistent cache of parsed flows
+
+Parsing the xml of a flow and building its tables and control flow graph
+is repeated by every FlowTest process. With the cache enabled, the
+:class:`flow_parser.parse.FlowTables` of each flow (the element tree with
+line numbers and byte offsets, named-element index, variable types,
+input/output variables and element facts) are written to a cache
+directory together with the control flow graph, so warm runs load them
+instead of parsing the xml.
+
+Entries are keyed by flow path, sha256 of the flow contents, FlowTest
+version and :data:`FORMAT_VERSION`, so changed flows and upgrades never
+read stale entries. Entries are pickled, which deserializes much faster
+than the line numbering xml parser.
+
+Unpickling runs code chosen by whoever wrote the file, so each entry is
+signed with an HMAC-SHA256 whose key is private to the user
+(:data:`DEFAULT_KEY_PATH`, created on first use with mode 0600), and
+entries whose signature does not verify are discarded before they are
+unpickled. The key file must not be readable by other users, and the
+cache directory should only be writable by the user running the scans:
+a forged entry is rejected, but anyone who can write to the directory
+can still delete entries or fill the disk.
+
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+import os
+import pickle
+import tempfile
+import traceback
+
+import flow_parser.parse as parse
+from flowtest.control_flow import ControlFlowGraph
+from flowtest.version import __version__
+
+#: module logger
+logger = logging.getLogger(__name__)
+
+#: bump whenever the pickled classes change shape
+FORMAT_VERSION: int = 1
+
+#: extension of cache entries
+ENTRY_EXTENSION: str = ".ir"
+
+#: default location of the signing key (outside the cache directory)
+DEFAULT_KEY_PATH: str = os.path.join(os.path.expanduser("~"), ".flowtest", "ir_cache.key")
+
+#: bytes of random key material
+KEY_SIZE: int = 32
+
+#: length of the signature that precedes the pickled tables in each entry
+SIGNATURE_SIZE: int = hashlib.sha256().digest_size
+
+
+class DiskIRCache:
+    """Stores flow tables as one signed pickle file per flow version in a directory"""
+
+    def __init__(self, cache_dir: str, key_path: str = DEFAULT_KEY_PATH):
+        """Constructor
+
+        Args:
+            cache_dir: directory holding the entries (created if missing)
+            key_path: file holding the signing key (created if missing)
+
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+
+        #: directory holding the entries
+        self.cache_dir: str = cache_dir
+
+        #: key used to sign and verify entries
+        self.key: bytes = load_key(key_path)
+
+        #: entries loaded
+        self.hits: int = 0
+
+        #: flows parsed because no entry was found
+        self.misses: int = 0
+
+    def get_entry_path(self, flow_path: str, content_hash: str) -> str:
+        key = f"{__version__}\0{FORMAT_VERSION}\0{os.path.abspath(flow_path)}\0{content_hash}"
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + ENTRY_EXTENSION)
+
+    def sign(self, payload: bytes) -> bytes:
+        return hmac.digest(self.key, payload, 'sha256')
+
+    def load(self, flow_path: str, content_hash: str) -> parse.FlowTables | None:
+        """Loads the tables of a flow
+
+        Args:
+            flow_path: path of the flow
+            content_hash: sha256 hex digest of the flow contents
+
+        Returns:
+            FlowTables, or None if there is no usable entry
+        """
+        entry_path = self.get_entry_path(flow_path, content_hash)
+        try:
+            with open(entry_path, 'rb') as fp:
+                data = fp.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        signature, payload = data[:SIGNATURE_SIZE], data[SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self.sign(payload)):
+            logger.warning(f"discarding cache entry {entry_path} with an invalid signature")
+            self.misses += 1
+            return None
+
+        try:
+            tables = pickle.loads(payload)
+        except Exception:
+            logger.warning(f"discarding unreadable cache entry {entry_path}: {traceback.format_exc()}")
+            self.misses += 1
+            return None
+
+        if not isinstance(tables, parse.FlowTables):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tables
+
+    def store(self, parser: parse.Parser) -> None:
+        """Writes the tables of a freshly parsed flow, with its control flow graph
+
+        Args:
+            parser: parser built from the xml
+
+        Returns:
+            None
+        """
+        if parser.flow_tables is None or parser.content_hash is None:
+            return
+        try:
+            # adds the pristine graph to the derived tables
+            ControlFlowGraph.from_parser(parser)
+        except Exception:
+            # the crawl will report the problem, but the tables are still valid
+            logger.info(f"no control flow graph cached for {parser.flow_path}: {traceback.format_exc()}")
+
+        entry_path = self.get_entry_path(parser.flow_path, parser.content_hash)
+        tmp_path = None
+        try:
+            # write then rename, so concurrent scans never read a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            payload = pickle.dumps(parser.flow_tables, protocol=pickle.HIGHEST_PROTOCOL)
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(self.sign(payload))
+                fp.write(payload)
+            os.replace(tmp_path, entry_path)
+        except Exception:
+            logger.warning(f"could not write cache entry for {parser.flow_path}: {traceback.format_exc()}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def load_key(key_path: str) -> bytes:
+    """Reads the signing key, creating it (readable only by the user) if it does not exist
+
+    Args:
+        key_path: file holding the key
+
+    Returns:
+        key bytes
+    """
+    try:
+        with open(key_path, 'rb') as fp:
+            key = fp.read()
+        if len(key) >= KEY_SIZE:
+            return key
+        # possibly still being written by a concurrent scan
+        logger.warning(f"signing key {key_path} is too short, entries written by this scan will not be reused")
+        return os.urandom(KEY_SIZE)
+    except FileNotFoundError:
+        pass
+
+    key = os.urandom(KEY_SIZE)
+    os.makedirs(os.path.dirname(key_path) or ".", mode=0o700, exist_ok=True)
+    try:
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # another scan created it first
+        return load_key(key_path)
+    with os.fdopen(fd, 'wb') as fp:
+        fp.write(key)
+    return key
+
+
+def enable(cache_dir: str) -> DiskIRCache:
+    """Makes :meth:`flow_parser.parse.Parser.from_file` use a cache directory
+
+    Args:
+        cache_dir: directory holding the entries
+
+    Returns:
+        the cache instance (for statistics)
+    """
+    cache = DiskIRCache(cache_dir)
+    parse.set_ir_cache(cache)
+    return cache
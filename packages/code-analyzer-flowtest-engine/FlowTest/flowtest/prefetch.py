@@ -0,0 +1,159 @@
+"""Background prefetch of flow files
+
+While a root flow is analyzed, a small thread pool reads the next root
+flows and the subflows they are predicted to call into memory, so that
+slow (e.g. network mounted) file systems do not stall the crawl. The
+contents are handed to the crawl with :func:`flow_parser.parse.in_memory_flows`.
+
+Files are read from disk: contents registered with ``in_memory_flows``
+are replaced by the main thread while the workers run, so the workers
+never look at them.
+
+At most ``depth`` root flows are held in memory ahead of the one being
+analyzed. XML parsing stays on the main thread: the line numbering
+parser runs Python callbacks for every element, so it holds the GIL and
+would not overlap with the analysis.
+
+"""
+from __future__ import annotations
+
+import io
+import logging
+import traceback
+from collections import deque
+from collections.abc import Iterator
+from typing import TYPE_CHECKING
+
+from flowtest import prefilter
+from flowtest.util import resolve_name
+from public.parse_utils import ET
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ThreadPoolExecutor
+
+#: module logger
+logger = logging.getLogger(__name__)
+
+#: number of root flows read ahead of the one being analyzed
+DEFAULT_DEPTH: int = 2
+
+#: number of threads reading files
+WORKER_COUNT: int = 4
+
+
+class Prefetcher:
+    """Iterates over root flows, yielding each with the contents read ahead for it
+
+    Use as a context manager so that the worker threads are shut down::
+
+        with Prefetcher(flow_paths, all_flows) as prefetcher:
+            for (flow_path, contents) in prefetcher:
+                with parse.in_memory_flows(contents):
+                    executor.parse_flow(flow_path, ...)
+
+    """
+
+    def __init__(self, flow_paths: [str], all_flows: {(str, str): str} | None,
+                 depth: int = DEFAULT_DEPTH, workers: int = WORKER_COUNT):
+        """Constructor
+
+        Args:
+            flow_paths: root flows, in the order they are analyzed
+            all_flows: map (namespaced label, local label) --> flow path (used to predict subflows)
+            depth: number of root flows to read ahead (0 disables prefetching)
+            workers: number of threads reading files
+
+        """
+        #: root flows, in the order they are analyzed
+        self.flow_paths: [str] = list(flow_paths)
+
+        #: map (namespaced label, local label) --> flow path
+        self.all_flows: {(str, str): str} = all_flows or {}
+
+        #: number of root flows read ahead
+        self.depth: int = max(depth, 0)
+
+        #: reads files in the background (None if prefetching is disabled)
+        self.__pool: ThreadPoolExecutor | None = None
+        if self.depth > 0:
+            # threads are only started (and imported) when prefetching
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.__pool = ThreadPoolExecutor(max_workers=max(workers, 1),
+                                             thread_name_prefix="flowtest-prefetch")
+
+    def __enter__(self) -> Prefetcher:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stops the worker threads, discarding reads that have not started
+
+        Returns:
+            None
+        """
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=True, cancel_futures=True)
+            self.__pool = None
+
+    def __iter__(self) -> Iterator[(str, {str: bytes})]:
+        """Yields each root flow with the contents of it and its predicted subflows
+
+        Returns:
+            iterator of (flow path, map flow path --> xml bytes). The map is
+            empty if prefetching is disabled or the read failed, in which
+            case the files are read from disk as usual.
+        """
+        if self.__pool is None:
+            for flow_path in self.flow_paths:
+                yield flow_path, {}
+            return
+
+        pending: deque[Future] = deque()
+        upcoming = iter(self.flow_paths)
+        for flow_path in upcoming:
+            pending.append(self.__pool.submit(self.read_closure, flow_path))
+            if len(pending) >= self.depth:
+                break
+
+        for flow_path in self.flow_paths:
+            contents = pending.popleft().result()
+            next_path = next(upcoming, None)
+            if next_path is not None and self.__pool is not None:
+                pending.append(self.__pool.submit(self.read_closure, next_path))
+            yield flow_path, contents
+
+    def read_closure(self, flow_path: str) -> {str: bytes}:
+        """Reads a flow and the subflows it calls (transitively)
+
+        Args:
+            flow_path: path of the root flow
+
+        Returns:
+            map flow path --> xml bytes of the flows that could be read
+        """
+        contents = {}
+        worklist = [flow_path]
+        while len(worklist) > 0:
+            path = worklist.pop()
+            if path in contents:
+                continue
+            try:
+                with open(path, 'rb') as fp:
+                    contents[path] = fp.read()
+                sub_names = prefilter.read_subflow_names(io.BytesIO(contents[path]))
+            except (OSError, ET.ParseError):
+                # the crawl reports the error when it reads the file itself
+                logger.info(f"could not prefetch {path}: {traceback.format_exc()}")
+                contents.pop(path, None)
+                continue
+
+            for sub_name in sub_names:
+                # the crawl reports subflows that cannot be resolved
+                sub_path = resolve_name(self.all_flows, sub_name=sub_name, log_level=logging.DEBUG)
+                if sub_path is not None and sub_path not in contents:
+                    worklist.append(sub_path)
+
+        return contents
@@ -0,0 +1,199 @@
+"""Lexical prefilter run before a flow is parsed
+
+The prefilter streams through flow xml files and records only the
+element types that matter to the default queries:
+
+    * sources - screen input fields (in any flow) and input variables (in the root flow)
+    * sinks - top level CRUD elements whose type appears in the preset
+    * the labels of called subflows
+
+A root flow whose subflow closure has no source or no sink cannot produce
+a finding and is skipped before a parser, CFG or stack is built for it.
+
+"""
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from flow_parser.parse import open_flow, get_flow_version
+from flowtest.util import resolve_name
+from public.parse_utils import ET, ns
+
+#: module logger
+logger = logging.getLogger(__name__)
+
+#: facts already collected: (flow_path, sink types) --> (flow version, LexicalFacts)
+_facts: {(str, frozenset[str]): (tuple, LexicalFacts)} = {}
+
+
+def clear_cache() -> None:
+    """Forgets the facts already collected
+
+    Returns:
+        None
+    """
+    _facts.clear()
+
+
+@dataclass(frozen=True, eq=True, slots=True)
+class LexicalFacts:
+    # a variable is available for input
+    has_input_variables: bool
+
+    # a screen has an input field
+    has_input_fields: bool
+
+    # top level sink elements found (restricted to the requested sink types)
+    sink_types: frozenset[str]
+
+    # labels of subflows called from this flow (may be incomplete if has_input_fields and sink_types are set)
+    subflow_names: tuple[str, ...]
+
+
+def may_have_results(flow_path: str, sink_types: frozenset[str],
+                     all_flows: {(str, str): str} | None) -> bool:
+    """Whether the root flow and the flows it calls contain both a source and a sink
+
+    Args:
+        flow_path: path of the root flow
+        sink_types: Flow Element types that are sinks of the active preset
+        all_flows: map (namespaced label, local label) --> flow path (used to resolve subflows)
+
+    Returns:
+        False only if the flow cannot produce any findings
+    """
+    root = get_facts(flow_path, sink_types)
+    has_source = root.has_input_variables
+    has_sink = False
+
+    worklist = [root]
+    seen = {flow_path}
+    while len(worklist) > 0:
+        facts = worklist.pop()
+        has_source = has_source or facts.has_input_fields
+        has_sink = has_sink or len(facts.sink_types) > 0
+        if has_source and has_sink:
+            return True
+
+        for sub_name in facts.subflow_names:
+            sub_path = resolve_name(all_flows or {}, sub_name=sub_name)
+            if sub_path is not None and sub_path not in seen:
+                seen.add(sub_path)
+                worklist.append(get_facts(sub_path, sink_types))
+
+    return False
+
+
+def get_facts(flow_path: str, sink_types: frozenset[str]) -> LexicalFacts:
+    """Retrieve the (cached) lexical facts of a flow file
+
+    Args:
+        flow_path: path of the flow file
+        sink_types: Flow Element types that are sinks of the active preset
+
+    Returns:
+        LexicalFacts
+    """
+    key = (flow_path, sink_types)
+    version = get_flow_version(flow_path)
+    if key not in _facts or _facts[key][0] != version:
+        _facts[key] = (version, scan_file(flow_path, sink_types))
+    return _facts[key][1]
+
+
+def scan_file(flow_path: str, sink_types: frozenset[str]) -> LexicalFacts:
+    """Streams through the flow file collecting lexical facts
+
+    The scan stops as soon as the flow is known to contain both an
+    input field and a sink, as such a flow can produce findings no matter
+    which flow calls it or which flows it calls.
+
+    Args:
+        flow_path: path of the flow file
+        sink_types: Flow Element types that are sinks of the active preset
+
+    Returns:
+        LexicalFacts
+    """
+    has_input_variables = False
+    has_input_fields = False
+    found_sinks = set()
+    subflow_names = []
+
+    with open_flow(flow_path) as fp:
+        for path, tag, elem in iter_elements(fp):
+            depth = len(path)
+            if depth == 1 and tag in sink_types:
+                # end of a top level sink element
+                found_sinks.add(tag)
+
+            elif depth == 2:
+                if path[1] == 'variables' and tag == 'isInput' and _is_true(elem.text):
+                    has_input_variables = True
+                elif _is_subflow_name(path, tag, elem):
+                    subflow_names.append(elem.text.strip())
+
+            if tag == 'fieldType' and depth > 0 and path[-1] == 'fields' and elem.text == 'InputField':
+                has_input_fields = True
+
+            if has_input_fields and len(found_sinks) > 0:
+                break
+
+    return LexicalFacts(has_input_variables=has_input_variables,
+                        has_input_fields=has_input_fields,
+                        sink_types=frozenset(found_sinks),
+                        subflow_names=tuple(subflow_names))
+
+
+def read_subflow_names(fp: BinaryIO) -> tuple[str, ...]:
+    """Labels of the subflows called by a flow, read from an open file
+
+    Args:
+        fp: flow xml opened for binary reading
+
+    Returns:
+        contents of the ``<flowName>`` of each top level ``<subflows>`` element
+    """
+    return tuple(elem.text.strip() for path, tag, elem in iter_elements(fp) if _is_subflow_name(path, tag, elem))
+
+
+def iter_elements(fp: BinaryIO) -> Iterator[tuple[list[str], str, ET.Element]]:
+    """Streams through flow xml, yielding each element once its end tag is read
+
+    Top level Flow Elements are cleared after they are yielded, so memory
+    stays bounded by the largest Flow Element rather than the file.
+
+    Args:
+        fp: flow xml opened for binary reading
+
+    Yields:
+        (tags of the enclosing elements, tag, element), with the namespace stripped from the tags.
+        The list of enclosing tags is reused, so callers must copy it to keep it.
+    """
+    path = []
+    for event, elem in ET.iterparse(fp, events=('start', 'end')):
+        if event == 'start':
+            path.append(_strip(elem.tag))
+            continue
+
+        tag = path.pop()
+        yield path, tag, elem
+        if len(path) == 1:
+            elem.clear()
+
+
+def _is_subflow_name(path: list[str], tag: str, elem: ET.Element) -> bool:
+    return len(path) == 2 and path[1] == 'subflows' and tag == 'flowName' and elem.text is not None
+
+
+def _strip(tag: str) -> str:
+    if isinstance(tag, str) and tag.startswith(ns):
+        return tag[len(ns):]
+    return tag
+
+
+def _is_true(text: str | None) -> bool:
+    return text is not None and text.strip() == 'true'
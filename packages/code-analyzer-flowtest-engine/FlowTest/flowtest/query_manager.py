@@ -8,30 +8,45 @@ from __future__ import annotations
 import importlib
 import logging
 import os
+import time
 import traceback
 import types
-from enum import Enum
+from dataclasses import dataclass
 from importlib import machinery
 from typing import Any
 
 import queries.default_query
 from flow_parser.parse import Parser
+from flowtest import hooks
 from flowtest.flow_result import ResultsProcessor
+from flowtest.hooks import HookKind
+from public import parse_utils
 from public.contracts import QueryProcessor, State
+from public.data_obj import Preset
+from public.enums import QueryAction
 
 logger = logging.getLogger(__name__)
 
 
-class QueryAction(Enum):
-    process_elem = 0
-    flow_enter = 10
-    scan_exit = 20
+@dataclass(frozen=True, eq=True, slots=True)
+class QuerySpec:
+    # path of custom query module, or None for the default queries
+    module_path: str | None = None
+
+    # name of class to instantiate in the module
+    class_name: str | None = None
+
+    # preset to request from the query processor
+    preset: str | None = None
 
 
 class QueryManager:
-    # instance that performs queries and produces results
+    # instance that performs queries and produces results (the first of query_processors)
     query_processor: QueryProcessor = None
 
+    # all query instances driven by the crawl, in the order they were requested
+    query_processors: [QueryProcessor] = None
+
     # instance that stores results and generates reports
     results: ResultsProcessor = None
 
@@ -45,40 +60,68 @@ class QueryManager:
 
     class_name: str | None = None
 
+    # loaded module (None for default queries), class name and preset of each query instance
+    loaders: [(Any, str | None, str | None)] = None
+
+    # for each query instance, the name its results are tagged with in the report
+    # (None if there is only one query instance, whose results are not tagged)
+    result_tags: [str | None] = None
+
+    # for each query instance, action --> element tags to dispatch (None for all tags).
+    # Actions not present are skipped.
+    dispatches: [{QueryAction: frozenset[str] | None}] = None
+
+    # seconds spent in query processors since the query manager was built
+    query_time: float = 0.0
+
     @classmethod
     def build(cls, results: ResultsProcessor,
               parser: Parser = None,
               requested_preset: str | None = None,
               module_path: str | None = None,
-              class_name: str | None = None) -> QueryManager:
+              class_name: str | None = None,
+              extra_queries: [QuerySpec] | None = None) -> QueryManager:
         """Only call this once to build Query Manager at scan start
-        """
-        qm = QueryManager()
-        if module_path is not None:
-            # try to load requested query
-            # TODO: add better error handling
-            query_module = create_module(module_path=module_path)
-
-            qm.query_module = query_module
-            qm.class_name = class_name
-            preset, instance = get_instance(query_module_=query_module,
-                                            class_name_=class_name,
-                                            preset_=requested_preset)
-            qm.requested_preset = requested_preset
 
-        else:
-            # use default
-            instance = queries.default_query.DefaultQueryProcessor()
-            preset = instance.set_preset_name(preset_name=requested_preset)
+        Args:
+            results: stores the results of all query instances
+            parser: parser of current flow
+            requested_preset: preset of the (first) query instance
+            module_path: module of the (first) query instance, or None for the default queries
+            class_name: class of the (first) query instance
+            extra_queries: additional query instances to run in the same crawl
 
-        if preset is None:
-            raise RuntimeError(f"The loaded query module does not support preset: {preset or 'No preset provided'}")
+        Returns:
+            QueryManager
 
-        # store pointer to query processor
-        qm.query_processor = instance
+        Raises:
+            RuntimeError if a preset is not supported
+        """
+        qm = QueryManager()
+        qm.query_module = create_module(module_path=module_path)
+        qm.class_name = class_name
+        qm.requested_preset = requested_preset
+
+        qm.loaders = [(qm.query_module, class_name, requested_preset)]
+        for spec in extra_queries or []:
+            qm.loaders.append((create_module(module_path=spec.module_path), spec.class_name, spec.preset))
+
+        presets = []
+        qm.query_processors = []
+        for loader in qm.loaders:
+            preset, instance = load_instance(*loader)
+            if preset is None:
+                raise RuntimeError(f"The loaded query module does not support preset: {loader[2] or 'No preset provided'}")
+            presets.append(preset)
+            qm.query_processors.append(instance)
+
+        # store pointer to query processors
+        qm.query_processor = qm.query_processors[0]
+        qm.dispatches = [build_dispatch(x) for x in qm.query_processors]
+        qm.result_tags = build_result_tags(presets, qm.query_processors)
 
         # assign preset to results
-        results.preset = preset
+        results.preset = merge_presets(presets)
 
         # store pointer to results
         qm.results = results
@@ -87,23 +130,25 @@ class QueryManager:
         return qm
 
     def reload(self):
-        """Make a new instance of the queries after completing one flow
+        """Make new instances of the queries after completing one flow
 
         Returns:
             None
         """
+        self.query_processors = [load_instance(*loader)[1] for loader in self.loaders]
+        self.query_processor = self.query_processors[0]
+        self.dispatches = [build_dispatch(x) for x in self.query_processors]
 
-        if self.query_module is None or self.class_name is None:
-            # use default
-            self.query_processor = queries.default_query.DefaultQueryProcessor()
-            return
-        else:
-            preset, instance = get_instance(self.query_module,
-                                            self.class_name, self.requested_preset)
-        self.query_processor = instance
+    def is_default_only(self) -> bool:
+        """Whether only the default queries are run, so their sources and sinks are known statically
+
+        Returns:
+            True if all query instances are default query instances
+        """
+        return all(type(x) is queries.default_query.DefaultQueryProcessor for x in self.query_processors)
 
     def query(self, action: QueryAction, state: State) -> None:
-        """Invokes QueryProcessor to execute query and stores results
+        """Invokes QueryProcessors to execute queries and stores results
 
         Args:
             action: type of invocation (flow entrance or element entrance)
@@ -115,30 +160,132 @@ class QueryManager:
         # TODO: add exception handling and logging as this is third party code
         # when we first enter a state, there is a start elem which is not assigned and so curr elem is None.
         # don't look for sinks into these start states.
-        if action is QueryAction.process_elem and state.get_current_elem() is not None:
-
-            res = self.query_processor.handle_crawl_element(state=state)
-            if res is not None:
-                self.results.add_results(res)
+        if action is QueryAction.process_elem and state.get_current_elem() is None:
+            return
 
-        elif action is QueryAction.flow_enter:
-            res = self.query_processor.handle_flow_enter(state=state)
-            # TODO: better validation of result
-            if res is not None:
-                self.results.add_results(res)
+        start = time.perf_counter()
+        tag = None
+        for (query_processor, dispatch, result_tag) in zip(self.query_processors, self.dispatches, self.result_tags):
+            if action not in dispatch:
+                continue
+
+            if action is QueryAction.process_elem:
+                tags = dispatch[action]
+                if tags is not None:
+                    if tag is None:
+                        tag = parse_utils.get_tag(state.get_current_elem())
+                    if tag not in tags:
+                        continue
+
+                dispatch_start = time.perf_counter() if hooks.ENABLED is True else None
+                res = query_processor.handle_crawl_element(state=state)
+                if res is not None:
+                    self.results.add_results(res, preset_name=result_tag)
+
+            elif action is QueryAction.flow_enter:
+                dispatch_start = time.perf_counter() if hooks.ENABLED is True else None
+                res = query_processor.handle_flow_enter(state=state)
+                # TODO: better validation of result
+                if res is not None:
+                    self.results.add_results(res, preset_name=result_tag)
+            else:
+                continue
+
+            if dispatch_start is not None:
+                _emit_query(query_processor, action, state, dispatch_start)
+
+        self.query_time += time.perf_counter() - start
 
     def final_query(self, all_states: (State,)) -> None:
-        res = self.query_processor.handle_final(all_states=all_states)
-        # TODO: better validation of result
-        if res is not None:
-            self.results.add_results(res)
-
-        # delete old query instance and reload for next flow to process
+        start = time.perf_counter()
+        for (query_processor, dispatch, result_tag) in zip(self.query_processors, self.dispatches, self.result_tags):
+            if QueryAction.scan_exit in dispatch:
+                dispatch_start = time.perf_counter() if hooks.ENABLED is True else None
+                res = query_processor.handle_final(all_states=all_states)
+                # TODO: better validation of result
+                if res is not None:
+                    self.results.add_results(res, preset_name=result_tag)
+                if dispatch_start is not None:
+                    _emit_query(query_processor, QueryAction.scan_exit, None, dispatch_start)
+
+            for (name, value) in (query_processor.get_statistics() or {}).items():
+                self.results.query_stats[name] = self.results.query_stats.get(name, 0) + value
+
+        self.query_time += time.perf_counter() - start
+
+        # delete old query instances and reload for next flow to process
         self.reload()
 
         # delete old states
 
 
+def _emit_query(query_processor: QueryProcessor, action: QueryAction, state: State | None, start: float) -> None:
+    flow_path = None if state is None else state.get_parser().flow_path
+    element = None if state is None else state.get_current_elem_name()
+    hooks.emit(HookKind.query, flow_path, start, name=type(query_processor).__name__,
+               action=action.name, element=element)
+
+
+def merge_presets(presets: [Preset]) -> Preset:
+    """Combines the presets of all query instances into the preset of the report
+
+    Args:
+        presets: accepted presets, in order
+
+    Returns:
+        the preset if there is only one, otherwise a preset running all their queries
+    """
+    if len(presets) == 1:
+        return presets[0]
+
+    owners = {x.preset_owner for x in presets}
+    return Preset(preset_name=" + ".join(x.preset_name for x in presets),
+                  preset_owner=owners.pop() if len(owners) == 1 else None,
+                  queries={query for x in presets for query in x.queries})
+
+
+def build_result_tags(presets: [Preset], query_processors: [QueryProcessor]) -> [str | None]:
+    """Names under which the results of each query instance are reported
+
+    A query instance is named after its preset, or after its class and its
+    preset if another instance accepted a preset with the same name.
+
+    Args:
+        presets: accepted presets, in order
+        query_processors: query instances, in the same order
+
+    Returns:
+        one name per query instance (all None if there is only one instance)
+    """
+    if len(presets) == 1:
+        return [None]
+
+    names = [x.preset_name for x in presets]
+    return [name if names.count(name) == 1 else f"{type(instance).__name__}:{name}"
+            for (name, instance) in zip(names, query_processors)]
+
+
+def build_dispatch(query_processor: QueryProcessor) -> {QueryAction: frozenset[str] | None}:
+    """Builds the dispatch table from the subscriptions declared by the query processor
+
+    Query processors that do not declare subscriptions receive every action and element.
+
+    Args:
+        query_processor: loaded query instance
+
+    Returns:
+        map action --> element tags to dispatch (None for all tags)
+    """
+    actions = getattr(query_processor, 'subscribed_actions', None)
+    tags = getattr(query_processor, 'subscribed_tags', None)
+    if actions is None:
+        actions = tuple(QueryAction)
+    if tags is not None:
+        tags = frozenset(tags)
+
+    return {action: tags if action is QueryAction.process_elem else None for action in actions}
+
+
 def create_module(module_path: str) -> Any:
     """Loads and Instantiates QueryProcessor
 
@@ -180,6 +327,27 @@ def create_module(module_path: str) -> Any:
             raise e
 
 
+def load_instance(query_module_, class_name_, preset_) -> (Preset | None, QueryProcessor):
+    """Instantiates a query processor and requests its preset
+
+    Args:
+        query_module_: module loaded by :func:`create_module`, or None for the default queries
+        class_name_: class to instantiate in the module
+        preset_: name of preset to request
+
+    Returns:
+        accepted preset (None if the default queries do not support it), query instance
+
+    Raises:
+        ValueError if a custom query does not accept the preset
+    """
+    if query_module_ is None:
+        instance = queries.default_query.DefaultQueryProcessor()
+        return instance.set_preset_name(preset_name=preset_), instance
+
+    return get_instance(query_module_, class_name_, preset_)
+
+
 def get_instance(query_module_, class_name_, preset_):
     if query_module_ is None:
         query_instance = queries.default_query.QueryProcessor()
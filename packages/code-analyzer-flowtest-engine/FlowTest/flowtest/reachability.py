@@ -0,0 +1,334 @@
+"""Flow-insensitive reachability pre-check
+
+Before a root flow is crawled, every influence edge that wiring could
+create in the flow and its subflows is collected statically, ignoring
+control flow. If no source of the default queries can reach any of their
+sinks through these edges, the path-sensitive crawl cannot produce a
+finding and can be skipped.
+
+Nodes are ``(flow_path, variable name)`` tuples using the same names as
+the keys of the influence map. Edges come from
+
+    * assignment statements
+    * loops and filter collection processors
+    * formula and template merge-fields (:meth:`Parser.get_all_indirect_tuples`)
+    * subflow input assignments (parent --> child) and
+      output assignments (child --> parent)
+
+The origin of every tainted flow is a variable initialization, and flows
+only grow along these edges, so the pre-check over-approximates the crawl.
+
+The same graph gives the backward slice of the sinks: the variables that
+can reach a sink. Statements that influence variables outside the slice
+cannot change any finding, so wiring can skip them.
+
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import traceback
+from collections import deque
+from dataclasses import dataclass
+
+import flow_parser.parse as parse
+from flowtest.util import resolve_name
+from public import parse_utils
+from queries.default_query import get_sources, SINK_TAGS
+
+#: module logger
+logger = logging.getLogger(__name__)
+
+#: summaries already extracted: (flow_path, content hash) --> FlowSummary
+_summaries: {(str, str): FlowSummary} = {}
+
+
+def clear_cache() -> None:
+    """Forgets the summaries already extracted
+
+    Returns:
+        None
+    """
+    _summaries.clear()
+
+
+@dataclass(frozen=True, slots=True)
+class InfluenceGraph:
+    # influencer node --> influenced nodes
+    adjacency: {(str, str): {(str, str)}}
+
+    # source nodes in the root flow and all flows it calls
+    sources: frozenset[(str, str)]
+
+    # sink nodes in the root flow and all flows it calls
+    sinks: frozenset[(str, str)]
+
+
+@dataclass(frozen=True, eq=True, slots=True)
+class SubflowCall:
+    # label of the called flow, as it appears in <flowName>
+    flow_name: str
+
+    # (parent node, child input variable name)
+    inputs: tuple[((str, str), str), ...]
+
+    # (child output variable name, parent nodes that receive it)
+    outputs: tuple[(str, tuple[(str, str), ...]), ...]
+
+    # name of the subflow element if outputs are stored automatically
+    auto_store_name: str | None
+
+
+@dataclass(frozen=True, eq=True, slots=True)
+class FlowSummary:
+    flow_path: str
+
+    # influencer node --> influenced node
+    edges: tuple[((str, str), (str, str)), ...]
+
+    # sources that are present whether the flow is a root or a subflow
+    field_sources: tuple[(str, str), ...]
+
+    # sources only present if this is the root flow (input variables)
+    root_sources: tuple[(str, str), ...]
+
+    # variables flowing into CRUD elements
+    sinks: tuple[(str, str), ...]
+
+    # names of variables available for output
+    output_variables: tuple[str, ...]
+
+    # subflow elements in this flow
+    calls: tuple[SubflowCall, ...]
+
+
+def build_graph(parser: parse.Parser, all_flows: {(str, str): str} | None) -> InfluenceGraph:
+    """Collects the influence edges, sources and sinks of the root flow and all flows it calls
+
+    Args:
+        parser: parser of the root flow
+        all_flows: map (namespaced label, local label) --> flow path (used to resolve subflows)
+
+    Returns:
+        InfluenceGraph
+    """
+    root = get_summary(parser)
+    adjacency = {}
+    sources = set(root.root_sources)
+    sinks = set()
+    summaries = {root.flow_path: root}
+
+    worklist = [root]
+    while len(worklist) > 0:
+        summary = worklist.pop()
+        sources.update(summary.field_sources)
+        sinks.update(summary.sinks)
+        for (src, tgt) in summary.edges:
+            adjacency.setdefault(src, set()).add(tgt)
+
+        for call in summary.calls:
+            sub_path = resolve_name(all_flows or {}, sub_name=call.flow_name)
+            if sub_path is None:
+                continue
+            if sub_path not in summaries:
+                summaries[sub_path] = load_summary(sub_path)
+                worklist.append(summaries[sub_path])
+
+            for (parent_node, child_name) in call.inputs:
+                adjacency.setdefault(parent_node, set()).add((sub_path, child_name))
+
+            if call.auto_store_name is not None:
+                for out_name in summaries[sub_path].output_variables:
+                    adjacency.setdefault((sub_path, out_name), set()).add(
+                        (summary.flow_path, f"{call.auto_store_name}.{out_name}"))
+            for (out_name, parent_nodes) in call.outputs:
+                adjacency.setdefault((sub_path, out_name), set()).update(parent_nodes)
+
+    return InfluenceGraph(adjacency=adjacency, sources=frozenset(sources), sinks=frozenset(sinks))
+
+
+def is_sink_reachable(graph: InfluenceGraph) -> bool:
+    """Whether any source of the default queries can reach any sink
+
+    Args:
+        graph: influence graph of the root flow
+
+    Returns:
+        False only if no source can reach a sink in the root flow or any flow it calls
+    """
+    if len(graph.sources) == 0 or len(graph.sinks) == 0:
+        return False
+
+    # breadth first search from all sources at once
+    visited = set(graph.sources)
+    queue = deque(graph.sources)
+    while len(queue) > 0:
+        node = queue.popleft()
+        if node in graph.sinks:
+            return True
+        for tgt in graph.adjacency.get(node, ()):
+            if tgt not in visited:
+                visited.add(tgt)
+                queue.append(tgt)
+
+    return False
+
+
+def get_backward_slice(graph: InfluenceGraph) -> frozenset[(str, str)]:
+    """All nodes that can reach a sink (including the sinks)
+
+    Args:
+        graph: influence graph of the root flow
+
+    Returns:
+        (flow_path, variable name) tuples whose flows can matter to a finding
+    """
+    reverse = {}
+    for (src, targets) in graph.adjacency.items():
+        for tgt in targets:
+            reverse.setdefault(tgt, set()).add(src)
+
+    visited = set(graph.sinks)
+    queue = deque(graph.sinks)
+    while len(queue) > 0:
+        node = queue.popleft()
+        for src in reverse.get(node, ()):
+            if src not in visited:
+                visited.add(src)
+                queue.append(src)
+
+    return frozenset(visited)
+
+
+def load_summary(flow_path: str) -> FlowSummary:
+    """Retrieve the (cached) summary of the flow file, parsing it only if it has changed
+
+    Args:
+        flow_path: path of the flow file
+
+    Returns:
+        FlowSummary
+    """
+    with parse.open_flow(flow_path) as fp:
+        xml_bytes = fp.read()
+    key = (flow_path, hashlib.sha256(xml_bytes).hexdigest())
+    if key in _summaries:
+        return _summaries[key]
+
+    return get_summary(parse.Parser.from_file_contents(xml_bytes, filepath=flow_path))
+
+
+def get_summary(parser: parse.Parser) -> FlowSummary:
+    """Retrieve the (cached) summary of the flow
+
+    Args:
+        parser: parser of the flow
+
+    Returns:
+        FlowSummary
+    """
+    key = (parser.flow_path, parser.content_hash)
+    if parser.content_hash is not None and key in _summaries:
+        return _summaries[key]
+
+    summary = build_summary(parser)
+    if parser.content_hash is not None:
+        _summaries[key] = summary
+    return summary
+
+
+def build_summary(parser: parse.Parser) -> FlowSummary:
+    """Collects all influence edges, sources, sinks and subflow calls of a flow
+
+    Args:
+        parser: parser of the flow
+
+    Returns:
+        FlowSummary
+    """
+    flow_path = parser.flow_path
+    edges = set()
+    sinks = set()
+    calls = []
+
+    for facts in parser.element_facts.values():
+        for (_, stmt) in facts.assignment_statements:
+            _add_edge(parser, edges, stmt.influencer_var, stmt.influenced_var)
+
+        if facts.collection_statement is not None:
+            stmt = facts.collection_statement
+            _add_edge(parser, edges, stmt.influencer_var, stmt.influenced_var)
+
+        if facts.tag in SINK_TAGS:
+            influencers = [x[1] for x in facts.filter_influencers + facts.input_influencers]
+            if facts.input_reference is not None:
+                influencers.append(facts.input_reference)
+            for var in influencers:
+                node = _resolve(parser, var)
+                if node is not None:
+                    sinks.add(node)
+
+    for (var, elem) in parser.get_all_indirect_tuples():
+        _add_edge(parser, edges, var, parse.get_name(elem))
+
+    for elem in parser.get_all_traversable_flow_elements():
+        if parse_utils.is_subflow(elem):
+            calls.append(_build_call(parser, elem))
+
+    field_sources = get_sources(parser, start=False)
+    root_sources = [x for x in get_sources(parser, start=True) if x not in field_sources]
+
+    return FlowSummary(flow_path=flow_path,
+                       edges=tuple(edges),
+                       field_sources=tuple(field_sources),
+                       root_sources=tuple(root_sources),
+                       sinks=tuple(sinks),
+                       output_variables=tuple(x[1] for x in parser.get_output_variables()),
+                       calls=tuple(calls))
+
+
+def _build_call(parser: parse.Parser, elem) -> SubflowCall:
+    flow_path = parser.flow_path
+
+    # crawl reads inputs from the resolved parent variable
+    inputs = []
+    for (parent_var, child_var) in parse_utils.get_subflow_input_map(elem).items():
+        node = _resolve(parser, parent_var)
+        if node is not None:
+            inputs.append((node, child_var))
+
+    # crawl stores outputs under the raw target name, which
+    # statements read back under the resolved name, so use both
+    auto, output_map = parse_utils.get_subflow_output_map(elem)
+    outputs = []
+    for (child_var, parent_var) in output_map.items():
+        parent_nodes = {(flow_path, parent_var)}
+        node = _resolve(parser, parent_var)
+        if node is not None:
+            parent_nodes.add(node)
+        outputs.append((child_var, tuple(parent_nodes)))
+
+    return SubflowCall(flow_name=parse_utils.get_subflow_name(elem),
+                       inputs=tuple(inputs),
+                       outputs=tuple(outputs),
+                       auto_store_name=parse.get_name(elem) if auto else None)
+
+
+def _add_edge(parser: parse.Parser, edges: set, influencer: str, influenced: str) -> None:
+    if influencer is None or influencer == parse.STRING_LITERAL_TOKEN:
+        return
+    src = _resolve(parser, influencer)
+    tgt = _resolve(parser, influenced)
+    if src is not None and tgt is not None:
+        edges.add((src, tgt))
+
+
+def _resolve(parser: parse.Parser, name: str) -> (str, str) | None:
+    try:
+        res = parser.resolve_by_name(name)
+    except Exception:
+        logger.error(f"Could not resolve {name}: {traceback.format_exc()}")
+        return None
+    if res is None:
+        return None
+    return parser.flow_path, res[0]
@@ -0,0 +1,272 @@
+"""Splitting a scan across several nodes and merging the results
+
+Flows are grouped into shards along the connected components of the
+subflow graph, so that every subflow of a root flow is in the same shard
+and is resolved by :func:`util.resolve_name` exactly as in a full scan.
+Flows sharing a local label are kept together as well, since a label can
+only be resolved relative to all the flows that carry it.
+
+Each shard manifest is a newline separated list of flow paths that can be
+passed to ``--infile``. The json reports of the shards are combined with
+:func:`merge_reports`.
+
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import os
+from dataclasses import dataclass
+
+from flowtest import impact, prefilter
+from flowtest.flow_result import ResultsProcessor, expand_compact_report
+from flow_parser.parse import TRAVERSABLE_TAGS, open_flow
+from public.data_obj import DataInfluencePath, DataInfluenceStatement, Preset, QueryDescription, QueryResult
+from public.enums import Severity
+from public.parse_utils import ET, CONN_LIST
+
+#: module logger
+logger = logging.getLogger(__name__)
+
+#: name of the plan summary written next to the manifests
+PLAN_FILENAME: str = "plan.json"
+
+
+@dataclass(frozen=True, eq=True, slots=True)
+class Shard:
+    # position of the shard in the plan
+    index: int
+
+    # absolute paths of the flows to scan
+    flows: tuple[str, ...]
+
+    # estimated cost of scanning all flows in the shard
+    cost: int
+
+    def get_manifest_name(self) -> str:
+        return f"shard_{self.index:03d}.txt"
+
+
+def plan_shards(all_flows: {(str, str): str}, shard_count: int) -> list[Shard]:
+    """Groups flows into balanced shards
+
+    Components are assigned from the most to the least expensive, each
+    to the shard with the lowest total cost so far.
+
+    Args:
+        all_flows: map (namespaced label, local label) --> flow path of all flows in scope
+        shard_count: number of shards to build
+
+    Returns:
+        list of shards (some may be empty if there are fewer components than shards)
+    """
+    if shard_count < 1:
+        raise ValueError("At least one shard is needed")
+
+    all_flows = {label: os.path.abspath(path) for (label, path) in all_flows.items()}
+    callees = impact.build_call_graph(all_flows)
+    own_costs = {path: estimate_cost(path) for path in callees}
+
+    components = []
+    for component in get_components(all_flows, callees):
+        # every flow in the component is crawled as a root, together with its subflow closure
+        cost = sum(own_costs[x] for root in component for x in _get_closure(root, callees))
+        components.append((cost, sorted(component)))
+    components.sort(key=lambda x: (-x[0], x[1]))
+
+    loads = [(0, index) for index in range(shard_count)]
+    assigned = [[] for _ in range(shard_count)]
+    costs = [0] * shard_count
+    for (cost, component) in components:
+        (load, index) = heapq.heappop(loads)
+        assigned[index] += component
+        costs[index] = load + cost
+        heapq.heappush(loads, (costs[index], index))
+
+    return [Shard(index=i, flows=tuple(assigned[i]), cost=costs[i]) for i in range(shard_count)]
+
+
+def write_manifests(shards: list[Shard], out_dir: str) -> list[str]:
+    """Writes one ``--infile`` manifest per non-empty shard, and a plan summary
+
+    Args:
+        shards: shards built by :func:`plan_shards`
+        out_dir: directory in which to write
+
+    Returns:
+        paths of the manifests written
+    """
+    written = []
+    summary = []
+    for shard in shards:
+        if len(shard.flows) == 0:
+            continue
+        manifest = os.path.join(out_dir, shard.get_manifest_name())
+        with open(manifest, 'w', encoding='utf-8') as fp:
+            fp.write("\n".join(shard.flows) + "\n")
+        written.append(manifest)
+        summary.append({"manifest": manifest, "cost": shard.cost, "flows": list(shard.flows)})
+
+    with open(os.path.join(out_dir, PLAN_FILENAME), 'w', encoding='utf-8') as fp:
+        json.dump({"shards": summary}, fp, indent=4)
+
+    return written
+
+
+def get_components(all_flows: {(str, str): str}, callees: {str: {str}}) -> list[list[str]]:
+    """Connected components of the (undirected) subflow graph
+
+    Args:
+        all_flows: map (namespaced label, local label) --> flow path
+        callees: map flow path --> paths of called flows
+
+    Returns:
+        list of components, each a list of flow paths
+    """
+    parents = {path: path for path in callees}
+
+    def find(x: str) -> str:
+        while parents[x] != x:
+            parents[x] = parents[parents[x]]
+            x = parents[x]
+        return x
+
+    def union(x: str, y: str) -> None:
+        if x in parents and y in parents:
+            parents[find(x)] = find(y)
+
+    for (path, sub_paths) in callees.items():
+        for sub_path in sub_paths:
+            union(path, sub_path)
+
+    by_local_label = {}
+    for ((_, local_label), path) in all_flows.items():
+        by_local_label.setdefault(local_label, []).append(path)
+    for paths in by_local_label.values():
+        for path in paths[1:]:
+            union(path, paths[0])
+
+    components = {}
+    for path in parents:
+        components.setdefault(find(path), []).append(path)
+    return list(components.values())
+
+
+def estimate_cost(flow_path: str) -> int:
+    """Estimates the cost of crawling a flow (without its subflows)
+
+    The crawl visits each Flow Element once per branch leading to it, so
+    the cost is the number of traversable elements plus the number of
+    connectors.
+
+    Args:
+        flow_path: path of the flow file
+
+    Returns:
+        estimated cost (at least 1)
+    """
+    elements = 0
+    connectors = 0
+    try:
+        with open_flow(flow_path) as fp:
+            for path, tag, _ in prefilter.iter_elements(fp):
+                if len(path) == 1:
+                    if tag in TRAVERSABLE_TAGS:
+                        elements += 1
+                elif tag in CONN_LIST:
+                    connectors += 1
+
+    except ET.ParseError:
+        logger.error(f"Could not estimate the cost of {flow_path}")
+
+    return 1 + elements + connectors
+
+
+def merge_reports(reports: list[dict]) -> dict:
+    """Combines json reports of several shards into one report
+
+    The findings of the reports are added to a
+    :class:`flow_result.ResultsProcessor`, so they are consolidated exactly
+    as in an unsharded scan: findings of the same query ending in the same
+    influence statement are merged, and duplicate flows are removed.
+
+    Args:
+        reports: parsed json reports (as written by ``--json``, in either schema)
+
+    Returns:
+        merged report (in the full schema)
+    """
+    if len(reports) == 0:
+        raise ValueError("No reports to merge")
+
+    reports = [expand_compact_report(x) for x in reports]
+    first = reports[0]
+
+    preset_names = []
+    descriptions = {}
+    for report in reports:
+        if report.get("preset") not in preset_names:
+            preset_names.append(report.get("preset"))
+        for (query_id, entries) in (report.get("results") or {}).items():
+            if query_id not in descriptions and len(entries) > 0:
+                descriptions[query_id] = _get_query_description(query_id, entries[0])
+
+    results = ResultsProcessor(preset=Preset(preset_name=" + ".join(str(x) for x in preset_names),
+                                             preset_owner=None,
+                                             queries=set(descriptions.values())),
+                               requestor=first.get("email"),
+                               report_label=first.get("report_label"),
+                               result_id=first.get("result_id"),
+                               service_version=first.get("service_version"),
+                               help_url=first.get("help_url"))
+    results.scan_start = min(x["scan_start"] for x in reports)
+    results.scan_end = max(x["scan_end"] for x in reports)
+
+    for report in reports:
+        for (query_id, entries) in (report.get("results") or {}).items():
+            for entry in entries:
+                statements = [DataInfluenceStatement(**x) for x in entry["flow"]]
+                # the report appends the sink statement to the history of each path
+                query_result = QueryResult(query_id=query_id,
+                                           influence_statement=statements[-1],
+                                           paths=(None if len(statements) == 1
+                                                  else frozenset([_get_path(tuple(statements[:-1]))])))
+                for preset_name in entry.get("presets") or [None]:
+                    results.add_results([query_result], preset_name=preset_name)
+
+    merged = json.loads(results.get_json_str())
+    merged["flowtest_version"] = first.get("flowtest_version", merged["flowtest_version"])
+    return merged
+
+
+def _get_query_description(query_id: str, entry: dict) -> QueryDescription:
+    severity = entry.get("severity")
+    return QueryDescription(query_id=query_id,
+                            query_name=entry.get("query_name"),
+                            severity=Severity.__members__.get(severity, severity),
+                            query_description=entry.get("description"))
+
+
+def _get_path(history: tuple[DataInfluenceStatement, ...]) -> DataInfluencePath:
+    # only the history of a path is reported, and the other fields are derived from it,
+    # so paths are equal exactly when their reported flows are equal
+    return DataInfluencePath(history=history,
+                             influenced_name=history[-1].influenced_var,
+                             influenced_property=None,
+                             influencer_name=history[0].influencer_var,
+                             influencer_property=None,
+                             influenced_filepath=history[-1].flow_path,
+                             influencer_filepath=history[0].flow_path,
+                             influenced_type_info=None)
+
+
+def _get_closure(root: str, callees: {str: {str}}) -> set[str]:
+    closure = {root}
+    worklist = [root]
+    while len(worklist) > 0:
+        for sub_path in callees.get(worklist.pop(), ()):
+            if sub_path not in closure and sub_path in callees:
+                closure.add(sub_path)
+                worklist.append(sub_path)
+    return closure
@@ -0,0 +1,255 @@
+"""Export of scan results to a SQLite database
+
+The database is written with ``--sqlite`` while the scan runs: after each
+root flow, the findings that are new (or that gained or lost paths) are
+inserted in one transaction, so a partial scan can already be queried.
+Only the results reported by :meth:`flowtest.flow_result.ResultsProcessor.pop_changed_results`
+are visited, so the cost of each flow does not grow with the scan.
+Tables are normalized, so that every statement, xml snippet and flow
+is stored once::
+
+    metadata(key, value)
+    flows(flow_id, flow_path, scanned, skipped, error, duration, findings)
+    queries(query_id, query_name, severity, description, version, is_security, help_url)
+    snippets(snippet_id, source_text)
+    statements(statement_id, flow_id, element_name, influenced_var, influencer_var,
+               comment, line_no, snippet_id)
+    findings(finding_id, query_id, sink_statement_id, root_flow_id)
+    paths(path_id, finding_id, length)
+    path_statements(path_id, position, statement_id)
+
+For example, all findings into record updates in system mode::
+
+    SELECT f.finding_id, s.element_name, fl.flow_path
+    FROM findings f JOIN statements s ON s.statement_id = f.sink_statement_id
+                    JOIN flows fl ON fl.flow_id = s.flow_id
+    WHERE f.query_id LIKE '%SystemMode%recordUpdates%'
+
+"""
+from __future__ import annotations
+
+import logging
+import sqlite3
+
+from flowtest.flow_result import ResultsProcessor
+from flowtest.version import __version__
+from public.data_obj import DataInfluenceStatement, QueryResult
+
+#: module logger
+logger = logging.getLogger(__name__)
+
+#: table definitions, in creation order
+SCHEMA: str = """
+CREATE TABLE metadata (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE flows (flow_id INTEGER PRIMARY KEY, flow_path TEXT NOT NULL UNIQUE,
+                    scanned INTEGER NOT NULL DEFAULT 0, skipped INTEGER, error INTEGER,
+                    duration REAL, findings INTEGER);
+CREATE TABLE queries (query_id TEXT PRIMARY KEY, query_name TEXT, severity TEXT, description TEXT,
+                      version TEXT, is_security INTEGER, help_url TEXT);
+CREATE TABLE snippets (snippet_id INTEGER PRIMARY KEY, source_text TEXT);
+CREATE TABLE statements (statement_id INTEGER PRIMARY KEY,
+                         flow_id INTEGER REFERENCES flows(flow_id),
+                         element_name TEXT, influenced_var TEXT, influencer_var TEXT,
+                         comment TEXT, line_no INTEGER,
+                         snippet_id INTEGER REFERENCES snippets(snippet_id));
+CREATE TABLE findings (finding_id INTEGER PRIMARY KEY,
+                       query_id TEXT NOT NULL REFERENCES queries(query_id),
+                       sink_statement_id INTEGER NOT NULL REFERENCES statements(statement_id),
+                       root_flow_id INTEGER REFERENCES flows(flow_id));
+CREATE TABLE paths (path_id INTEGER PRIMARY KEY,
+                    finding_id INTEGER NOT NULL REFERENCES findings(finding_id),
+                    length INTEGER);
+CREATE TABLE path_statements (path_id INTEGER NOT NULL REFERENCES paths(path_id),
+                              position INTEGER NOT NULL,
+                              statement_id INTEGER NOT NULL REFERENCES statements(statement_id),
+                              PRIMARY KEY (path_id, position)) WITHOUT ROWID;
+CREATE INDEX statements_flow ON statements(flow_id);
+CREATE INDEX statements_element ON statements(element_name);
+CREATE INDEX findings_query ON findings(query_id);
+CREATE INDEX findings_sink ON findings(sink_statement_id);
+CREATE INDEX findings_root_flow ON findings(root_flow_id);
+CREATE INDEX paths_finding ON paths(finding_id);
+CREATE INDEX path_statements_statement ON path_statements(statement_id);
+"""
+
+
+class SqliteExporter:
+    """Writes the findings of a scan to a new SQLite database, one root flow at a time
+
+    Ids are assigned here rather than by SQLite, so that the rows of a
+    flow can be inserted in batches.
+    """
+
+    def __init__(self, db_path: str):
+        """Constructor
+
+        Args:
+            db_path: path of the database to create (must not exist)
+
+        """
+        #: connection to the database
+        self.connection: sqlite3.Connection = sqlite3.connect(db_path)
+        self.connection.executescript(SCHEMA)
+        self.connection.execute("INSERT INTO metadata VALUES ('flowtest_version', ?)", (__version__,))
+        self.connection.commit()
+
+        #: flow path --> flow_id
+        self.__flow_ids: {str: int} = {}
+
+        #: source text --> snippet_id
+        self.__snippet_ids: {str: int} = {}
+
+        #: statement --> statement_id (the statements are shared with the results processor)
+        self.__statement_ids: {DataInfluenceStatement: int} = {}
+
+        #: (query_id, sink statement) --> finding_id
+        self.__finding_ids: {(str, DataInfluenceStatement): int} = {}
+
+        #: id of the last path written
+        self.__last_path_id: int = 0
+
+        #: True once the query descriptions are written
+        self.__queries_written: bool = False
+
+        #: rows waiting to be inserted, by table
+        self.__batch: {str: [tuple]} = {}
+
+    def write_flow(self, flow_path: str, results: ResultsProcessor | None, error: bool = False) -> None:
+        """Writes the findings that changed since the previous root flow, in one transaction
+
+        Args:
+            flow_path: root flow that was just scanned
+            results: results of the scan so far (None if no flow could be scanned yet)
+            error: whether the scan of the flow failed
+
+        Returns:
+            None
+        """
+        self.__batch = {}
+        root_flow_id = self._get_flow_id(flow_path)
+        new_findings = 0
+        if results is not None:
+            if self.__queries_written is False and results.preset is not None:
+                self._write_metadata(results)
+            for query_result in results.pop_changed_results():
+                new_findings += self._add_finding(query_result, root_flow_id)
+
+        stats = None
+        if results is not None and len(results.flow_stats) > 0 and results.flow_stats[-1].flow_path == flow_path:
+            stats = results.flow_stats[-1]
+
+        with self.connection:
+            self._flush()
+            self.connection.execute("UPDATE flows SET scanned = 1, skipped = ?, error = ?, duration = ?, findings = ? "
+                                    "WHERE flow_id = ?",
+                                    (None if stats is None else int(stats.skipped), int(error),
+                                     None if stats is None else stats.total_time, new_findings, root_flow_id))
+
+    def close(self, results: ResultsProcessor | None = None) -> None:
+        """Records the end of the scan and closes the database
+
+        Args:
+            results: results of the scan (for the scan times)
+
+        Returns:
+            None
+        """
+        if results is not None:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)",
+                                            [("scan_start", results.scan_start), ("scan_end", results.scan_end)])
+        self.connection.close()
+
+    def _write_metadata(self, results: ResultsProcessor) -> None:
+        preset = results.preset
+        self._add_row("metadata", ("preset", preset.preset_name))
+        for query in sorted(preset.queries, key=lambda x: x.query_id):
+            self._add_row("queries", (query.query_id, query.query_name, str(query.severity),
+                                      query.query_description, query.query_version,
+                                      int(query.is_security), query.help_url))
+        self.__queries_written = True
+
+    def _add_finding(self, query_result: QueryResult, root_flow_id: int) -> int:
+        """Adds the rows of a new or changed finding
+
+        The paths of a changed finding are replaced, as paths may have been
+        added, or evicted by the per-finding budget.
+
+        Args:
+            query_result: finding (possibly merged with paths found in later flows)
+            root_flow_id: root flow being written
+
+        Returns:
+            1 if the finding is new, 0 otherwise
+        """
+        key = (query_result.query_id, query_result.influence_statement)
+        finding_id = self.__finding_ids.get(key)
+        is_new = finding_id is None
+        if is_new is True:
+            finding_id = self.__finding_ids[key] = len(self.__finding_ids) + 1
+            self._add_row("findings", (finding_id, query_result.query_id,
+                                       self._get_statement_id(query_result.influence_statement), root_flow_id))
+        else:
+            self._add_row("stale", (finding_id,))
+
+        for path in query_result.paths or ():
+            self.__last_path_id += 1
+            self._add_row("paths", (self.__last_path_id, finding_id, len(path.history)))
+            for (position, stmt) in enumerate(path.history):
+                self._add_row("path_statements", (self.__last_path_id, position, self._get_statement_id(stmt)))
+
+        return int(is_new)
+
+    def _get_flow_id(self, flow_path: str) -> int:
+        flow_id = self.__flow_ids.get(flow_path)
+        if flow_id is None:
+            flow_id = self.__flow_ids[flow_path] = len(self.__flow_ids) + 1
+            self._add_row("flows", (flow_id, flow_path))
+        return flow_id
+
+    def _get_snippet_id(self, source_text: str) -> int:
+        snippet_id = self.__snippet_ids.get(source_text)
+        if snippet_id is None:
+            snippet_id = self.__snippet_ids[source_text] = len(self.__snippet_ids) + 1
+            self._add_row("snippets", (snippet_id, source_text))
+        return snippet_id
+
+    def _get_statement_id(self, stmt: DataInfluenceStatement) -> int:
+        statement_id = self.__statement_ids.get(stmt)
+        if statement_id is None:
+            statement_id = self.__statement_ids[stmt] = len(self.__statement_ids) + 1
+            self._add_row("statements", (statement_id, self._get_flow_id(stmt.flow_path or ""), stmt.element_name,
+                                         stmt.influenced_var, stmt.influencer_var, stmt.comment, stmt.line_no,
+                                         self._get_snippet_id(stmt.source_text)))
+        return statement_id
+
+    def _add_row(self, table: str, row: tuple) -> None:
+        self.__batch.setdefault(table, []).append(row)
+
+    def _flush(self) -> None:
+        """Inserts the batched rows (call inside a transaction)
+
+        Returns:
+            None
+        """
+        batch = self.__batch
+        self.__batch = {}
+
+        stale = batch.get("stale")
+        if stale is not None:
+            # paths of changed findings are written again
+            self.connection.executemany("DELETE FROM path_statements WHERE path_id IN "
+                                        "(SELECT path_id FROM paths WHERE finding_id = ?)", stale)
+            self.connection.executemany("DELETE FROM paths WHERE finding_id = ?", stale)
+
+        # referenced rows first
+        for table in ("metadata", "queries", "flows", "snippets", "statements", "findings", "paths",
+                      "path_statements"):
+            rows = batch.get(table)
+            if rows is None:
+                continue
+            if table == "flows":
+                self.connection.executemany("INSERT INTO flows (flow_id, flow_path) VALUES (?, ?)", rows)
+            else:
+                placeholders = ", ".join("?" * len(rows[0]))
+                self.connection.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", rows)
@@ -0,0 +1,108 @@
+"""Per-flow analysis statistics
+
+One :class:`FlowStats` record is collected for each root flow by
+:func:`flowtest.executor.parse_flow` and stored in the results processor.
+Counters for the crawl are summed over the root flow and every subflow
+frame it spawned. The records are written with ``--stats`` to find out
+which flows are expensive to scan, and why.
+
+"""
+from __future__ import annotations
+
+import json
+import sys
+from dataclasses import dataclass, asdict
+from typing import TextIO
+
+
+@dataclass(slots=True)
+class FlowStats:
+    # path of the root flow
+    flow_path: str
+
+    # True if the flow was not crawled because it cannot produce findings
+    skipped: bool = False
+
+    # seconds spent parsing the root flow
+    parse_time: float = 0.0
+
+    # number of traversable elements in the root flow
+    element_count: int = 0
+
+    # number of segments in the control flow graph of the root flow
+    segment_count: int = 0
+
+    # crawl steps processed in the root flow and its subflows
+    crawl_steps: int = 0
+
+    # distinct branches (visitor histories) crawled
+    branch_count: int = 0
+
+    # crawl steps skipped because their segment visit was equivalent to an earlier one
+    pruned_steps: int = 0
+
+    # crawl steps that can terminate a flow
+    terminal_steps: int = 0
+
+    # subflows crawled
+    subflow_invocations: int = 0
+
+    # subflow calls whose outputs were predicted from an earlier call with the same inputs
+    fast_forwards: int = 0
+
+    # largest number of variables held in the influence map of a single crawl step
+    peak_influence_map_size: int = 0
+
+    # data influence paths constructed while crawling
+    paths_created: int = 0
+
+    # paths discarded to stay within the per-variable and per-finding path budgets
+    paths_dropped: int = 0
+
+    # seconds spent in query processors
+    query_time: float = 0.0
+
+    # seconds spent on the whole flow
+    total_time: float = 0.0
+
+    # new (de-duplicated) findings of this root flow
+    findings: int = 0
+
+    # high-water mark of the resident set size of the whole process when the flow finished, in
+    # kilobytes (None if unavailable). It never decreases, so it is not the memory used by this flow:
+    # it only grows past the previous record when this flow pushed memory use to a new peak.
+    process_peak_rss: int | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def get_peak_rss() -> int | None:
+    """Peak resident set size of the current process since it started
+
+    Returns:
+        kilobytes, or None if the platform does not report it
+    """
+    try:
+        import resource
+    except ImportError:
+        # not available on windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # reported in bytes on mac
+        peak = peak // 1024
+    return peak
+
+
+def dump_stats(records: [FlowStats], fp: TextIO) -> None:
+    """Writes statistics records as a json list
+
+    Args:
+        records: one record per root flow
+        fp: file pointer to write to
+
+    Returns:
+        None
+    """
+    json.dump([x.to_dict() for x in records], fp, indent=4)
@@ -7,7 +7,6 @@ import logging
 import os
 import pathlib
 import typing
-import uuid
 from collections.abc import Callable
 from dataclasses import fields
 from typing import TYPE_CHECKING
@@ -127,7 +126,8 @@ def make_id() -> str:
         8 digit unique id as str
 
     """
-    return str(uuid.uuid4())[:8]
+    # same format as the prefix of a uuid4, without importing uuid at startup
+    return os.urandom(4).hex()
 
 
 def get_effective_run_mode(parent_sharing: RunMode | None, current_sharing: RunMode) -> RunMode:
@@ -201,12 +201,13 @@ def match_all(x) -> bool:
     return True
 
 
-def resolve_name(all_flow_paths: {(str, str): str}, sub_name: str) -> str | None:
+def resolve_name(all_flow_paths: {(str, str): str}, sub_name: str, log_level: int = logging.CRITICAL) -> str | None:
     """return path of subflow to load based on subflow label
 
     Args:
         all_flow_paths: all flow paths in scan scope in the form (abs label, local label) --> abs_flow_path
         sub_name: subflow label
+        log_level: level at which to log a subflow that cannot be resolved
 
     Returns:
         subflow path
@@ -215,8 +216,8 @@ def resolve_name(all_flow_paths: {(str, str): str}, sub_name: str) -> str | None
     targets = [x for x in all_flow_paths.keys() if sub_name in x]
     sub_path = None
     if len(targets) == 0:
-        logger.critical(f"Could not find subflow to load with name: {sub_name}. "
-                        f"Please check that all flow files are in the directory to scan. Skipping..")
+        logger.log(log_level, f"Could not find subflow to load with name: {sub_name}. "
+                              f"Please check that all flow files are in the directory to scan. Skipping..")
         return None
     if len(targets) == 1:
         sub_path = all_flow_paths[targets[0]]
@@ -235,8 +236,8 @@ def resolve_name(all_flow_paths: {(str, str): str}, sub_name: str) -> str | None
                 sub_path = all_flow_paths[namespaced_targets[0]]
 
     if sub_path is None:
-        logger.critical(f"Could not resolve subflow with name: {sub_name}. "
-                        f"Please check that all flow files are in the directory to scan. Skipping..")
+        logger.log(log_level, f"Could not resolve subflow with name: {sub_name}. "
+                              f"Please check that all flow files are in the directory to scan. Skipping..")
 
         return None
 
@@ -40,32 +40,31 @@ import logging
 
 import flow_parser.parse as parse
 from flowtest.branch_state import BranchState
-from public import parse_utils
-from public.data_obj import DataInfluenceStatement
+from public.data_obj import ElementFacts
 from public.parse_utils import ET
 
 #: module logger
 logger = logging.getLogger(__name__)
 
 
-def handle_auto_store(state: BranchState, elem: ET.Element, elem_name: str) -> None:
+def handle_auto_store(state: BranchState, facts: ElementFacts, elem_name: str) -> None:
     """Add this element name to influence map if it represents its own output data
 
     (Element name is passed in so we don't need to keep looking it up)
 
     Args:
         state: current branch state
-        elem: current xml elem
+        facts: facts of current xml elem
         elem_name: element name
 
     Returns:
         None
 
     """
-    if parse_utils.is_auto_store(elem):
+    if facts.is_auto_store:
         state.get_or_make_vector(name=elem_name, store=True)
 
-    ref = parse_utils.get_output_reference(elem)
+    ref = facts.output_reference
     if ref is not None:
         state.get_or_make_vector(name=ref, store=True)
 
@@ -88,14 +87,15 @@ def wire(state: BranchState, elem: ET.Element):
     if elem is None:
         return None
 
-    el_type = parse.get_tag(elem)
     el_name = parse.get_name(elem)
+    facts = parse.lookup_element_facts(state.parser, elem, el_name)
+    el_type = facts.tag
 
     # handle <storeOutputAutomatically> here
-    handle_auto_store(state, elem, elem_name=el_name)
+    handle_auto_store(state, facts, elem_name=el_name)
 
     if el_type == 'assignments':
-        wire_assignment(state, elem, el_name)
+        wire_assignment(state, facts, el_name)
 
     # CRUD operations - currently we don't support second order flows,
     # but the implicit values, e.g. {!recordLookup} will already be
@@ -115,37 +115,38 @@ def wire(state: BranchState, elem: ET.Element):
 
     # loops and collection processors work with collection references
     if el_type == 'collectionProcessors':
-        wire_collection_processor(state, elem, el_name)
+        wire_collection_processor(state, facts, el_name)
 
     if el_type == 'loops':
-        wire_loop(state, elem, el_name)
+        wire_loop(state, facts, el_name)
 
     if el_type == 'screens':
         # add elem to influence map
-        input_elems = parse_utils.get_input_fields(elem)
-        if input_elems is not None:
-            for el in input_elems:
-                state.get_or_make_vector(name=parse_utils.get_name(el), store=True)
+        for input_name in facts.input_field_names:
+            state.get_or_make_vector(name=input_name, store=True)
 
 
-def wire_assignment(state: BranchState, elem: ET.Element, elem_name: str):
+def wire_assignment(state: BranchState, facts: ElementFacts, elem_name: str):
     """Wires assignment statements to influence map in `state`
 
     Args:
         state: current Branch State
-        elem: assignment element to be wired
+        facts: facts of assignment element to be wired
         elem_name: element name passed in for convenience
 
     Returns:
         None
 
     """
-    res = parse_utils.get_assignment_statement_dicts(elem)
-    if res is None:
+    res = facts.assignment_statements
+    if len(res) == 0:
         logger.error(f"Could not obtain any assignments from element {elem_name}")
         return
-    flow_path = state.flow_path
-    for (operator, entry) in res:
+    for (operator, stmt) in res:
+        if not state.is_relevant(stmt.influenced_var):
+            # this variable can't reach a sink
+            continue
+
         # we could have just return a boolean, but maybe there will be more operators in the future
         is_assign = operator == 'Assign'
 
@@ -165,70 +166,46 @@ def wire_assignment(state: BranchState, elem: ET.Element, elem_name: str):
         #
         # Always assign a variable name equal to parse.STRING_LITERAL_TOKEN
         # to signify something is a literal value and not a variable.
-        entry["flow_path"] = flow_path
-        stmt = DataInfluenceStatement(**entry)
         state.propagate_flows(statement=stmt,
                               assign=is_assign,
                               store=True)
 
 
-def wire_loop(state: BranchState, elem: ET.Element, elem_name: str):
+def wire_loop(state: BranchState, facts: ElementFacts, elem_name: str):
     """Wires collection loop is over to loop variable.
 
     Args:
         state: current Branch State
-        elem: assignment element to be wired
+        facts: facts of loop element to be wired
         elem_name: element name passed in for convenience
 
     Returns:
         None
 
     """
-    # every loop must have a single collection ref
-    collection_ref_el = parse.get_by_tag(elem, tagname='collectionReference')[0]
-    collection_ref_var = collection_ref_el.text
-    loop_var = elem_name
-    stmt = DataInfluenceStatement(
-        influenced_var=loop_var,
-        influencer_var=collection_ref_var,
-        element_name=elem_name,
-        source_text=parse.ET.tostring(collection_ref_el, encoding='unicode',
-                                      default_namespace='http://soap.sforce.com/2006/04/metadata'),
-        line_no=collection_ref_el.sourceline,
-        comment='assign to loop variable',
-        flow_path=state.flow_path
-    )
+    stmt = facts.collection_statement
+    if stmt is None:
+        logger.error(f"Could not obtain a collection reference from loop {elem_name}")
+        return
+    if not state.is_relevant(stmt.influenced_var):
+        return
     state.propagate_flows(statement=stmt, assign=True, store=True)
 
 
-def wire_collection_processor(state: BranchState, elem: ET.Element, elem_name: str):
+def wire_collection_processor(state: BranchState, facts: ElementFacts, elem_name: str):
     """Wires collection reference in collection processor to collection elem.
 
     Args:
         state: current Branch State
-        elem: assignment element to be wired
+        facts: facts of collection processor element to be wired
         elem_name: element name passed in for convenience
 
     Returns:
         None
 
     """
-    # every collectionProcessor must have a single collection ref
-    subtype = parse.get_by_tag(elem, tagname='elementSubtype')
-    if len(subtype) == 1 and subtype[0].text == 'FilterCollectionProcessor':
-        collection_el = parse.get_by_tag(elem, tagname='collectionReference')[0]
-    else:
+    # only filter collection processors have a collection statement
+    stmt = facts.collection_statement
+    if stmt is None or not state.is_relevant(stmt.influenced_var):
         return
-    collection_ref_var = collection_el.text
-    collection_var = elem_name
-    stmt = DataInfluenceStatement(
-        influenced_var=collection_var,
-        influencer_var=collection_ref_var,
-        element_name=elem_name,
-        source_text=parse.ET.tostring(collection_el, encoding='unicode',
-                                      default_namespace='http://soap.sforce.com/2006/04/metadata'),
-        line_no=collection_el.sourceline,
-        comment='collection filter',
-        flow_path=state.flow_path
-    )
     state.propagate_flows(statement=stmt, assign=True, store=True)
@@ -13,10 +13,10 @@ from abc import ABC, abstractmethod
 import public.enums
 
 if TYPE_CHECKING:
-    from public.data_obj import DataInfluencePath, VariableType
+    from public.data_obj import DataInfluencePath, VariableType, ElementFacts
     import xml.etree.ElementTree as ET
 
-from public.enums import RunMode
+from public.enums import RunMode, QueryAction
 
 # and import other types as needed to process queries
 from public.data_obj import QueryResult, Preset
@@ -62,9 +62,20 @@ class QueryProcessor(ABC):
     - do not rely on _methods in the parser being stable
       across even minor releases.
 
+    - Queries may declare the actions and element tags they
+      subscribe to (see below), in which case they are only
+      invoked for those. Queries that declare nothing receive
+      every action and every crawled element.
+
 
     """
 
+    #: actions for which the query is invoked (None for all actions)
+    subscribed_actions: frozenset[QueryAction] | None = None
+
+    #: tags of elements passed to :meth:`handle_crawl_element`, e.g. 'recordUpdates' (None for all elements)
+    subscribed_tags: frozenset[str] | None = None
+
     @abstractmethod
     def __init__(self) -> None:
         """Constructor is passed only a FlowParser instance.
@@ -151,6 +162,16 @@ class QueryProcessor(ABC):
         """
         pass
 
+    # Called after handle_final, before the query instance is discarded.
+    # Counters are summed over all flows and reported with the scan.
+    def get_statistics(self) -> {str: int} | None:
+        """Counters collected by the query while processing the flow
+
+        Returns:
+            map counter name --> value, or None
+        """
+        return None
+
 
 class State(ABC):
     """Stores DataInfluencePaths in the current execution step
@@ -172,6 +193,20 @@ class State(ABC):
     def get_flows_from_sources(self, influenced_var: str, source_vars: {(str, str)}) -> set[DataInfluencePath] | None:
         pass
 
+    def get_fingerprint(self, var_name: str) -> tuple | None:
+        """Objects determining the flows into the variable at the current step
+
+        If two fingerprints of the same variable in the same state have identical
+        members (by identity), :meth:`get_flows_from_sources` returns the same flows.
+
+        Args:
+            var_name: (raw, unresolved) variable name
+
+        Returns:
+            tuple to compare member-wise with ``is``, or None if not supported
+        """
+        return None
+
     @abstractmethod
     def is_in_map(self, var_name: str) -> bool:
         pass
@@ -245,3 +280,15 @@ class FlowParser(ABC):
     @abstractmethod
     def get_by_name(self, name_to_match: str, scope: ET.Element | None = None) -> ET.Element | None:
         pass
+
+    def get_element_facts(self, name: str) -> ElementFacts | None:
+        """Facts about a top level Flow Element (sink influencers, assignments, connectors, etc.)
+        that are extracted once when the flow is parsed.
+
+        Parsers that do not keep a fact table need not override this,
+        callers then extract the facts from the element themselves.
+
+        Returns: None if no facts are recorded for this name
+
+        """
+        return None
@@ -9,7 +9,11 @@ from dataclasses import dataclass, field
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from public.enums import DataType, ReferenceType, Severity
+    import xml.etree.ElementTree as ET
+    from public.enums import ConnType, DataType, ReferenceType, Severity
+
+#: number of DataInfluencePath instances constructed in this process (for statistics)
+_path_count: int = 0
 
 
 @dataclass(frozen=True, eq=True, slots=True)
@@ -257,6 +261,10 @@ class DataInfluencePath:
     # type info about the influenced element
     influenced_type_info: VariableType
 
+    def __post_init__(self):
+        global _path_count
+        _path_count += 1
+
     def report_influence_tuples(self) -> list[(str, str)]:
         """Returns simple chain of variables for high level analysis
 
@@ -370,6 +378,48 @@ class CrawlStep:
         return {s: getattr(self, s) for s in self.__slots__}
 
 
+@dataclass(frozen=True, eq=True, slots=True)
+class ElementFacts:
+    """Facts about a Flow Element that are needed every time it is crawled.
+
+    These are extracted once per flow when the parser is built, so that
+    wiring and queries do not need to search the xml on every visit.
+    Use :meth:`public.contracts.FlowParser.get_element_facts` to retrieve.
+    """
+    # name of the Flow Element ('*' for start elements)
+    element_name: str
+
+    # tag of the Flow Element (without namespace)
+    tag: str
+
+    # (operator, statement) for each assignment item in an <assignments> element
+    assignment_statements: ((str, DataInfluenceStatement),)
+
+    # value of <storeOutputAutomatically>, None if missing
+    is_auto_store: bool | None
+
+    # value of <outputReference>, None if missing
+    output_reference: str | None
+
+    # names of screen input fields (descendants of the element)
+    input_field_names: (str,)
+
+    # (field name, influencer name) from <filters> (record selection criteria)
+    filter_influencers: ((str, str),)
+
+    # (field name, influencer name) from <inputAssignments> (record data)
+    input_influencers: ((str, str),)
+
+    # value of a single <inputReference> child (bulk operations), None otherwise
+    input_reference: str | None
+
+    # statement wiring the collection reference of loops and filter collection processors
+    collection_statement: DataInfluenceStatement | None
+
+    # (connector element, (target name, connector type, is_optional)) for each connector
+    connectors: ((ET.Element, (str, ConnType, bool)),)
+
+
 class InfluenceStatementEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, DataInfluenceStatement):
@@ -386,6 +436,15 @@ class PresetEncoder(json.JSONEncoder):
             return json.JSONEncoder.default(self, obj)
 
 
+def get_path_count() -> int:
+    """Number of DataInfluencePath instances constructed so far
+
+    Returns:
+        running count (take differences to count the paths created by an operation)
+    """
+    return _path_count
+
+
 def _get_end_vars(df: DataInfluencePath) -> (str, str):
     return (_recover_var(df.influencer_name, df.influencer_property),
             _recover_var(df.influenced_name, df.influenced_property))
@@ -4,6 +4,13 @@
 from enum import Enum
 
 
+class QueryAction(Enum):
+    """Events for which query processors are invoked"""
+    process_elem = 0
+    flow_enter = 10
+    scan_exit = 20
+
+
 class FlowType(Enum):
     Screen = 0
     AutoLaunched = 1
@@ -11,11 +11,12 @@ import logging
 if TYPE_CHECKING:
     import xml.etree.ElementTree as ET
 
+from flow_parser.parse import lookup_element_facts
 from public import parse_utils
 from public.data_obj import DataInfluenceStatement, QueryResult
 
 from public.data_obj import QueryDescription, Preset
-from public.enums import Severity
+from public.enums import Severity, QueryAction
 from public.contracts import QueryProcessor, FlowParser, State
 
 logger = logging.getLogger(__name__)
@@ -56,6 +57,13 @@ FlowSecurity.DefaultMode.recordLookups.selector"""
 
 QUERY_IDS = []
 
+#: presets already built, by name. Query instances are reloaded for every flow
+#: and request their preset each time.
+_built_presets: {str: Preset} = {}
+
+#: CRUD elements whose influencers are sinks
+SINK_TAGS: tuple[str, ...] = ('recordUpdates', 'recordLookups', 'recordCreates', 'recordDeletes')
+
 
 def build_preset(preset_name: str = default_preset):
     if preset_name is None:
@@ -64,6 +72,9 @@ def build_preset(preset_name: str = default_preset):
     if preset_name not in presets.keys():
         return None
 
+    if preset_name in _built_presets:
+        return _built_presets[preset_name]
+
     preset = presets[preset_name]
     pr_name = preset['name']
     pr_owner = preset['owner']
@@ -74,9 +85,10 @@ def build_preset(preset_name: str = default_preset):
 
     queries = {build_query_desc_from_id(x) for x in QUERY_IDS}
 
-    return Preset(preset_name=pr_name,
-                  preset_owner=pr_owner,
-                  queries=queries)
+    _built_presets[preset_name] = Preset(preset_name=pr_name,
+                                         preset_owner=pr_owner,
+                                         queries=queries)
+    return _built_presets[preset_name]
 
 
 class DefaultQueryProcessor(QueryProcessor):
@@ -84,6 +96,12 @@ class DefaultQueryProcessor(QueryProcessor):
 
     """
 
+    #: only sinks and flow entrances (for collecting sources) are queried
+    subscribed_actions = frozenset({QueryAction.process_elem, QueryAction.flow_enter})
+
+    #: only CRUD elements can be sinks
+    subscribed_tags = frozenset(SINK_TAGS)
+
     def __init__(self) -> None:
         #: preset selected by user
         self.preset: Preset | None = None
@@ -100,6 +118,17 @@ class DefaultQueryProcessor(QueryProcessor):
         #: path of flow
         self.flow_paths: [str] = None
 
+        #: (flow path, element, field, influencer, query id) --> (number of sources, state fingerprint)
+        #: of the last sink query in the current root flow, so revisits with an unchanged state are skipped.
+        #: The query id carries the effective run mode, which depends on the calling frame.
+        self.sink_memo: {(str, str, str, str, str): (int, tuple)} = {}
+
+        #: sink queries skipped because of the memo
+        self.memo_hits: int = 0
+
+        #: sink queries evaluated
+        self.memo_misses: int = 0
+
     def set_preset_name(self, preset_name: str | None) -> Preset | None:
         self.preset = build_preset(preset_name)
         return self.preset
@@ -115,6 +144,8 @@ class DefaultQueryProcessor(QueryProcessor):
         if self.flow_paths is None:
             self.flow_paths = [flow_path]
             start = True
+            # fingerprints are only comparable within the crawl of one root flow
+            self.sink_memo.clear()
         else:
             start = False
         # always add to the list, so we collect sources in subflows and remember them
@@ -139,6 +170,10 @@ class DefaultQueryProcessor(QueryProcessor):
         # dataflow graph of the entire fully executed program
         return None
 
+    def get_statistics(self) -> {str: int} | None:
+        return {'sink_memo_hits': self.memo_hits,
+                'sink_memo_misses': self.memo_misses}
+
     def process_element(self, elem: ET.Element, state: State) -> list[QueryResult] | None:
         """Looks for CRUD influencers from sources (input fields or input variables)
 
@@ -155,30 +190,24 @@ class DefaultQueryProcessor(QueryProcessor):
                 None
         """
         elem_type = parse_utils.get_tag(elem)
-        filter_influencers = []
-        input_influencers = []
         parser = state.get_parser()
 
         # sinks are define here
-        if elem_type in ["recordUpdates", "recordLookups", "recordCreates", "recordDeletes"]:
+        if elem_type in SINK_TAGS:
+
+            # sink influencers are extracted once per flow by the parser
+            facts = lookup_element_facts(parser, elem, state.get_current_elem_name())
 
             # Look for filter selection criteria (influences *which records* are returned)
-            filter_elems = parse_utils.get_filters(elem)
-            if filter_elems is not None and len(filter_elems) > 0:
-                filter_influencers = parse_utils.get_sinks_from_field_values(filter_elems)
+            filter_influencers = list(facts.filter_influencers)
 
             # Look for input assignment which influences *what values* are updated or created
-            input_assignment_elems = parse_utils.get_input_assignments(elem)
-            if input_assignment_elems is not None and len(input_assignment_elems) > 0:
-                input_influencers = parse_utils.get_sinks_from_field_values(input_assignment_elems)
+            input_influencers = list(facts.input_influencers)
 
             # Look for bulk operators:
-            bulk_ref = parse_utils.get_by_tag(elem, 'inputReference')
-
-            if len(bulk_ref) == 1:
-                bulk_el = bulk_ref[0]
-                bulk_var = bulk_el.text
+            bulk_var = facts.input_reference
 
+            if bulk_var is not None:
                 # for bulk operations, we say the influenced elem is the Flow Element itself.
                 elem_name = state.get_current_elem_name()
 
@@ -222,6 +251,7 @@ class DefaultQueryProcessor(QueryProcessor):
         to_return = []
         flow_path = parser.get_filename()
         run_mode = parser.get_effective_run_mode()
+        curr_name = parse_utils.get_name(current_elem)
 
         for x in filter_influencers + input_influencers:
             if x in filter_influencers:
@@ -236,6 +266,10 @@ class DefaultQueryProcessor(QueryProcessor):
                 continue
 
             a_field, influencer_var = x
+            if self.is_memoized((flow_path, curr_name, a_field, influencer_var, query_id), state):
+                # already reported when the element was last visited in this state
+                continue
+
             # surgery that deals with string or dataInfluencePaths happens in get_tainted_flows()
             tainted_flows = state.get_flows_from_sources(influenced_var=influencer_var,
                                                          source_vars=self.sources)
@@ -247,7 +281,6 @@ class DefaultQueryProcessor(QueryProcessor):
             
                 paths: set[DataInfluencePath]
                 """
-                curr_name = parse_utils.get_name(current_elem)
 
                 # SystemModeWithoutSharing User Influenced Record Update
                 sink_stmt = DataInfluenceStatement(a_field, influencer_var, curr_name,
@@ -274,6 +307,34 @@ class DefaultQueryProcessor(QueryProcessor):
         else:
             return None
 
+    def is_memoized(self, key: (str, str, str, str, str), state: State) -> bool:
+        """Whether the sink query was already answered with the same sources and taint state
+
+        Records the current fingerprint if not.
+
+        Args:
+            key: (flow path, element name, field, influencer variable, query id)
+            state: current state
+
+        Returns:
+            True if the query would return the same results as last time
+        """
+        fingerprint = state.get_fingerprint(key[3])
+        if fingerprint is None:
+            self.memo_misses += 1
+            return False
+
+        prev = self.sink_memo.get(key)
+        if (prev is not None and prev[0] == len(self.sources) and len(prev[1]) == len(fingerprint)
+                and all(a is b for (a, b) in zip(prev[1], fingerprint))):
+            self.memo_hits += 1
+            return True
+
+        # holding on to the vectors also keeps their identities from being reused
+        self.sink_memo[key] = (len(self.sources), fingerprint)
+        self.memo_misses += 1
+        return False
+
 
 def get_sources(parser: FlowParser, start=True) -> ((str, str),):
     """Looks for sources
@@ -303,6 +364,18 @@ def get_sources(parser: FlowParser, start=True) -> ((str, str),):
         return input_field_tuples
 
 
+def get_sink_types(preset: Preset) -> frozenset[str]:
+    """Flow Element types that are sinks for the queries in the preset
+
+    Args:
+        preset: preset built by :func:`build_preset`
+
+    Returns:
+        element tags, e.g. 'recordUpdates'
+    """
+    return frozenset(x.query_id.split(".")[2] for x in preset.queries if x.query_id is not None)
+
+
 def build_query_desc_from_id(query_id: str) -> QueryDescription:
     [run_mode, elem_type, check_val] = query_id.split(".")[1:]
 
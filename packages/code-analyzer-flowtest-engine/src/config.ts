@@ -6,6 +6,8 @@ import {SemVer} from "semver";
 
 const MINIMUM_PYTHON_VERSION = '3.10.0';
 export const PYTHON_COMMAND = 'python_command';
+export const WORKER_COUNT = 'worker_count';
+const DEFAULT_WORKER_COUNT = 1;
 
 export type FlowTestConfig = {
     // Indicates the specific Python command to use for the 'flowtest' engine.
@@ -13,6 +15,11 @@ export type FlowTestConfig = {
     //   Example: '/Library/Frameworks/Python.framework/Versions/3.12/bin/python3'
     // If not defined, or equal to null, then an attempt will be made to automatically discover a Python command from your environment.
     python_command: string;
+
+    // Indicates the number of Python processes used to run the 'flowtest' engine concurrently.
+    // Flows are split between processes so that each flow is scanned together with all of its subflows.
+    // If not defined, or equal to null, then a single process is used.
+    worker_count: number;
 }
 
 export const FLOWTEST_ENGINE_CONFIG_DESCRIPTION: ConfigDescription = {
@@ -22,17 +29,23 @@ export const FLOWTEST_ENGINE_CONFIG_DESCRIPTION: ConfigDescription = {
             descriptionText: getMessage('ConfigFieldDescription_python_command'),
             valueType: "string",
             defaultValue: null // Using null for doc and since it indicates that the value is calculated based on the environment
+        },
+        worker_count: {
+            descriptionText: getMessage('ConfigFieldDescription_worker_count'),
+            valueType: "number",
+            defaultValue: DEFAULT_WORKER_COUNT
         }
     }
 }
 
 export async function validateAndNormalizeConfig(configValueExtractor: ConfigValueExtractor,
                                                  pythonVersionIdentifier: PythonVersionIdentifier): Promise<FlowTestConfig> {
-    configValueExtractor.validateContainsOnlySpecifiedKeys(['python_command']);
+    configValueExtractor.validateContainsOnlySpecifiedKeys([PYTHON_COMMAND, WORKER_COUNT]);
     const valueExtractor: FlowTestEngineConfigValueExtractor = new FlowTestEngineConfigValueExtractor(
         configValueExtractor, pythonVersionIdentifier);
     return {
-        python_command: await valueExtractor.extractPythonCommandPath()
+        python_command: await valueExtractor.extractPythonCommandPath(),
+        worker_count: valueExtractor.extractWorkerCount()
     }
 }
 
@@ -51,6 +64,14 @@ class FlowTestEngineConfigValueExtractor {
             await this.findPythonCommandPathFromEnvironment();
     }
 
+    extractWorkerCount(): number {
+        const workerCount: number = this.delegateExtractor.extractNumber(WORKER_COUNT, DEFAULT_WORKER_COUNT)!;
+        if (workerCount <= 0 || Math.floor(workerCount) != workerCount) {
+            throw new Error(getMessage('InvalidPositiveInteger', this.delegateExtractor.getFieldPath(WORKER_COUNT)));
+        }
+        return workerCount;
+    }
+
     private async validatePythonCommandPath(configSpecifiedPython: string): Promise<string> {
         let version: SemVer|null;
         try {
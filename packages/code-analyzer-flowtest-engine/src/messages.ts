@@ -11,6 +11,13 @@ const MESSAGE_CATALOG: {[key: string]: string} = {
         `May be provided as the name of a command that exists on the path, or an absolute file path location.\n` +
         `If unspecified, or specified as null, then an attempt will be made to automatically discover a Python command from your environment.`,
 
+    ConfigFieldDescription_worker_count:
+        `Indicates the number of Python processes used to run the 'flowtest' engine concurrently.\n` +
+        `Flows are split between processes so that each flow is scanned together with all of its subflows.`,
+
+    InvalidPositiveInteger:
+        `The '%s' configuration value is invalid. The value must be a positive integer.`,
+
     UnsupportedEngineName:
         `The FlowTestEnginePlugin does not support an engine with name '%s'.`,
 
@@ -36,7 +36,9 @@ export class FlowTestEnginePlugin extends EnginePluginV1 {
 
     public async createEngine(engineName: string, resolvedConfig: ConfigObject): Promise<Engine> {
         validateEngineName(engineName);
-        const wrapper: RunTimeFlowTestCommandWrapper = new RunTimeFlowTestCommandWrapper((resolvedConfig as FlowTestConfig).python_command);
+        const flowTestConfig: FlowTestConfig = resolvedConfig as FlowTestConfig;
+        const wrapper: RunTimeFlowTestCommandWrapper = new RunTimeFlowTestCommandWrapper(
+            flowTestConfig.python_command, flowTestConfig.worker_count);
         return new FlowTestEngine(wrapper);
     }
 }
@@ -35,11 +35,45 @@ export type FlowNodeDescriptor = {
 
 const STATUS_DELIMITER = '**STATUS:';
 
+/**
+ * Value of `schema_version` in reports written with `--compact_json`.
+ */
+const COMPACT_SCHEMA_VERSION = 2;
+
+/**
+ * The report written with `--compact_json`. Each statement and xml snippet is stored once, and findings
+ * reference them by index: `flow` holds indices into `statements` and `elem` is an index into `snippets`.
+ */
+type CompactFlowTestExecutionResult = {
+    schema_version: number;
+    snippets: string[];
+    statements: CompactFlowNodeDescriptor[];
+    results: Record<string, CompactFlowTestRuleResult[]>;
+}
+
+type CompactFlowNodeDescriptor = Omit<FlowNodeDescriptor, 'source_text'> & {
+    snippet: number;
+}
+
+type CompactFlowTestRuleResult = Omit<FlowTestRuleResult, 'flow'> & {
+    flow: number[];
+    elem: number;
+}
+
+/**
+ * The plan written by `python -m flowtest plan`. Each shard holds flows together with all of their subflows.
+ */
+type FlowTestPlan = {
+    shards: {manifest: string, cost: number, flows: string[]}[]
+}
+
 export class RunTimeFlowTestCommandWrapper implements FlowTestCommandWrapper {
     private readonly pythonCommandExecutor: PythonCommandExecutor;
+    private readonly workerCount: number;
 
-    public constructor(pythonCommand: string) {
+    public constructor(pythonCommand: string, workerCount: number = 1) {
         this.pythonCommandExecutor = new PythonCommandExecutor(pythonCommand);
+        this.workerCount = workerCount;
     }
 
     public async runFlowTestRules(flowFilesToScan: string[], absLogFilePath: string,
@@ -48,7 +82,48 @@ export class RunTimeFlowTestCommandWrapper implements FlowTestCommandWrapper {
         const flowFilesToScanFile: string = path.join(tempDir, 'flowFilesToScan.txt');
         await fs.promises.writeFile(flowFilesToScanFile, flowFilesToScan.join('\n'), 'utf-8');
 
-        const flowtestResultsFile: string = path.join(tempDir, 'flowtestResultsFile.json')
+        if (this.workerCount <= 1 || flowFilesToScan.length <= 1) {
+            return this.runWorker(flowFilesToScanFile, absLogFilePath, path.join(tempDir, 'flowtestResultsFile.json'),
+                completionPercentageHandler);
+        }
+
+        // Split the flows so that each worker scans whole subflow closures, then run the workers concurrently.
+        const planDir: string = path.join(tempDir, 'plan');
+        await this.pythonCommandExecutor.exec(['-m', 'flowtest', 'plan', '--infile', flowFilesToScanFile,
+            '--shards', `${this.workerCount}`, '--out_dir', planDir]);
+        const plan: FlowTestPlan = JSON.parse(await fs.promises.readFile(path.join(planDir, 'plan.json'), 'utf-8')) as FlowTestPlan;
+
+        const totalFlows: number = plan.shards.reduce((sum, shard) => sum + shard.flows.length, 0);
+        if (totalFlows === 0) {
+            // Nothing to scan, and a worker given an empty manifest would fail
+            return {results: {}};
+        }
+
+        // Overall progress is the average of the workers' progress, weighted by the number of flows each one scans.
+        const workerPercentages: number[] = plan.shards.map(() => 0);
+        const reportCombinedPercentage = (workerIndex: number, percentage: number) => {
+            workerPercentages[workerIndex] = percentage;
+            completionPercentageHandler(plan.shards.reduce(
+                (sum, shard, i) => sum + (workerPercentages[i] * shard.flows.length), 0) / totalFlows);
+        };
+
+        const workerResults: FlowTestExecutionResult[] = await Promise.all(plan.shards.map((shard, i) =>
+            this.runWorker(shard.manifest, toWorkerLogFile(absLogFilePath, i),
+                path.join(tempDir, `flowtestResultsFile-${i}.json`),
+                (percentage: number) => reportCombinedPercentage(i, percentage))));
+
+        // Shards share no flows, so their results can simply be concatenated
+        const results: Record<string, FlowTestRuleResult[]> = {};
+        for (const workerResult of workerResults) {
+            for (const queryId of Object.keys(workerResult.results)) {
+                results[queryId] = [...(results[queryId] ?? []), ...workerResult.results[queryId]];
+            }
+        }
+        return {results};
+    }
+
+    private async runWorker(flowFilesToScanFile: string, absLogFilePath: string, flowtestResultsFile: string,
+                            completionPercentageHandler: (percentage: number) => void): Promise<FlowTestExecutionResult> {
         const pythonArgs: string[] = [
             '-m',
             'flowtest',
@@ -58,7 +133,8 @@ export class RunTimeFlowTestCommandWrapper implements FlowTestCommandWrapper {
             '--infile',
             flowFilesToScanFile,
             '--json',
-            flowtestResultsFile
+            flowtestResultsFile,
+            '--compact_json'
         ];
 
         const processStdout = (stdoutMsg: string) => {
@@ -85,6 +161,10 @@ export class RunTimeFlowTestCommandWrapper implements FlowTestCommandWrapper {
             throw new Error(getMessage('ResultsFileNotValidJson', outputFileContents));
         }
 
+        if (this.isCompactExecutionResults(parsedResults)) {
+            parsedResults = expandCompactExecutionResults(parsedResults);
+        }
+
         if (!this.executionResultsAreValid(parsedResults)) {
             throw new Error(getMessage('CouldNotParseExecutionResults', JSON.stringify(parsedResults)));
         }
@@ -92,6 +172,19 @@ export class RunTimeFlowTestCommandWrapper implements FlowTestCommandWrapper {
         return parsedResults;
     }
 
+    private isCompactExecutionResults(executionResults: object): executionResults is CompactFlowTestExecutionResult {
+        if (!('schema_version' in executionResults) || executionResults.schema_version !== COMPACT_SCHEMA_VERSION) {
+            return false;
+        }
+        if (!('snippets' in executionResults) || !Array.isArray(executionResults.snippets)) {
+            return false;
+        }
+        if (!('statements' in executionResults) || !Array.isArray(executionResults.statements)) {
+            return false;
+        }
+        return 'results' in executionResults && typeof executionResults.results === 'object' && executionResults.results !== null;
+    }
+
     private executionResultsAreValid(executionResults: object): executionResults is FlowTestExecutionResult {
         if (!('results' in executionResults) || typeof executionResults.results !== 'object') {
             return false;
@@ -170,6 +263,55 @@ export class RunTimeFlowTestCommandWrapper implements FlowTestCommandWrapper {
     }
 }
 
+/**
+ * Inlines the statements and snippets referenced by the findings of a compact report.
+ * Throws if a finding or statement references an index that is not in the report.
+ */
+function expandCompactExecutionResults(compactResults: CompactFlowTestExecutionResult): object {
+    const couldNotParse = () => new Error(getMessage('CouldNotParseExecutionResults', JSON.stringify(compactResults)));
+    const isIndexInto = (index: unknown, table: unknown[]): index is number =>
+        Number.isInteger(index) && (index as number) >= 0 && (index as number) < table.length;
+
+    const statements: FlowNodeDescriptor[] = compactResults.statements.map(statement => {
+        const {snippet, ...rest} = statement;
+        if (!isIndexInto(snippet, compactResults.snippets)) {
+            throw couldNotParse();
+        }
+        return {...rest, source_text: compactResults.snippets[snippet]};
+    });
+    const results: Record<string, object[]> = {};
+    for (const queryId of Object.keys(compactResults.results)) {
+        const ruleResults: unknown = compactResults.results[queryId];
+        if (!Array.isArray(ruleResults)) {
+            throw couldNotParse();
+        }
+        results[queryId] = (ruleResults as CompactFlowTestRuleResult[]).map(ruleResult => {
+            if (!Array.isArray(ruleResult.flow) || !ruleResult.flow.every(index => isIndexInto(index, statements))
+                || !isIndexInto(ruleResult.elem, compactResults.snippets)) {
+                throw couldNotParse();
+            }
+            return {
+                ...ruleResult,
+                flow: ruleResult.flow.map(index => statements[index]),
+                elem: compactResults.snippets[ruleResult.elem]
+            };
+        });
+    }
+    return {results};
+}
+
+/**
+ * Each worker needs its own log file, since FlowTest refuses to write to an existing one.
+ * Worker 0 uses the designated log file and the others write next to it.
+ */
+function toWorkerLogFile(absLogFilePath: string, workerIndex: number): string {
+    if (workerIndex === 0) {
+        return absLogFilePath;
+    }
+    const parsed: path.ParsedPath = path.parse(absLogFilePath);
+    return path.join(parsed.dir, `${parsed.name}-worker${workerIndex}${parsed.ext}`);
+}
+
 const tmpDirAsync = promisify((options: tmp.DirOptions, cb: tmp.DirCallback) => tmp.dir(options, cb));
 async function createTempDir() : Promise<string> {
     return tmpDirAsync({keep: false, unsafeCleanup: true});
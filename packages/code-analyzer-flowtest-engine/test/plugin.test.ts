@@ -56,7 +56,25 @@ describe('Tests for the FlowTestEnginePlugin', () => {
         const plugin: EnginePluginV1 = new FlowTestEnginePlugin(new StubPythonVersionIdentifier());
         await expect(callCreateEngineConfig(plugin, {unknownField: 3})).rejects.toThrow(
             getMessageFromCatalog(SHARED_MESSAGE_CATALOG, 'ConfigObjectContainsInvalidKey', 'engines.flowtest', 'unknownField',
-                '["python_command"]'));
+                '["python_command","worker_count"]'));
+    });
+
+    it('When createEngineConfig is called without user provided worker_count, then a single worker is used', async () => {
+        const plugin: EnginePluginV1 = new FlowTestEnginePlugin(new StubPythonVersionIdentifier());
+        const resolvedConfig: ConfigObject = await callCreateEngineConfig(plugin, {});
+        expect(resolvedConfig['worker_count']).toEqual(1);
+    });
+
+    it('When createEngineConfig is called with a valid worker_count, then the value is in the config', async () => {
+        const plugin: EnginePluginV1 = new FlowTestEnginePlugin(new StubPythonVersionIdentifier());
+        const resolvedConfig: ConfigObject = await callCreateEngineConfig(plugin, {worker_count: 4});
+        expect(resolvedConfig['worker_count']).toEqual(4);
+    });
+
+    it.each([0, -2, 1.5])('When createEngineConfig is called with worker_count %s, then an error is thrown', async (workerCount) => {
+        const plugin: EnginePluginV1 = new FlowTestEnginePlugin(new StubPythonVersionIdentifier());
+        await expect(callCreateEngineConfig(plugin, {worker_count: workerCount})).rejects.toThrow(
+            getMessage('InvalidPositiveInteger', 'engines.flowtest.worker_count'));
     });
 
     it('When createEngineConfig is called with user provided python and it is valid, then the command is in the config', async () => {
@@ -102,7 +120,7 @@ describe('Tests for the FlowTestEnginePlugin', () => {
 
     it('When createEngine is called with a valid engine name and config, then a FlowTestEngine is returned', async () => {
         const plugin: EnginePluginV1 = new FlowTestEnginePlugin();
-        const resolvedConfig: ConfigObject = {python_command: 'python3'};
+        const resolvedConfig: ConfigObject = {python_command: 'python3', worker_count: 1};
         const engine: Engine = await plugin.createEngine(FlowTestEngine.NAME, resolvedConfig);
         expect(engine).toBeInstanceOf(FlowTestEngine);
     });
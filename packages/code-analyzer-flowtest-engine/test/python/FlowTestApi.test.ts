@@ -0,0 +1,50 @@
+import path from 'node:path';
+
+import {PythonCommandExecutor} from '../../src/python/PythonCommandExecutor';
+
+const PYTHON_COMMAND = 'python3';
+const PATH_TO_EXECUTABLE_SCRIPTS = path.resolve(__dirname, '..', 'test-data', 'executable-scripts');
+const PATH_TO_MULTIPLE_FLOWS_WORKSPACE = path.resolve(__dirname, '..', 'test-data', 'example workspaces', 'contains-multiple-flows');
+
+type ScanInMemoryOutput = {
+    on_disk: Record<string, string[]>,
+    on_disk_cache_sizes: number[],
+    in_memory: Record<string, string[]>,
+    in_memory_cache_sizes: number[]
+};
+
+describe('flowtest.api', () => {
+    describe('#scan()', () => {
+        const executor: PythonCommandExecutor = new PythonCommandExecutor(PYTHON_COMMAND);
+        let output: ScanInMemoryOutput;
+
+        beforeAll(async () => {
+            const stdoutLines: string[] = [];
+            await executor.exec([path.join(PATH_TO_EXECUTABLE_SCRIPTS, 'scan-in-memory.py'), PATH_TO_MULTIPLE_FLOWS_WORKSPACE],
+                (line: string) => stdoutLines.push(line));
+            // The scan also prints progress to stdout, so the report is the last line
+            output = JSON.parse(stdoutLines[stdoutLines.length - 1]) as ScanInMemoryOutput;
+        });
+
+        it('Scans in-memory contents, resolving subflows among them', () => {
+            expect(Object.keys(output.in_memory).sort()).toEqual([
+                'example1_containsWithoutSharingViolations.flow-meta.xml',
+                'example2_containsWithSharingViolations.flow',
+                'example3_containsNoViolations.flow',
+                'example4_parentFlow.flow-meta.xml',
+                'example4_subflow.flow-meta.xml'
+            ]);
+            expect(output.in_memory['example3_containsNoViolations.flow']).toEqual([]);
+            expect(output.in_memory['example4_parentFlow.flow-meta.xml'].some(finding => finding.includes('example4_subflow.flow-meta.xml'))).toEqual(true);
+        });
+
+        it('Produces the same findings as a scan of the files on disk', () => {
+            expect(output.in_memory).toEqual(output.on_disk);
+        });
+
+        it('Clears the module caches once each scan ends', () => {
+            expect(output.on_disk_cache_sizes).toEqual([0, 0, 0, 0, 0]);
+            expect(output.in_memory_cache_sizes).toEqual([0, 0, 0, 0, 0]);
+        });
+    });
+});
@@ -0,0 +1,406 @@
+import fs from 'node:fs';
+import os from 'node:os';
+import path from 'node:path';
+
+import {PythonCommandExecutor} from '../../src/python/PythonCommandExecutor';
+
+const PYTHON_COMMAND = 'python3';
+const PATH_TO_EXECUTABLE_SCRIPTS = path.resolve(__dirname, '..', 'test-data', 'executable-scripts');
+const PATH_TO_RUN_CLI_SCRIPT = path.join(PATH_TO_EXECUTABLE_SCRIPTS, 'run-flowtest-cli.py');
+const PATH_TO_DEFAULT_QUERY_MODULE = path.resolve(__dirname, '..', '..', 'FlowTest', 'queries', 'default_query.py');
+const PATH_TO_MULTIPLE_FLOWS_WORKSPACE = path.resolve(__dirname, '..', 'test-data', 'example workspaces', 'contains-multiple-flows');
+
+type ReportEntry = {
+    elem_name: string,
+    flow: {flow_path: string}[],
+    counter: number,
+    presets?: string[]
+};
+
+type Report = {
+    preset: string,
+    results: Record<string, ReportEntry[]>
+};
+
+type CliOutput = {
+    returncode: number,
+    stdout: string[],
+    stderr: string[],
+    // files written under {tmp}, by path relative to it (json files are parsed)
+    files: Record<string, unknown>
+};
+
+type FlowStatsRecord = {
+    flow_path: string,
+    skipped: boolean,
+    element_count: number,
+    crawl_steps: number,
+    subflow_invocations: number,
+    findings: number,
+    process_peak_rss: number | null
+};
+
+type TraceEvent = {
+    name: string,
+    cat: string,
+    ph: string,
+    ts: number,
+    dur?: number,
+    pid: number,
+    tid: number,
+    args: Record<string, string>
+};
+
+type Trace = {
+    traceEvents: TraceEvent[],
+    displayTimeUnit: string
+};
+
+type PrefetchedRootFlow = {
+    flow: string,
+    prefetched: string[],
+    matches_disk: boolean
+};
+
+type IRCacheScan = {
+    hits: number,
+    misses: number,
+    xml_parses: number,
+    findings: string[]
+};
+
+type IRCacheOutput = {
+    cold: IRCacheScan,
+    warm: IRCacheScan,
+    tampered: IRCacheScan,
+    rewarmed: IRCacheScan,
+    entries: number,
+    key_created: boolean
+};
+
+type ShardedScanFindings = {
+    preset: string,
+    findings: Record<string, string[]>
+};
+
+type ShardedScanOutput = {
+    shards: number,
+    full: ShardedScanFindings,
+    merged: ShardedScanFindings
+};
+
+async function runCli(args: string[]): Promise<CliOutput> {
+    const stdoutLines: string[] = [];
+    await new PythonCommandExecutor(PYTHON_COMMAND).exec([PATH_TO_RUN_CLI_SCRIPT, ...args],
+        (line: string) => stdoutLines.push(line));
+    return JSON.parse(stdoutLines[stdoutLines.length - 1]) as CliOutput;
+}
+
+function getScannedFlows(output: CliOutput): string[] {
+    return output.stdout.filter(line => line.includes(' scanning '))
+        .map(line => path.basename(line.slice(line.indexOf(' scanning ') + ' scanning '.length).replace(/\.\.\.$/, '')))
+        .sort();
+}
+
+function getFindingsBySinkFlow(report: Report): Record<string, string[]> {
+    const findings: Record<string, string[]> = {};
+    for (const [queryId, entries] of Object.entries(report.results)) {
+        for (const entry of entries) {
+            const sinkFlow: string = path.basename(entry.flow[entry.flow.length - 1].flow_path);
+            // counters are only unique within a report
+            (findings[sinkFlow] ??= []).push(`${queryId}: ${JSON.stringify({...entry, counter: undefined})}`);
+        }
+    }
+    Object.values(findings).forEach(x => x.sort());
+    return findings;
+}
+
+describe('flowtest command line', () => {
+    describe('--with_default', () => {
+        it('Tags each finding with the presets whose queries reported it', async () => {
+            const output: CliOutput = await runCli(['-d', PATH_TO_MULTIPLE_FLOWS_WORKSPACE, '-j', '{tmp}/report.json',
+                '--query_path', PATH_TO_DEFAULT_QUERY_MODULE, '--query_class', 'DefaultQueryProcessor',
+                '--preset', 'all', '--with_default', 'pentest']);
+
+            expect(output.returncode).toEqual(0);
+            const report: Report = output.files['report.json'] as Report;
+            expect(report.preset).toEqual('All + Penetration Testing');
+            const entries: ReportEntry[] = Object.values(report.results).flat();
+            expect(entries.length).toBeGreaterThan(0);
+            for (const entry of entries) {
+                expect(entry.presets).toContain('All');
+            }
+            // The pentest preset has no default mode queries
+            expect(report.results['FlowSecurity.DefaultMode.recordCreates.data'].map(x => x.presets)).toEqual([['All'], ['All']]);
+            expect(report.results['FlowSecurity.SystemModeWithoutSharing.recordUpdates.data'].map(x => x.presets)).toEqual([['All', 'Penetration Testing']]);
+        });
+
+        it('Does not tag the findings of a single preset', async () => {
+            const output: CliOutput = await runCli(['-d', PATH_TO_MULTIPLE_FLOWS_WORKSPACE, '-j', '{tmp}/report.json', '--preset', 'all']);
+
+            expect(output.returncode).toEqual(0);
+            const report: Report = output.files['report.json'] as Report;
+            const entries: ReportEntry[] = Object.values(report.results).flat();
+            expect(entries.length).toBeGreaterThan(0);
+            expect(entries.every(x => x.presets === undefined)).toEqual(true);
+        });
+    });
+
+    describe('plan and merge', () => {
+        it.each([
+            {shards: 1, preset: undefined},
+            {shards: 2, preset: undefined},
+            {shards: 3, preset: 'all'}
+        ])('Merges the reports of $shards shards into the report of a full scan (preset: $preset)', async ({shards, preset}) => {
+            const stdoutLines: string[] = [];
+            const args: string[] = [path.join(PATH_TO_EXECUTABLE_SCRIPTS, 'compare-sharded-scan.py'),
+                PATH_TO_MULTIPLE_FLOWS_WORKSPACE, `${shards}`];
+            if (preset) {
+                args.push(preset);
+            }
+            await new PythonCommandExecutor(PYTHON_COMMAND).exec(args, (line: string) => stdoutLines.push(line));
+            const output: ShardedScanOutput = JSON.parse(stdoutLines[stdoutLines.length - 1]) as ShardedScanOutput;
+
+            expect(output.shards).toEqual(shards);
+            expect(Object.keys(output.full.findings).length).toBeGreaterThan(0);
+            expect(output.merged).toEqual(output.full);
+        });
+    });
+
+    describe('--changed', () => {
+        let tempFolder: string;
+        let fullReport: Report;
+
+        beforeAll(async () => {
+            tempFolder = await fs.promises.mkdtemp(path.join(os.tmpdir(), 'flowtest-changed'));
+            const output: CliOutput = await runCli(['-d', PATH_TO_MULTIPLE_FLOWS_WORKSPACE, '-j', '{tmp}/report.json']);
+            fullReport = output.files['report.json'] as Report;
+        });
+
+        afterAll(async () => {
+            await fs.promises.rm(tempFolder, {recursive: true, force: true});
+        });
+
+        async function runChanged(changedFiles: string[]): Promise<CliOutput> {
+            const changedList: string = path.join(tempFolder, 'changed.txt');
+            await fs.promises.writeFile(changedList, changedFiles.map(x => path.join(PATH_TO_MULTIPLE_FLOWS_WORKSPACE, x)).join('\n'));
+            return runCli(['-d', PATH_TO_MULTIPLE_FLOWS_WORKSPACE, '-j', '{tmp}/report.json', '--changed', changedList]);
+        }
+
+        it('Scans a changed subflow and the flows that call it', async () => {
+            const output: CliOutput = await runChanged(['example4_subflow.flow-meta.xml']);
+
+            expect(output.returncode).toEqual(0);
+            expect(getScannedFlows(output)).toEqual(['example4_parentFlow.flow-meta.xml', 'example4_subflow.flow-meta.xml']);
+            const findings: Record<string, string[]> = getFindingsBySinkFlow(output.files['report.json'] as Report);
+            const fullFindings: Record<string, string[]> = getFindingsBySinkFlow(fullReport);
+            expect(Object.keys(findings).sort()).toEqual(['example4_parentFlow.flow-meta.xml', 'example4_subflow.flow-meta.xml']);
+            expect(findings).toEqual({
+                'example4_parentFlow.flow-meta.xml': fullFindings['example4_parentFlow.flow-meta.xml'],
+                'example4_subflow.flow-meta.xml': fullFindings['example4_subflow.flow-meta.xml']
+            });
+        });
+
+        it('Scans only a changed flow that no flow calls', async () => {
+            const output: CliOutput = await runChanged(['example1_containsWithoutSharingViolations.flow-meta.xml']);
+
+            expect(output.returncode).toEqual(0);
+            expect(getScannedFlows(output)).toEqual(['example1_containsWithoutSharingViolations.flow-meta.xml']);
+            expect(getFindingsBySinkFlow(output.files['report.json'] as Report)).toEqual({
+                'example1_containsWithoutSharingViolations.flow-meta.xml':
+                    getFindingsBySinkFlow(fullReport)['example1_containsWithoutSharingViolations.flow-meta.xml']
+            });
+        });
+    });
+
+    describe('--stats', () => {
+        let output: CliOutput;
+        let records: FlowStatsRecord[];
+
+        beforeAll(async () => {
+            output = await runCli(['-d', PATH_TO_MULTIPLE_FLOWS_WORKSPACE, '-j', '{tmp}/report.json', '--stats', '{tmp}/stats.json']);
+            records = output.files['stats.json'] as FlowStatsRecord[];
+        });
+
+        it('Writes one statistics record per root flow', () => {
+            expect(output.returncode).toEqual(0);
+            const recordsByFlow: Record<string, FlowStatsRecord> = Object.fromEntries(records.map(x => [path.basename(x.flow_path), x]));
+            expect(Object.keys(recordsByFlow).sort()).toEqual(['example1_containsWithoutSharingViolations.flow-meta.xml',
+                'example2_containsWithSharingViolations.flow', 'example3_containsNoViolations.flow',
+                'example4_parentFlow.flow-meta.xml', 'example4_subflow.flow-meta.xml']);
+
+            // example3 has no source, so it is skipped without being parsed
+            expect(recordsByFlow['example3_containsNoViolations.flow'].skipped).toEqual(true);
+            expect(recordsByFlow['example3_containsNoViolations.flow'].crawl_steps).toEqual(0);
+            for (const record of records.filter(x => !x.skipped)) {
+                expect(record.element_count).toBeGreaterThan(0);
+                expect(record.crawl_steps).toBeGreaterThan(0);
+            }
+            expect(recordsByFlow['example4_parentFlow.flow-meta.xml'].subflow_invocations).toEqual(1);
+        });
+
+        it('Counts each finding in the root flow that first reported it', () => {
+            const report: Report = output.files['report.json'] as Report;
+            expect(records.reduce((total, x) => total + x.findings, 0)).toEqual(Object.values(report.results).flat().length);
+        });
+
+        it('Records the high-water mark of the process memory, which never decreases', () => {
+            const peaks: (number | null)[] = records.map(x => x.process_peak_rss);
+            if (process.platform !== 'win32') {
+                expect(peaks.every(x => x !== null && x > 0)).toEqual(true);
+                expect(peaks).toEqual([...peaks].sort((a, b) => (a as number) - (b as number)));
+            }
+        });
+    });
+
+    describe('--trace', () => {
+        let output: CliOutput;
+        let events: TraceEvent[];
+
+        beforeAll(async () => {
+            output = await runCli(['-d', PATH_TO_MULTIPLE_FLOWS_WORKSPACE, '-j', '{tmp}/report.json', '--trace', '{tmp}/trace.json']);
+            events = (output.files['trace.json'] as Trace).traceEvents;
+        });
+
+        function getEvents(category: string): TraceEvent[] {
+            return events.filter(x => x.cat === category);
+        }
+
+        it('Writes complete and instant events in the Chrome trace event format', () => {
+            expect(output.returncode).toEqual(0);
+            expect((output.files['trace.json'] as Trace).displayTimeUnit).toEqual('ms');
+            expect(events.length).toBeGreaterThan(0);
+            for (const event of events) {
+                expect(['X', 'i']).toContain(event.ph);
+                expect(event.ts).toBeGreaterThanOrEqual(0);
+                expect(typeof event.pid).toEqual('number');
+                expect(typeof event.tid).toEqual('number');
+                if (event.ph === 'X') {
+                    expect(event.dur).toBeGreaterThanOrEqual(0);
+                }
+            }
+        });
+
+        it('Marks the start and end of each root flow', () => {
+            const flowNames: string[] = ['example1_containsWithoutSharingViolations.flow-meta.xml',
+                'example2_containsWithSharingViolations.flow', 'example3_containsNoViolations.flow',
+                'example4_parentFlow.flow-meta.xml', 'example4_subflow.flow-meta.xml'];
+            expect(getEvents('flow_start').map(x => path.basename(x.args['flow_path'])).sort()).toEqual(flowNames);
+            expect(getEvents('flow_end').map(x => path.basename(x.args['flow_path'])).sort()).toEqual(flowNames);
+
+            const skipped: TraceEvent[] = getEvents('flow_end').filter(x => x.args['skipped'] === 'True');
+            expect(skipped.map(x => path.basename(x.args['flow_path']))).toEqual(['example3_containsNoViolations.flow']);
+            expect(getEvents('crawl_step').some(x => path.basename(x.args['flow_path']) === 'example3_containsNoViolations.flow')).toEqual(false);
+        });
+
+        it('Nests the frame of a subflow within the frame of its caller', () => {
+            const spawns: TraceEvent[] = getEvents('subflow_spawn');
+            expect(spawns.map(x => [path.basename(x.name), x.args['element']])).toEqual([['example4_subflow.flow-meta.xml', 'call_subflow']]);
+            const pushes: TraceEvent[] = getEvents('frame_push');
+            expect(pushes.map(x => [path.basename(x.args['flow_path']), x.args['depth']])).toEqual([['example4_subflow.flow-meta.xml', '1']]);
+
+            // frames are reported when they are popped, spanning from their creation
+            const frame: TraceEvent = getEvents('frame_pop').find(x => x.args['depth'] === '1') as TraceEvent;
+            const callerFrame: TraceEvent = getEvents('frame_pop').find(x => x.args['depth'] === '0'
+                && path.basename(x.args['flow_path']) === 'example4_parentFlow.flow-meta.xml') as TraceEvent;
+            expect(path.basename(frame.args['flow_path'])).toEqual('example4_subflow.flow-meta.xml');
+            expect(frame.ts).toBeGreaterThanOrEqual(spawns[0].ts);
+            expect(frame.ts).toBeLessThanOrEqual(spawns[0].ts + (spawns[0].dur as number));
+            expect(pushes[0].ts).toBeGreaterThanOrEqual(frame.ts);
+            expect(pushes[0].ts).toBeLessThanOrEqual(frame.ts + (frame.dur as number));
+            expect(frame.ts).toBeGreaterThanOrEqual(callerFrame.ts);
+            expect(frame.ts + (frame.dur as number)).toBeLessThanOrEqual(callerFrame.ts + (callerFrame.dur as number));
+        });
+
+        it('Times the report writers', () => {
+            expect(getEvents('report_write').map(x => x.name)).toEqual(['json']);
+        });
+    });
+
+    describe('--prefetch', () => {
+        let defaultReport: Report;
+
+        beforeAll(async () => {
+            const output: CliOutput = await runCli(['-d', PATH_TO_MULTIPLE_FLOWS_WORKSPACE, '-j', '{tmp}/report.json']);
+            defaultReport = output.files['report.json'] as Report;
+        });
+
+        it.each([
+            {depth: 0},
+            {depth: 1},
+            {depth: 5}
+        ])('Reports the same findings when reading $depth flows ahead', async ({depth}) => {
+            const output: CliOutput = await runCli(['-d', PATH_TO_MULTIPLE_FLOWS_WORKSPACE, '-j', '{tmp}/report.json',
+                '--prefetch', `${depth}`]);
+
+            expect(output.returncode).toEqual(0);
+            const findings: Record<string, string[]> = getFindingsBySinkFlow(output.files['report.json'] as Report);
+            expect(Object.keys(findings).length).toBeGreaterThan(0);
+            expect(findings).toEqual(getFindingsBySinkFlow(defaultReport));
+        });
+
+        it.each([
+            {depth: 1},
+            {depth: 2}
+        ])('Reads each root flow and the subflows it calls ahead (depth: $depth)', async ({depth}) => {
+            const stdoutLines: string[] = [];
+            await new PythonCommandExecutor(PYTHON_COMMAND).exec([path.join(PATH_TO_EXECUTABLE_SCRIPTS, 'check-prefetch.py'),
+                PATH_TO_MULTIPLE_FLOWS_WORKSPACE, `${depth}`], (line: string) => stdoutLines.push(line));
+            const output: PrefetchedRootFlow[] = JSON.parse(stdoutLines[stdoutLines.length - 1]) as PrefetchedRootFlow[];
+
+            expect(output.map(x => x.flow)).toEqual(['example1_containsWithoutSharingViolations.flow-meta.xml',
+                'example2_containsWithSharingViolations.flow', 'example3_containsNoViolations.flow',
+                'example4_parentFlow.flow-meta.xml', 'example4_subflow.flow-meta.xml']);
+            for (const rootFlow of output) {
+                expect(rootFlow.prefetched).toContain(rootFlow.flow);
+                expect(rootFlow.matches_disk).toEqual(true);
+            }
+            expect(output[3].prefetched).toEqual(['example4_parentFlow.flow-meta.xml', 'example4_subflow.flow-meta.xml']);
+        });
+
+        it('Reads nothing ahead when prefetching is disabled', async () => {
+            const stdoutLines: string[] = [];
+            await new PythonCommandExecutor(PYTHON_COMMAND).exec([path.join(PATH_TO_EXECUTABLE_SCRIPTS, 'check-prefetch.py'),
+                PATH_TO_MULTIPLE_FLOWS_WORKSPACE, '0'], (line: string) => stdoutLines.push(line));
+            const output: PrefetchedRootFlow[] = JSON.parse(stdoutLines[stdoutLines.length - 1]) as PrefetchedRootFlow[];
+
+            expect(output.length).toEqual(5);
+            expect(output.every(x => x.prefetched.length === 0)).toEqual(true);
+        });
+    });
+
+    describe('--ir_cache', () => {
+        let output: IRCacheOutput;
+
+        beforeAll(async () => {
+            const stdoutLines: string[] = [];
+            await new PythonCommandExecutor(PYTHON_COMMAND).exec([path.join(PATH_TO_EXECUTABLE_SCRIPTS, 'check-ir-cache.py'),
+                PATH_TO_MULTIPLE_FLOWS_WORKSPACE], (line: string) => stdoutLines.push(line));
+            output = JSON.parse(stdoutLines[stdoutLines.length - 1]) as IRCacheOutput;
+        });
+
+        it('Stores one signed entry per parsed flow on a cold run', () => {
+            expect(output.key_created).toEqual(true);
+            expect(output.cold.xml_parses).toEqual(output.entries);
+            expect(output.cold.misses).toEqual(output.entries);
+            expect(output.cold.findings.length).toBeGreaterThan(0);
+        });
+
+        it('Does not parse the xml of unchanged flows on a warm run', () => {
+            expect(output.warm.xml_parses).toEqual(0);
+            expect(output.warm.misses).toEqual(0);
+            expect(output.warm.hits).toBeGreaterThanOrEqual(output.entries);
+            expect(output.warm.findings).toEqual(output.cold.findings);
+        });
+
+        it('Discards a tampered entry and parses its flow again', () => {
+            expect(output.tampered.misses).toEqual(1);
+            expect(output.tampered.xml_parses).toEqual(1);
+            expect(output.tampered.hits).toEqual(output.warm.hits - 1);
+            expect(output.tampered.findings).toEqual(output.cold.findings);
+            // the entry is written again, so the next run is warm
+            expect(output.rewarmed.xml_parses).toEqual(0);
+            expect(output.rewarmed.misses).toEqual(0);
+        });
+    });
+});
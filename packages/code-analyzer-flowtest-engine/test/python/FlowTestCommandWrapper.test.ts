@@ -79,6 +79,121 @@ describe('FlowTestCommandWrapper implementations', () => {
                 });
             });
 
+            describe('Successful execution with multiple workers', () => {
+                it('Produces the same results as a single worker and combines progress', async () => {
+                    const tempFolder: string = await fs.promises.mkdtemp(path.join(os.tmpdir(), 'engine-test'));
+                    const completionPercentages: number[] = [];
+                    const singleResults: FlowTestExecutionResult = await new RunTimeFlowTestCommandWrapper(PYTHON_COMMAND)
+                        .runFlowTestRules([PATH_TO_EXAMPLE1, PATH_TO_EXAMPLE2], path.join(tempFolder, 'single.log'), (_num: number) => {});
+                    const multiResults: FlowTestExecutionResult = await new RunTimeFlowTestCommandWrapper(PYTHON_COMMAND, 2)
+                        .runFlowTestRules([PATH_TO_EXAMPLE1, PATH_TO_EXAMPLE2], path.join(tempFolder, 'multi.log'),
+                            (num: number) => completionPercentages.push(num));
+
+                    expect(toSortedResults(multiResults)).toEqual(toSortedResults(singleResults));
+                    // Each worker scans one flow, so each only reports that it is starting
+                    expect(completionPercentages).toEqual([0, 0]);
+                    expect((await fs.promises.readdir(tempFolder)).sort()).toEqual(['multi-worker1.log', 'multi.log', 'single.log']);
+                });
+            });
+
+            describe('Progress of multiple workers', () => {
+                afterEach(() => {
+                    jest.restoreAllMocks();
+                });
+
+                /**
+                 * Stubs the plan command to write a plan with shards of the given sizes, and each worker to report the
+                 * status of every flow it scans (as FlowTest does before scanning each one) and write empty results.
+                 */
+                function stubWorkers(shardSizes: number[]): void {
+                    jest.spyOn(PythonCommandExecutor.prototype, 'exec').mockImplementation(async (args, processStdout) => {
+                        if (args[2] === 'plan') {
+                            const planDir: string = args[args.indexOf('--out_dir') + 1];
+                            await fs.promises.mkdir(planDir, {recursive: true});
+                            const shards = shardSizes.map((size, i) => ({
+                                manifest: path.join(planDir, `shard_${i}.txt`),
+                                cost: size,
+                                flows: Array.from({length: size}, (_v, j) => `flow_${i}_${j}.flow-meta.xml`)
+                            }));
+                            await fs.promises.writeFile(path.join(planDir, 'plan.json'), JSON.stringify({shards}), 'utf-8');
+                            return;
+                        }
+                        const shardIndex: number = parseInt(path.basename(args[args.indexOf('--infile') + 1]).replace(/\D/g, ''));
+                        const size: number = shardSizes[shardIndex];
+                        for (let j = 0; j < size; j++) {
+                            processStdout?.(`**STATUS:${Math.round(1000 * j / size) / 10}% flows scanned** `);
+                        }
+                        await fs.promises.writeFile(args[args.indexOf('--json') + 1], '{"results": {}}', 'utf-8');
+                    });
+                }
+
+                it('Combines the progress of the workers, weighted by the number of flows each one scans', async () => {
+                    stubWorkers([1, 4]);
+                    const completionPercentages: number[] = [];
+
+                    const results: FlowTestExecutionResult = await new RunTimeFlowTestCommandWrapper(PYTHON_COMMAND, 2)
+                        .runFlowTestRules([PATH_TO_EXAMPLE1, PATH_TO_EXAMPLE2], tempLogFile,
+                            (num: number) => completionPercentages.push(num));
+
+                    expect(results.results).toEqual({});
+                    // Worker 0 scans 1 of the 5 flows and worker 1 scans the other 4
+                    expect(completionPercentages).toEqual([0, 0, 20, 40, 60]);
+                });
+
+                it('Returns no results without running workers when the plan holds no flows', async () => {
+                    stubWorkers([0, 0]);
+                    const completionPercentages: number[] = [];
+
+                    const results: FlowTestExecutionResult = await new RunTimeFlowTestCommandWrapper(PYTHON_COMMAND, 2)
+                        .runFlowTestRules([PATH_TO_EXAMPLE1, PATH_TO_EXAMPLE2], tempLogFile,
+                            (num: number) => completionPercentages.push(num));
+
+                    expect(results.results).toEqual({});
+                    expect(completionPercentages).toEqual([]);
+                    // Only the plan command was run
+                    expect(PythonCommandExecutor.prototype.exec).toHaveBeenCalledTimes(1);
+                });
+            });
+
+            describe('Compact results', () => {
+                afterEach(() => {
+                    jest.restoreAllMocks();
+                });
+
+                it('Inlines the statements and snippets referenced by findings', async () => {
+                    const statement = {influenced_var: 'x', influencer_var: 'y', element_name: 'assign_x',
+                        comment: 'assignment', flow_path: 'Foo.flow-meta.xml', line_no: 12};
+                    const compactResults = {
+                        schema_version: 2,
+                        snippets: ['<assignments/>', '<recordUpdates/>'],
+                        statements: [{...statement, snippet: 0}],
+                        results: {
+                            'Flow: SystemModeWithoutSharing recordUpdates data': [{
+                                flow: [0, 0], query_name: 'name', severity: 'Flow_High_Severity', description: 'desc',
+                                counter: 0, elem: 1, elem_name: 'update_foo', field: 'x'
+                            }]
+                        }
+                    };
+                    jest.spyOn(PythonCommandExecutor.prototype, 'exec').mockImplementation(async (_args, _processStdout) => {
+                        return Promise.resolve();
+                    });
+                    jest.spyOn(fs.promises, 'readFile').mockImplementation(async (_file) => {
+                        return JSON.stringify(compactResults);
+                    });
+
+                    const wrapper: RunTimeFlowTestCommandWrapper = new RunTimeFlowTestCommandWrapper(PYTHON_COMMAND);
+                    const results: FlowTestExecutionResult = await wrapper.runFlowTestRules([PATH_TO_EXAMPLE1], tempLogFile, (_num: number) => {});
+
+                    const expandedStatement = {...statement, source_text: '<assignments/>'};
+                    expect(results.results).toEqual({
+                        'Flow: SystemModeWithoutSharing recordUpdates data': [{
+                            flow: [expandedStatement, expandedStatement], query_name: 'name', severity: 'Flow_High_Severity',
+                            description: 'desc', counter: 0, elem: '<recordUpdates/>', elem_name: 'update_foo', field: 'x'
+                        }]
+                    });
+                });
+            });
+
             describe('Failure Modes', () => {
                 afterEach(() => {
                     jest.restoreAllMocks();
@@ -86,7 +201,30 @@ describe('FlowTestCommandWrapper implementations', () => {
 
                 it.each([
                     {problem: 'an unparseable JSON', fakeResults: '{asdfasdfe,;]eawe}', expectedMessage: 'Results file contents are not a valid JSON'},
-                    {problem: 'a malformed JSON', fakeResults: '{"undesiredProperty": "beep"}', expectedMessage: 'Could not parse results from '}
+                    {problem: 'a malformed JSON', fakeResults: '{"undesiredProperty": "beep"}', expectedMessage: 'Could not parse results from '},
+                    {
+                        problem: 'a compact JSON referencing a missing statement',
+                        fakeResults: '{"schema_version": 2, "snippets": ["<a/>"], "statements": [], "results": {"q": [{"flow": [0], '
+                            + '"query_name": "n", "severity": "s", "description": "d", "elem": 0, "elem_name": "e", "field": "f"}]}}',
+                        expectedMessage: 'Could not parse results from '
+                    },
+                    {
+                        problem: 'a compact JSON referencing a missing element snippet',
+                        fakeResults: '{"schema_version": 2, "snippets": ["<a/>"], "statements": [], "results": {"q": [{"flow": [], '
+                            + '"query_name": "n", "severity": "s", "description": "d", "elem": 1, "elem_name": "e", "field": "f"}]}}',
+                        expectedMessage: 'Could not parse results from '
+                    },
+                    {
+                        problem: 'a compact JSON with a statement referencing a missing snippet',
+                        fakeResults: '{"schema_version": 2, "snippets": [], "statements": [{"influenced_var": "x", "snippet": 0}], '
+                            + '"results": {}}',
+                        expectedMessage: 'Could not parse results from '
+                    },
+                    {
+                        problem: 'a compact JSON whose findings are not a list',
+                        fakeResults: '{"schema_version": 2, "snippets": [], "statements": [], "results": {"q": {"flow": []}}}',
+                        expectedMessage: 'Could not parse results from '
+                    }
                 ])('When execution produces $problem, an informative error is thrown', async ({fakeResults, expectedMessage}) => {
                     // Stub out the underlying Exec method to fake a success without actually invoking FlowTest, since
                     // we don't care about the actual results.
@@ -107,4 +245,15 @@ describe('FlowTestCommandWrapper implementations', () => {
             });
         });
     });
-});
\ No newline at end of file
+});
+
+function toSortedResults(executionResult: FlowTestExecutionResult): Record<string, string[]> {
+    const sorted: Record<string, string[]> = {};
+    for (const queryName of Object.keys(executionResult.results)) {
+        // The `counter` property depends on the order in which results were produced, so ignore it.
+        sorted[queryName] = executionResult.results[queryName]
+            .map(result => JSON.stringify({...result, counter: undefined}))
+            .sort();
+    }
+    return sorted;
+}
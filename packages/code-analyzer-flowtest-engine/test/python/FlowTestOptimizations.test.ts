@@ -0,0 +1,134 @@
+import path from 'node:path';
+
+import {PythonCommandExecutor} from '../../src/python/PythonCommandExecutor';
+
+const PYTHON_COMMAND = 'python3';
+const PATH_TO_COMPARE_SCRIPT = path.resolve(__dirname, '..', 'test-data', 'executable-scripts', 'compare-executor-option.py');
+const PATH_TO_CACHES_SCRIPT = path.resolve(__dirname, '..', 'test-data', 'executable-scripts', 'check-root-flow-caches.py');
+const PATH_TO_WORKSPACES = path.resolve(__dirname, '..', 'test-data', 'example workspaces');
+
+type ScanOutput = {
+    findings: string[],
+    skipped_flows: string[],
+    crawl_steps: number,
+    pruned_steps: number,
+    paths_created: number
+};
+
+type ComparisonOutput = {
+    on: ScanOutput,
+    off: ScanOutput
+};
+
+type CacheSizes = {
+    formula_maps: number,
+    parsed_expressions: number,
+    origins: number
+};
+
+type RootFlowCaches = {
+    flow: string,
+    in_sequence: CacheSizes,
+    alone: CacheSizes
+};
+
+type CachesOutput = {
+    root_flows: RootFlowCaches[],
+    origin_masks: {calls: number, cached: number, stale: number}
+};
+
+async function compareExecutorOption(option: string, workspace: string, preset?: string): Promise<ComparisonOutput> {
+    const stdoutLines: string[] = [];
+    const args: string[] = [PATH_TO_COMPARE_SCRIPT, option, path.join(PATH_TO_WORKSPACES, workspace)];
+    if (preset) {
+        args.push(preset);
+    }
+    await new PythonCommandExecutor(PYTHON_COMMAND).exec(args, (line: string) => stdoutLines.push(line));
+    // The scan also prints progress to stdout, so the comparison is the last line
+    return JSON.parse(stdoutLines[stdoutLines.length - 1]) as ComparisonOutput;
+}
+
+describe('FlowTest crawl optimizations', () => {
+    describe('SKIP_UNREACHABLE', () => {
+        it('Skips the crawl of a flow whose sink no source can reach without changing the findings', async () => {
+            const output: ComparisonOutput = await compareExecutorOption('SKIP_UNREACHABLE', 'contains-unreachable-sink');
+
+            // the screen input of unreachable_sink never flows into its record update
+            expect(output.on.skipped_flows).toEqual(['unreachable_sink.flow-meta.xml']);
+            expect(output.off.skipped_flows).toEqual([]);
+            expect(output.on.findings.length).toBeGreaterThan(0);
+            expect(output.on.findings).toEqual(output.off.findings);
+            expect(output.on.crawl_steps).toBeLessThan(output.off.crawl_steps);
+        });
+
+        it('Crawls every flow in which a source can reach a sink', async () => {
+            const output: ComparisonOutput = await compareExecutorOption('SKIP_UNREACHABLE', 'contains-loops-and-decisions');
+
+            expect(output.on.skipped_flows).toEqual([]);
+            expect(output.on.findings).toEqual(output.off.findings);
+        });
+    });
+
+    describe('SLICE_WIRING', () => {
+        it.each([
+            {workspace: 'contains-multiple-flows', preset: undefined},
+            {workspace: 'contains-multiple-flows', preset: 'all'},
+            {workspace: 'contains-loops-and-decisions', preset: undefined}
+        ])('Does not change the findings of $workspace (preset: $preset)', async ({workspace, preset}) => {
+            const output: ComparisonOutput = await compareExecutorOption('SLICE_WIRING', workspace, preset);
+
+            expect(output.on.findings.length).toBeGreaterThan(0);
+            expect(output.on.findings).toEqual(output.off.findings);
+            expect(output.on.paths_created).toBeLessThanOrEqual(output.off.paths_created);
+        });
+    });
+
+    describe('PRUNE_EQUIVALENT_VISITS', () => {
+        it.each([
+            {preset: undefined},
+            {preset: 'all'}
+        ])('Skips repeated visits of loops and decisions without changing the findings (preset: $preset)', async ({preset}) => {
+            const output: ComparisonOutput = await compareExecutorOption('PRUNE_EQUIVALENT_VISITS', 'contains-loops-and-decisions', preset);
+
+            expect(output.on.findings.length).toBeGreaterThan(0);
+            expect(output.on.findings).toEqual(output.off.findings);
+            expect(output.on.pruned_steps).toBeGreaterThan(0);
+            expect(output.off.pruned_steps).toEqual(0);
+        });
+
+        it('Does not change the findings of flows with subflows', async () => {
+            const output: ComparisonOutput = await compareExecutorOption('PRUNE_EQUIVALENT_VISITS', 'contains-multiple-flows', 'all');
+
+            expect(output.on.findings).toEqual(output.off.findings);
+            // no visit is pruned here, and each setting is scanned in a fresh interpreter, so the counters match
+            expect(output.on.pruned_steps).toEqual(0);
+            expect(output.on.paths_created).toEqual(output.off.paths_created);
+        });
+    });
+
+    describe('Root flow caches', () => {
+        let output: CachesOutput;
+
+        beforeAll(async () => {
+            const stdoutLines: string[] = [];
+            await new PythonCommandExecutor(PYTHON_COMMAND).exec([PATH_TO_CACHES_SCRIPT,
+                path.join(PATH_TO_WORKSPACES, 'contains-multiple-flows')], (line: string) => stdoutLines.push(line));
+            output = JSON.parse(stdoutLines[stdoutLines.length - 1]) as CachesOutput;
+        });
+
+        it('Keeps only the entries and origins of the current root flow', () => {
+            expect(output.root_flows.length).toEqual(5);
+            expect(output.root_flows.some(x => x.in_sequence.formula_maps > 0)).toEqual(true);
+            expect(output.root_flows.some(x => x.in_sequence.origins > 0)).toEqual(true);
+            for (const rootFlow of output.root_flows) {
+                expect(rootFlow.in_sequence).toEqual(rootFlow.alone);
+            }
+        });
+
+        it('Reuses the origin mask of a vector until origins are registered or cleared', () => {
+            expect(output.origin_masks.cached).toBeGreaterThan(0);
+            expect(output.origin_masks.cached).toBeLessThan(output.origin_masks.calls);
+            expect(output.origin_masks.stale).toEqual(0);
+        });
+    });
+});
@@ -0,0 +1,130 @@
+import path from 'node:path';
+
+import {PythonCommandExecutor} from '../../src/python/PythonCommandExecutor';
+
+const PYTHON_COMMAND = 'python3';
+const PATH_TO_EXECUTABLE_SCRIPTS = path.resolve(__dirname, '..', 'test-data', 'executable-scripts');
+const PATH_TO_WORKSPACES = path.resolve(__dirname, '..', 'test-data', 'example workspaces');
+
+type Replay = {
+    merged: string[],
+    reference: string[],
+    changed_mismatches: unknown[]
+};
+
+type MergeComparisonOutput = {
+    batch_count: number,
+    result_count: number,
+    path_count: number,
+    in_order: Replay,
+    reversed: Replay,
+    twice: Replay,
+    split: Replay,
+    dealt: Replay
+};
+
+type SqliteSnapshot = {
+    flow: string,
+    findings: number,
+    paths: number,
+    scanned_flows: number,
+    expected_findings: number,
+    expected_paths: number
+};
+
+type ChangedFindingRow = {
+    flow: string,
+    flow_findings: number,
+    findings: number,
+    paths: number,
+    path_statements: number,
+    expected_path_statements: number
+};
+
+type SqliteCheckOutput = {
+    tables: string[],
+    metadata: Record<string, string>,
+    snapshots: SqliteSnapshot[],
+    db_findings: string[],
+    report_findings: string[],
+    changed_finding: ChangedFindingRow[]
+};
+
+async function runScript(script: string, args: string[]): Promise<unknown> {
+    const stdoutLines: string[] = [];
+    await new PythonCommandExecutor(PYTHON_COMMAND).exec([path.join(PATH_TO_EXECUTABLE_SCRIPTS, script), ...args],
+        (line: string) => stdoutLines.push(line));
+    // The scan also prints progress to stdout, so the output is the last line
+    return JSON.parse(stdoutLines[stdoutLines.length - 1]);
+}
+
+describe('FlowTest results', () => {
+    describe('ResultsProcessor.add_results', () => {
+        it.each([
+            {workspace: 'contains-multiple-flows'},
+            {workspace: 'contains-loops-and-decisions'}
+        ])('Merges the results of $workspace as the previous merge did', async ({workspace}) => {
+            const output: MergeComparisonOutput = await runScript('compare-result-merge.py',
+                [path.join(PATH_TO_WORKSPACES, workspace)]) as MergeComparisonOutput;
+
+            expect(output.result_count).toBeGreaterThan(0);
+            for (const replay of [output.in_order, output.reversed, output.twice, output.split, output.dealt]) {
+                expect(replay.merged.length).toBeGreaterThan(0);
+                expect(replay.merged).toEqual(replay.reference);
+                expect(replay.changed_mismatches).toEqual([]);
+            }
+        });
+
+        it('Accumulates the paths of a finding reported in several batches', async () => {
+            const output: MergeComparisonOutput = await runScript('compare-result-merge.py',
+                [path.join(PATH_TO_WORKSPACES, 'contains-multiple-flows')]) as MergeComparisonOutput;
+
+            // dealing the paths out among the findings gives findings with several paths
+            expect(output.twice.merged).toEqual(output.in_order.merged);
+            expect(output.split.merged.length).toEqual(output.in_order.merged.length);
+            expect(output.dealt.merged.some(x => x.includes(' | '))).toEqual(true);
+        });
+    });
+
+    describe('SqliteExporter', () => {
+        let output: SqliteCheckOutput;
+
+        beforeAll(async () => {
+            output = await runScript('check-sqlite-export.py',
+                [path.join(PATH_TO_WORKSPACES, 'contains-multiple-flows')]) as SqliteCheckOutput;
+        });
+
+        it('Creates the normalized tables and records the scan', () => {
+            expect(output.tables).toEqual(['findings', 'flows', 'metadata', 'path_statements', 'paths', 'queries',
+                'snippets', 'statements']);
+            expect(output.metadata['preset']).toEqual('All');
+            expect(Object.keys(output.metadata).sort()).toEqual(['flowtest_version', 'preset', 'scan_end', 'scan_start']);
+        });
+
+        it('Writes the findings of each flow as soon as the flow is scanned', () => {
+            expect(output.snapshots.length).toEqual(5);
+            output.snapshots.forEach((snapshot: SqliteSnapshot, index: number) => {
+                expect(snapshot.scanned_flows).toEqual(index + 1);
+                expect(snapshot.findings).toEqual(snapshot.expected_findings);
+                expect(snapshot.paths).toEqual(snapshot.expected_paths);
+            });
+            expect(output.snapshots[0].findings).toBeGreaterThan(0);
+        });
+
+        it('Stores the same findings and paths as the json report', () => {
+            expect(output.db_findings.length).toBeGreaterThan(0);
+            expect(output.db_findings).toEqual(output.report_findings);
+        });
+
+        it('Replaces the paths of a finding that gains paths in a later flow', () => {
+            expect(output.changed_finding.map(x => [x.flow_findings, x.findings, x.paths])).toEqual([
+                [1, 1, 1],
+                [0, 1, 2],
+                [0, 1, 2]
+            ]);
+            for (const row of output.changed_finding) {
+                expect(row.path_statements).toEqual(row.expected_path_statements);
+            }
+        });
+    });
+});
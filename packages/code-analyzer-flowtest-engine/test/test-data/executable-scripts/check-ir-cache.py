@@ -0,0 +1,78 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Scans a workspace with --ir_cache four times, each in a fresh interpreter sharing the cache directory
+# and signing key (kept in a temporary home directory): cold, warm, after one byte of one cache entry
+# was changed, and warm again. Prints (as the last line of stdout) the cache hits and misses, the number
+# of flows whose xml was parsed and the findings of each scan.
+
+
+def run_scan(workspace, cache_dir, report_path):
+    # counts the xml parses of one scan, which prints its counters as its last line of stdout
+    import flowtest.__main__ as cli
+    import flowtest.ir_cache as ir_cache
+    import public.custom_parser as custom_parser
+
+    counters = {'xml_parses': 0}
+    get_root_from_string = custom_parser.get_root_from_string
+
+    def counting_get_root_from_string(byte_str):
+        # the json report is also converted from xml, so only the parses of the flow parser are counted
+        if sys._getframe(1).f_globals['__name__'] == 'flow_parser.parse':
+            counters['xml_parses'] += 1
+        return get_root_from_string(byte_str)
+
+    enable = ir_cache.enable
+
+    def recording_enable(directory):
+        counters['cache'] = enable(directory)
+        return counters['cache']
+
+    custom_parser.get_root_from_string = counting_get_root_from_string
+    ir_cache.enable = recording_enable
+    cli.main(['flowtest', '--no_log', '-d', workspace, '-j', report_path, '--ir_cache', cache_dir])
+    print(json.dumps({'hits': counters['cache'].hits, 'misses': counters['cache'].misses,
+                      'xml_parses': counters['xml_parses']}))
+
+
+def get_findings(report_path):
+    with open(report_path) as fp:
+        report = json.load(fp)
+    # counters are only unique within a report
+    return sorted(f'{query_id}: {json.dumps(dict(x, counter=None), sort_keys=True)}'
+                  for (query_id, entries) in report['results'].items() for x in entries)
+
+
+def scan(workspace, tmp, name):
+    report_path = os.path.join(tmp, f'{name}.json')
+    # the signing key is created in the home directory
+    env = dict(os.environ, HOME=os.path.join(tmp, 'home'), USERPROFILE=os.path.join(tmp, 'home'))
+    completed = subprocess.run([sys.executable, __file__, '--run', workspace, os.path.join(tmp, 'cache'), report_path],
+                               check=True, capture_output=True, text=True, env=env)
+    return dict(json.loads(completed.stdout.splitlines()[-1]), findings=get_findings(report_path))
+
+
+if sys.argv[1] == '--run':
+    run_scan(*sys.argv[2:5])
+else:
+    workspace = os.path.abspath(sys.argv[1])
+    with tempfile.TemporaryDirectory() as tmp:
+        output = {'cold': scan(workspace, tmp, 'cold'), 'warm': scan(workspace, tmp, 'warm')}
+
+        entries = sorted(glob.glob(os.path.join(tmp, 'cache', '*.ir')))
+        with open(entries[0], 'rb') as fp:
+            data = bytearray(fp.read())
+        data[-1] ^= 1
+        with open(entries[0], 'wb') as fp:
+            fp.write(data)
+
+        output['tampered'] = scan(workspace, tmp, 'tampered')
+        output['rewarmed'] = scan(workspace, tmp, 'rewarmed')
+        output['entries'] = len(entries)
+        output['key_created'] = os.path.isfile(os.path.join(tmp, 'home', '.flowtest', 'ir_cache.key'))
+
+    print(json.dumps(output))
@@ -0,0 +1,29 @@
+import json
+import os
+import sys
+
+from flowtest import prefetch, util
+
+# Iterates over the flows of a workspace with a Prefetcher of the given depth, and prints (as the last
+# line of stdout) for each root flow, in the order yielded, the flows whose contents were read ahead
+# for it and whether these contents are those of the files on disk.
+
+
+def read_file(flow_path):
+    with open(flow_path, 'rb') as fp:
+        return fp.read()
+
+
+workspace, depth = os.path.abspath(sys.argv[1]), int(sys.argv[2])
+all_flows = util.get_flows_in_dir(workspace)
+flow_paths = sorted(all_flows.values())
+output = []
+with prefetch.Prefetcher(flow_paths, all_flows, depth=depth) as prefetcher:
+    for (flow_path, contents) in prefetcher:
+        output.append({
+            'flow': os.path.basename(flow_path),
+            'prefetched': sorted(os.path.basename(x) for x in contents),
+            'matches_disk': all(read_file(x) == y for (x, y) in contents.items())
+        })
+
+print(json.dumps(output))
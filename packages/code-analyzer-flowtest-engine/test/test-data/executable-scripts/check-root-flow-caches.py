@@ -0,0 +1,72 @@
+import json
+import os
+import subprocess
+import sys
+
+import flowtest.branch_state as branch_state
+import flowtest.executor as executor
+import flowtest.flows as flows
+from flow_parser import expression_parser
+from flowtest import util
+
+# Scans the flows of a workspace one after the other, and each flow on its own in a fresh interpreter,
+# and prints (as the last line of stdout) the sizes of the module level caches kept for the crawl
+# after each flow in both scans, and how many origin masks of the sequential scan came from the cache
+# of their vector (checking each against a mask computed afresh).
+
+
+def get_cache_sizes():
+    return {
+        'formula_maps': len(branch_state._formula_map_cache),
+        'parsed_expressions': len(expression_parser._parsed_expressions),
+        'origins': len(flows._origin_bits)
+    }
+
+
+def count_origin_masks(counts):
+    get_origin_mask = flows.FlowVector.get_origin_mask
+
+    def counting_get_origin_mask(self):
+        cached = self.origin_cache is not None and self.origin_cache[0] == flows._origin_generation
+        mask = get_origin_mask(self)
+        counts['calls'] += 1
+        if cached:
+            counts['cached'] += 1
+            object.__setattr__(self, 'origin_cache', None)
+            if get_origin_mask(self) != mask:
+                counts['stale'] += 1
+        return mask
+
+    flows.FlowVector.get_origin_mask = counting_get_origin_mask
+
+
+def scan(workspace, flow_paths):
+    all_flows = util.get_flows_in_dir(workspace)
+    sizes = []
+    for flow_path in flow_paths:
+        executor.parse_flow(flow_path, query_preset='all', all_flows=all_flows)
+        sizes.append(get_cache_sizes())
+    return sizes
+
+
+def scan_alone(workspace, flow_path):
+    # runs this script for one flow, which prints the sizes of its scan as its last line of stdout
+    completed = subprocess.run([sys.executable, __file__, workspace, '--flow', flow_path],
+                               check=True, capture_output=True, text=True)
+    return json.loads(completed.stdout.splitlines()[-1])[0]
+
+
+workspace = os.path.abspath(sys.argv[1])
+if '--flow' in sys.argv:
+    print(json.dumps(scan(workspace, [sys.argv[sys.argv.index('--flow') + 1]])))
+else:
+    flow_paths = sorted(util.get_flows_in_dir(workspace).values())
+    origin_masks = {'calls': 0, 'cached': 0, 'stale': 0}
+    count_origin_masks(origin_masks)
+    in_sequence = scan(workspace, flow_paths)
+    print(json.dumps({
+        'root_flows': [{'flow': os.path.basename(flow_path), 'in_sequence': sizes,
+                        'alone': scan_alone(workspace, flow_path)}
+                       for (flow_path, sizes) in zip(flow_paths, in_sequence)],
+        'origin_masks': origin_masks
+    }))
@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+import flowtest.executor as executor
+from flowtest import flow_result, sqlite_export, util
+from public.data_obj import QueryResult
+from queries import default_query
+
+# Scans the flows of a workspace as the command line does with --sqlite, reading the database back
+# after each flow, then writes a finding that gains a path in a later flow, and prints (as the last
+# line of stdout) the tables, the counts after each flow, the findings stored in the database and in
+# the json report, and the rows of the finding that changed.
+
+
+def describe_paths(query_id, sink, histories):
+    return f'{query_id}: {os.path.basename(sink[0])}:{":".join(sink[1:])} <- ' + ' | '.join(sorted(
+        ' -> '.join(f'{os.path.basename(flow_path)}:{element_name}:{influenced_var}'
+                    for (flow_path, element_name, influenced_var) in history) for history in histories))
+
+
+def read_findings(connection):
+    findings = []
+    for (finding_id, query_id, *sink) in connection.execute(
+            "SELECT f.finding_id, f.query_id, fl.flow_path, s.element_name, s.influenced_var, s.influencer_var "
+            "FROM findings f "
+            "JOIN statements s ON s.statement_id = f.sink_statement_id JOIN flows fl ON fl.flow_id = s.flow_id "
+            "ORDER BY f.finding_id"):
+        histories = []
+        for (path_id,) in connection.execute("SELECT path_id FROM paths WHERE finding_id = ?", (finding_id,)):
+            histories.append(connection.execute(
+                "SELECT fl.flow_path, s.element_name, s.influenced_var FROM path_statements ps "
+                "JOIN statements s ON s.statement_id = ps.statement_id JOIN flows fl ON fl.flow_id = s.flow_id "
+                "WHERE ps.path_id = ? ORDER BY ps.position", (path_id,)).fetchall())
+        findings.append(describe_paths(query_id, sink, histories))
+    return sorted(findings)
+
+
+def count(connection, table):
+    return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def scan(workspace, db_path, json_path):
+    all_flows = util.get_flows_in_dir(workspace)
+    exporter = sqlite_export.SqliteExporter(db_path)
+    reader = sqlite3.connect(db_path)
+    query_manager = None
+    snapshots = []
+    for flow_path in sorted(all_flows.values()):
+        query_manager = executor.parse_flow(flow_path, query_manager=query_manager, query_preset='all',
+                                            all_flows=all_flows)
+        exporter.write_flow(flow_path, query_manager.results)
+        stored = query_manager.results.stored_results
+        snapshots.append({
+            'flow': os.path.basename(flow_path),
+            'findings': count(reader, 'findings'),
+            'paths': count(reader, 'paths'),
+            'scanned_flows': reader.execute("SELECT COUNT(*) FROM flows WHERE scanned = 1").fetchone()[0],
+            'expected_findings': len(stored),
+            'expected_paths': sum(len(x.paths) for x in stored)
+        })
+    exporter.close(query_manager.results)
+
+    with open(json_path, 'w') as fp:
+        query_manager.results.dump_json(fp)
+    with open(json_path) as fp:
+        report = json.load(fp)
+    report_findings = {}
+    for (query_id, entries) in report['results'].items():
+        for entry in entries:
+            # the report appends the sink statement to each path
+            sink = entry['flow'][-1]
+            key = (query_id, sink['flow_path'], sink['element_name'], sink['influenced_var'], sink['influencer_var'])
+            report_findings.setdefault(key, []).append(
+                [(x['flow_path'], x['element_name'], x['influenced_var']) for x in entry['flow'][:-1]])
+
+    tables = [x for (x,) in reader.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+    output = {
+        'tables': tables,
+        'metadata': dict(reader.execute("SELECT key, value FROM metadata")),
+        'snapshots': snapshots,
+        'db_findings': read_findings(reader),
+        'report_findings': sorted(describe_paths(key[0], key[1:], histories)
+                                  for (key, histories) in report_findings.items())
+    }
+    reader.close()
+    return output, query_manager.results.stored_results
+
+
+def write_changed_finding(stored, db_path):
+    # the first finding is reported with one path, then with another path in a later flow
+    finding = stored[0]
+    first_path = next(iter(finding.paths))
+    other_path = next(path for qr in stored for path in qr.paths if path != first_path)
+    results = flow_result.ResultsProcessor(preset=default_query.build_preset('all'))
+    exporter = sqlite_export.SqliteExporter(db_path)
+    reader = sqlite3.connect(db_path)
+    rows = []
+    for (flow_path, paths) in (('first.flow-meta.xml', {first_path}), ('second.flow-meta.xml', {other_path}),
+                               ('third.flow-meta.xml', {first_path})):
+        results.add_results([QueryResult(query_id=finding.query_id, influence_statement=finding.influence_statement,
+                                         paths=frozenset(paths))])
+        exporter.write_flow(flow_path, results)
+        rows.append({
+            'flow': flow_path,
+            'flow_findings': reader.execute("SELECT findings FROM flows WHERE flow_path = ?", (flow_path,)).fetchone()[0],
+            'findings': count(reader, 'findings'),
+            'paths': count(reader, 'paths'),
+            'path_statements': count(reader, 'path_statements'),
+            'expected_path_statements': sum(len(x.history) for x in results.stored_results[0].paths)
+        })
+    exporter.close(results)
+    reader.close()
+    return rows
+
+
+workspace = sys.argv[1]
+with tempfile.TemporaryDirectory() as tmp:
+    output, stored_results = scan(workspace, os.path.join(tmp, 'scan.db'), os.path.join(tmp, 'scan.json'))
+    output['changed_finding'] = write_changed_finding(stored_results, os.path.join(tmp, 'changed.db'))
+
+print(json.dumps(output))
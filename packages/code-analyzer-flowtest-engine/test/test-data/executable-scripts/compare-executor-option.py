@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+
+import flowtest.executor as executor
+from flowtest import util
+
+# Scans every flow of a workspace with a boolean option of flowtest.executor turned on, then off,
+# and prints (as the last line of stdout) the findings, the crawl statistics and the root flows skipped
+# without a crawl of each scan.
+# Each scan runs in a fresh interpreter, so that module level caches warmed by one scan do not
+# change the statistics of the other.
+
+
+def run(workspace, preset):
+    all_flows = util.get_flows_in_dir(workspace)
+    findings = []
+    stats = {'crawl_steps': 0, 'pruned_steps': 0, 'paths_created': 0}
+    skipped_flows = []
+    for flow_path in sorted(all_flows.values()):
+        query_manager = executor.parse_flow(flow_path, query_preset=preset, all_flows=all_flows)
+        results = query_manager.results
+        for x in results.stored_results:
+            for path in x.paths:
+                findings.append(f'{x.query_id}: ' + ' -> '.join(
+                    f'{os.path.basename(y.flow_path)}:{y.element_name}:{y.influenced_var}' for y in path.history))
+        for flow_stats in results.flow_stats:
+            stats['crawl_steps'] += flow_stats.crawl_steps
+            stats['pruned_steps'] += flow_stats.pruned_steps
+            stats['paths_created'] += flow_stats.paths_created
+            if flow_stats.skipped:
+                skipped_flows.append(os.path.basename(flow_stats.flow_path))
+    return {'findings': sorted(findings), 'skipped_flows': sorted(skipped_flows), **stats}
+
+
+def run_setting(setting):
+    # runs this script for one setting, which prints the result of its scan as its last line of stdout
+    completed = subprocess.run([sys.executable, __file__] + sys.argv[1:] + ['--setting', setting],
+                               check=True, capture_output=True, text=True)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+args = sys.argv[1:]
+setting = None
+if '--setting' in args:
+    setting = args[args.index('--setting') + 1]
+    args = args[:args.index('--setting')]
+option, workspace = args[0], args[1]
+preset = args[2] if len(args) > 2 else None
+assert isinstance(getattr(executor, option), bool), f'{option} is not a boolean option of flowtest.executor'
+
+if setting is None:
+    print(json.dumps({'on': run_setting('on'), 'off': run_setting('off')}))
+else:
+    setattr(executor, option, setting == 'on')
+    print(json.dumps(run(workspace, preset)))
@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+
+import flowtest.executor as executor
+import flowtest.flow_result as flow_result
+from flowtest import util
+from public.data_obj import QueryResult
+
+# Records the batches of results that the queries report while scanning a workspace, replays them
+# (in order, reversed, twice over, split into one batch per path, and with the paths dealt out among
+# the findings so that findings accumulate several paths) through ResultsProcessor.add_results
+# and through the merge that ResultsProcessor used before results were indexed, and prints (as the last
+# line of stdout) both lists of results and the results reported by pop_changed_results that differ
+# from the reference.
+
+
+def reference_merge(results):
+    # ResultsProcessor._merge_results and _is_match, as they were before results were indexed
+    new_list = []
+    r_indices = list(range(len(results)))
+    while len(r_indices) > 0:
+        qr = results[r_indices.pop(0)]
+        new_paths = set(list(qr.paths))
+        for i in [x for x in r_indices]:
+            working = results[i]
+            if qr.query_id == working.query_id and qr.influence_statement == working.influence_statement:
+                new_paths.update(working.paths)
+                r_indices.remove(i)
+        new_list.append(QueryResult(query_id=qr.query_id, influence_statement=qr.influence_statement,
+                                    paths=frozenset(new_paths)))
+    return new_list
+
+
+def describe(qr):
+    paths = sorted(' -> '.join(f'{os.path.basename(y.flow_path)}:{y.element_name}:{y.influenced_var}'
+                               for y in path.history) for path in qr.paths)
+    return f'{qr.query_id}: {qr.influence_statement.element_name} <- ' + ' | '.join(paths)
+
+
+def record_batches(workspace):
+    batches = []
+    add_results = flow_result.ResultsProcessor.add_results
+
+    def recording_add_results(self, query_results, preset_name=None):
+        batches.append(list(query_results))
+        return add_results(self, query_results, preset_name=preset_name)
+
+    flow_result.ResultsProcessor.add_results = recording_add_results
+    try:
+        all_flows = util.get_flows_in_dir(workspace)
+        for flow_path in sorted(all_flows.values()):
+            executor.parse_flow(flow_path, query_preset='all', all_flows=all_flows)
+    finally:
+        flow_result.ResultsProcessor.add_results = add_results
+    return batches
+
+
+def split(batches):
+    return [[QueryResult(query_id=qr.query_id, influence_statement=qr.influence_statement, paths=frozenset([path]))]
+            for batch in batches for qr in batch for path in sorted(qr.paths, key=lambda x: len(x.history))]
+
+
+def deal(batches):
+    keys = list(dict.fromkeys((qr.query_id, qr.influence_statement) for batch in batches for qr in batch))
+    paths = [path for batch in batches for qr in batch for path in sorted(qr.paths, key=lambda x: len(x.history))]
+    return [[QueryResult(query_id=keys[(i + offset) % len(keys)][0], influence_statement=keys[(i + offset) % len(keys)][1],
+                         paths=frozenset(paths[i:i + 2]))]
+            for offset in range(len(keys)) for i in range(len(paths))]
+
+
+def replay(batches):
+    processor = flow_result.ResultsProcessor()
+    reference = []
+    changed_mismatches = []
+    for batch in batches:
+        processor.add_results(batch)
+        valid = flow_result._validate_qr(batch)
+        if valid is None:
+            continue
+        previous = {(x.query_id, x.influence_statement): x.paths for x in reference}
+        reference = reference_merge(reference + valid)
+        expected_changed = [describe(x) for x in reference
+                            if previous.get((x.query_id, x.influence_statement)) != x.paths]
+        changed = [describe(x) for x in processor.pop_changed_results()]
+        if changed != expected_changed:
+            changed_mismatches.append({'expected': expected_changed, 'actual': changed})
+    return {
+        'merged': [describe(x) for x in processor.stored_results],
+        'reference': [describe(x) for x in reference],
+        'changed_mismatches': changed_mismatches
+    }
+
+
+workspace = sys.argv[1]
+batches = [x for x in record_batches(workspace) if len(x) > 0]
+print(json.dumps({
+    'batch_count': len(batches),
+    'result_count': sum(len(x) for x in batches),
+    'path_count': sum(len(qr.paths) for x in batches for qr in x),
+    'in_order': replay(batches),
+    'reversed': replay(batches[::-1]),
+    'twice': replay(batches + batches),
+    'split': replay(split(batches) + split(batches[::-1])),
+    'dealt': replay(deal(batches))
+}))
@@ -0,0 +1,53 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Scans a workspace in one run, then plans shards with `flowtest plan`, scans each shard manifest
+# (alternating the full and compact json schemas) and combines the shard reports with `flowtest merge`,
+# and prints (as the last line of stdout) the number of shards and the findings of both reports.
+
+
+def run_flowtest(args):
+    subprocess.run([sys.executable, '-m', 'flowtest'] + args, check=True, capture_output=True, text=True)
+
+
+def get_findings(report_path):
+    with open(report_path) as fp:
+        report = json.load(fp)
+    findings = {}
+    for (query_id, entries) in report['results'].items():
+        # counters are only unique within a report
+        findings[query_id] = sorted(json.dumps(dict(x, counter=None), sort_keys=True) for x in entries)
+    return {'preset': report['preset'], 'findings': findings}
+
+
+workspace, shard_count = os.path.abspath(sys.argv[1]), sys.argv[2]
+preset_args = ['--preset', sys.argv[3]] if len(sys.argv) > 3 else []
+with tempfile.TemporaryDirectory() as tmp:
+    full_report = os.path.join(tmp, 'full.json')
+    run_flowtest(['--no_log', '-d', workspace, '-j', full_report] + preset_args)
+
+    plan_dir = os.path.join(tmp, 'plan')
+    run_flowtest(['plan', '-d', workspace, '-n', shard_count, '-o', plan_dir])
+    manifests = sorted(x for x in glob.glob(os.path.join(plan_dir, '*')) if not x.endswith('.json'))
+
+    shard_reports = []
+    for (index, manifest) in enumerate(manifests):
+        shard_report = os.path.join(tmp, f'shard_{index}.json')
+        compact_args = ['--compact_json'] if index % 2 == 1 else []
+        run_flowtest(['--no_log', '--infile', manifest, '-j', shard_report] + compact_args + preset_args)
+        shard_reports.append(shard_report)
+
+    merged_report = os.path.join(tmp, 'merged.json')
+    run_flowtest(['merge'] + shard_reports + ['-j', merged_report])
+
+    output = {
+        'shards': len(manifests),
+        'full': get_findings(full_report),
+        'merged': get_findings(merged_report)
+    }
+
+print(json.dumps(output))
@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Runs the flowtest command line in a fresh interpreter with the given arguments, in which {tmp} is
+# replaced by a temporary directory, and prints (as the last line of stdout) the exit code, the
+# stdout and stderr of the command and the files it wrote to the temporary directory (parsed if they are json).
+
+
+def read_files(directory):
+    files = {}
+    for (dir_path, _, file_names) in os.walk(directory):
+        for file_name in file_names:
+            file_path = os.path.join(dir_path, file_name)
+            name = os.path.relpath(file_path, directory).replace(os.sep, '/')
+            if file_name.endswith('.json'):
+                with open(file_path) as fp:
+                    files[name] = json.load(fp)
+            elif file_name.endswith('.jsonl'):
+                with open(file_path) as fp:
+                    files[name] = [json.loads(x) for x in fp if x.strip()]
+            elif file_name.endswith('.txt') or file_name.endswith('.log'):
+                with open(file_path) as fp:
+                    files[name] = fp.read()
+            else:
+                files[name] = None
+    return files
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    args = [x.replace('{tmp}', tmp) for x in sys.argv[1:]]
+    completed = subprocess.run([sys.executable, '-m', 'flowtest', '--no_log'] + args,
+                               capture_output=True, text=True)
+    output = {
+        'returncode': completed.returncode,
+        'stdout': completed.stdout.splitlines(),
+        'stderr': completed.stderr.splitlines(),
+        'files': read_files(tmp)
+    }
+
+print(json.dumps(output))
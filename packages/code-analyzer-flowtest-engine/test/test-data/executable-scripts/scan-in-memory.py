@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+
+import flowtest.branch_state as branch_state
+import flowtest.flows as flows
+import flowtest.prefilter as prefilter
+import flowtest.reachability as reachability
+from flow_parser import expression_parser
+from flowtest.api import scan
+
+# Scans the flows of a workspace from disk, then from memory under paths that do not exist,
+# and prints (as the last line of stdout) the findings of each scan and the sizes of the
+# module caches after each scan.
+
+
+def get_cache_sizes():
+    return [len(reachability._summaries), len(prefilter._facts), len(branch_state._formula_map_cache),
+            len(expression_parser._parsed_expressions), len(flows._origin_bits)]
+
+
+def run(paths):
+    findings = {}
+    for result in scan(paths, preset='all'):
+        assert result.error is None, result.error
+        findings[os.path.basename(result.flow_path)] = sorted(
+            f'{x.query_id}: {x.influence_statement.element_name} via '
+            + ' -> '.join(f'{os.path.basename(y.flow_path)}:{y.element_name}' for y in path.history)
+            for x in result.findings for path in x.paths)
+    return findings
+
+
+workspace = sys.argv[1]
+names = sorted(x for x in os.listdir(workspace) if x.endswith('.flow') or x.endswith('.flow-meta.xml'))
+contents = {}
+for name in names:
+    with open(os.path.join(workspace, name), 'rb') as fp:
+        contents[os.path.join('in-memory', name)] = fp.read()
+
+on_disk = run([os.path.join(workspace, x) for x in names])
+on_disk_cache_sizes = get_cache_sizes()
+in_memory = run(contents)
+
+print(json.dumps({
+    'on_disk': on_disk,
+    'on_disk_cache_sizes': on_disk_cache_sizes,
+    'in_memory': in_memory,
+    'in_memory_cache_sizes': get_cache_sizes()
+}))